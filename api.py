@@ -0,0 +1,501 @@
+# api.py
+#
+# Headless JSON API for capturing sales, returns and stock receipts from
+# handhelds without Streamlit's full-script reruns. Writes go through the
+# same services.py functions as the Record Sale, Returns and Add Stock
+# pages, inside the same pool.run() transaction with deadlock retry.
+#
+# services.py is synchronous psycopg2 code, so the asyncio server hands
+# each unit of DB work to a thread pool sized to the connection pool:
+# the event loop never blocks, and at most DB_POOL_MAX requests hold a
+# connection while the rest wait on the executor queue.
+#
+# POST requests may carry an Idempotency-Key header. The key is stored in
+# the same transaction as the write, with the response, so a retried
+# request gets the original response back instead of posting again.
+#
+# Auth is HTTP Basic with the app's users; stock receipts, transfers and
+# /metrics need an admin.
+#
+# Usage:
+#   python api.py [--host 0.0.0.0] [--port 8080]
+#
+#   POST /sales           {"customer_id": 1, "total_boxes": 2, "items": [{"flavor_id": 3, "quantity": 5}]}
+#   POST /returns         {"customer_id": 1, "returned_boxes": 2, "damaged_boxes": 0, "items": [{"flavor_id": 3, "returned": 4, "damaged": 1}], "note": ""}
+#   POST /stock/receipts  {"flavor_id": 3, "quantity": 100}
+#   POST /stock/transfers {"from_depot_id": 1, "to_depot_id": 2, "items": [{"flavor_id": 3, "quantity": 50}]}
+#   GET  /stock?depot_id=1
+#   GET  /metrics         Prometheus counters (admin)
+#
+# Sales, returns and receipts take an optional "depot_id" (default: the
+# Main depot).
+
+import argparse
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from aiohttp import web
+from psycopg2 import errors
+from psycopg2.extras import Json
+
+import audit
+import db
+import metrics
+import migrate
+import partitions
+import prepared
+import services
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+
+# Idempotency keys older than this are pruned at startup
+API_KEY_DAYS = int(os.getenv("API_KEY_DAYS", "7"))
+
+# Seconds a verified login is trusted before the users table is asked again
+AUTH_TTL = 300
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+
+# ---------------- REQUEST PARSING ----------------
+
+def _int(body, field, minimum=0, required=True):
+
+    value = body.get(field)
+
+    if value is None:
+        if required:
+            raise ApiError(422, f"{field} is required")
+        return 0
+
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ApiError(422, f"{field} must be an integer >= {minimum}")
+
+    return value
+
+
+def _date(body, field):
+
+    value = body.get(field)
+
+    if value is None:
+        return None
+
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(422, f"{field} must be a YYYY-MM-DD date")
+
+
+def _items(body):
+
+    items = body.get("items")
+
+    if not isinstance(items, list) or not items:
+        raise ApiError(422, "items must be a non-empty list")
+
+    out = []
+
+    for item in items:
+
+        if not isinstance(item, dict):
+            raise ApiError(422, "each item needs flavor_id and quantity")
+
+        out.append((_int(item, "flavor_id", 1), _int(item, "quantity", 1)))
+
+    return out
+
+
+def _depot(body):
+    return _int(body, "depot_id", 1, required=False) or services.MAIN_DEPOT
+
+
+def _request_hash(endpoint, body):
+    raw = json.dumps([endpoint, body], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# ---------------- WRITES ----------------
+
+# Runs work(cur) -> (status, response) in one transaction, guarded by the
+# idempotency key when there is one.
+def _idempotent(cur, key, endpoint, username, body, work):
+
+    if key is None:
+        return work(cur)
+
+    h = _request_hash(endpoint, body)
+
+    # A concurrent request with the same key blocks here until the first
+    # one commits (then conflicts) or rolls back (then this one proceeds).
+    cur.execute("""
+    INSERT INTO api_requests(key,endpoint,username,request_hash)
+    VALUES(%s,%s,%s,%s)
+    ON CONFLICT (key) DO NOTHING
+    RETURNING key
+    """, (key, endpoint, username, h))
+
+    if cur.fetchone() is None:
+
+        cur.execute("""
+        SELECT endpoint, username, request_hash, status, response
+        FROM api_requests WHERE key=%s
+        """, (key,))
+
+        old_endpoint, old_user, old_hash, status, response = cur.fetchone()
+
+        if (old_endpoint, old_user, old_hash) != (endpoint, username, h):
+            raise ApiError(422, "Idempotency-Key was already used for a different request")
+
+        return status, dict(response, replayed=True)
+
+    status, response = work(cur)
+
+    cur.execute("""
+    UPDATE api_requests SET status=%s, response=%s WHERE key=%s
+    """, (status, Json(response), key))
+
+    return status, response
+
+
+def _sale(body, username):
+
+    depot_id = _depot(body)
+    customer_id = _int(body, "customer_id", 1)
+    total_boxes = _int(body, "total_boxes", 0, required=False)
+    items = _items(body)
+    sale_date = _date(body, "sale_date")
+
+    def work(cur):
+
+        sid = services.post_sale(cur, depot_id, customer_id, total_boxes, items, username, sale_date)
+
+        return 201, {"sale_id": sid}
+
+    return work, f"API sale #{{sale_id}} to customer #{customer_id}"
+
+
+def _return_items(body):
+
+    items = body.get("items") or []
+
+    if not isinstance(items, list):
+        raise ApiError(422, "items must be a list")
+
+    out = []
+
+    for item in items:
+
+        if not isinstance(item, dict):
+            raise ApiError(422, "each item needs flavor_id and returned and/or damaged")
+
+        out.append((
+            _int(item, "flavor_id", 1),
+            _int(item, "returned", 0, required=False),
+            _int(item, "damaged", 0, required=False)
+        ))
+
+    return out
+
+
+def _return(body, username):
+
+    depot_id = _depot(body)
+    customer_id = _int(body, "customer_id", 1)
+    returned_boxes = _int(body, "returned_boxes", 0, required=False)
+    damaged_boxes = _int(body, "damaged_boxes", 0, required=False)
+    items = _return_items(body)
+    note = str(body.get("note") or "")
+    return_date = _date(body, "return_date")
+
+    # Defaults to the damaged total of the items
+    damaged_bottles = None
+
+    if body.get("damaged_bottles") is not None:
+        damaged_bottles = _int(body, "damaged_bottles", 0)
+
+    def work(cur):
+
+        rid = services.post_return(
+            cur, depot_id, customer_id, returned_boxes, damaged_boxes, items,
+            note, username, return_date, damaged_bottles
+        )
+
+        return 201, {"return_id": rid}
+
+    return work, f"API return #{{return_id}} from customer #{customer_id}"
+
+
+def _receipt(body, username):
+
+    depot_id = _depot(body)
+    flavor_id = _int(body, "flavor_id", 1)
+    quantity = _int(body, "quantity", 1)
+
+    def work(cur):
+
+        cur.execute("SELECT 1 FROM flavors WHERE id=%s AND active", (flavor_id,))
+
+        if cur.fetchone() is None:
+            raise ApiError(422, f"Unknown or inactive flavor {flavor_id}")
+
+        services.receive_stock(cur, depot_id, flavor_id, quantity, username)
+
+        return 201, {"depot_id": depot_id, "flavor_id": flavor_id, "received": quantity}
+
+    return work, f"API received {quantity} of flavor #{flavor_id} at depot #{depot_id}"
+
+
+def _transfer(body, username):
+
+    from_depot_id = _int(body, "from_depot_id", 1)
+    to_depot_id = _int(body, "to_depot_id", 1)
+    items = _items(body)
+    note = str(body.get("note") or "")
+
+    def work(cur):
+
+        tid = services.transfer_stock(cur, from_depot_id, to_depot_id, items, username, note)
+
+        return 201, {"transfer_id": tid}
+
+    return work, f"API transfer #{{transfer_id}} from depot #{from_depot_id} to #{to_depot_id}"
+
+
+# endpoint -> (parser, admin only)
+WRITES = {
+    "/sales": (_sale, False),
+    "/returns": (_return, False),
+    "/stock/receipts": (_receipt, True),
+    "/stock/transfers": (_transfer, True)
+}
+
+
+# ---------------- SERVER ----------------
+
+class Api:
+
+    def __init__(self, pool=None, workers=db.POOL_MAX):
+
+        self.pool = pool or db.Pool(cursor_factory=metrics.Cursor)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="api-db")
+        self.auditor = audit.AuditWriter(self.pool)
+
+        self._logins = {}
+        self._logins_lock = threading.Lock()
+
+    async def db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    # ---- auth ----
+
+    def _check_login(self, username, password_hash):
+
+        with self.pool.cursor() as cur:
+            prepared.execute(cur, "login", (username, password_hash))
+            row = cur.fetchone()
+
+        return row[1] if row else None
+
+    async def user(self, request):
+
+        header = request.headers.get("Authorization", "")
+
+        if not header.startswith("Basic "):
+            raise ApiError(401, "Basic auth required")
+
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode().partition(":")
+        except (binascii.Error, UnicodeDecodeError):
+            raise ApiError(401, "Malformed credentials")
+
+        key = (username, hashlib.sha256(password.encode()).hexdigest())
+        now = time.monotonic()
+
+        with self._logins_lock:
+            cached = self._logins.get(key)
+
+        if cached and cached[1] > now:
+            return username, cached[0]
+
+        role = await self.db(self._check_login, *key)
+
+        if role is None:
+            raise ApiError(401, "Invalid login")
+
+        with self._logins_lock:
+            self._logins[key] = (role, now + AUTH_TTL)
+
+        return username, role
+
+    # ---- handlers ----
+
+    def _post(self, endpoint, key, username, body):
+
+        parse, _ = WRITES[endpoint]
+        work, action = parse(body, username)
+
+        metrics.set_page(f"api {endpoint}")
+
+        try:
+            status, response = self.pool.run(
+                lambda cur: _idempotent(cur, key, endpoint, username, body, work)
+            )
+
+        except services.InsufficientStock as e:
+            raise ApiError(409, str(e), shortages=[
+                {"flavor": name, "requested": req, "available": avail}
+                for name, req, avail in e.shortages
+            ])
+
+        except errors.ForeignKeyViolation:
+            raise ApiError(422, "Unknown customer, flavor or depot")
+
+        except ValueError as e:
+            raise ApiError(422, str(e))
+
+        if not response.get("replayed"):
+            self.auditor.log(username, action.format(**response))
+
+        return status, response
+
+    async def post(self, request):
+
+        endpoint = request.match_info.route.resource.canonical
+        username, role = await self.user(request)
+
+        if WRITES[endpoint][1] and role != "admin":
+            raise ApiError(403, "Admin only")
+
+        try:
+            body = await request.json()
+        except ValueError:
+            raise ApiError(400, "Body must be JSON")
+
+        if not isinstance(body, dict):
+            raise ApiError(400, "Body must be a JSON object")
+
+        key = request.headers.get("Idempotency-Key")
+
+        status, response = await self.db(self._post, endpoint, key, username, body)
+
+        return web.json_response(response, status=status)
+
+    def _stock(self, depot_id):
+
+        metrics.set_page("api /stock")
+
+        with self.pool.cursor() as cur:
+            prepared.execute(cur, "sale_stock", (depot_id,))
+            rows = cur.fetchall()
+
+        return [{"flavor_id": r[0], "name": r[1], "stock": r[2]} for r in rows]
+
+    async def stock(self, request):
+
+        await self.user(request)
+
+        try:
+            depot_id = int(request.query.get("depot_id", services.MAIN_DEPOT))
+        except ValueError:
+            raise ApiError(422, "depot_id must be an integer")
+
+        return web.json_response(await self.db(self._stock, depot_id))
+
+    async def prometheus(self, request):
+
+        _, role = await self.user(request)
+
+        if role != "admin":
+            raise ApiError(403, "Admin only")
+
+        return web.Response(text=metrics.registry.prometheus())
+
+    # ---- lifecycle ----
+
+    def _prune_keys(self):
+        with self.pool.cursor() as cur:
+            cur.execute("""
+            DELETE FROM api_requests
+            WHERE created_at < now() - %s * interval '1 day'
+            """, (API_KEY_DAYS,))
+
+    async def startup(self, app):
+
+        def init():
+            with self.pool.connection() as conn:
+                migrate.migrate(conn)
+            self.pool.run(partitions.ensure)
+            self._prune_keys()
+
+        await self.db(init)
+
+        self._partitions = partitions.maintain_in_background(self.pool)
+
+    async def cleanup(self, app):
+        self._partitions.set()
+        self.auditor.close()
+        self.executor.shutdown(wait=True)
+        self.pool.close()
+
+
+@web.middleware
+async def errors_as_json(request, handler):
+
+    try:
+        return await handler(request)
+
+    except ApiError as e:
+        return web.json_response(e.body, status=e.status)
+
+    except db.PoolTimeout:
+        return web.json_response({"error": "Database busy, retry"}, status=503)
+
+
+def make_app(api=None):
+
+    api = api or Api()
+
+    app = web.Application(middlewares=[errors_as_json])
+
+    for endpoint in WRITES:
+        app.router.add_post(endpoint, api.post)
+
+    app.router.add_get("/stock", api.stock)
+    app.router.add_get("/metrics", api.prometheus)
+
+    app.on_startup.append(api.startup)
+    app.on_cleanup.append(api.cleanup)
+
+    return app
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Stock manager JSON API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+
+    args = parser.parse_args(argv)
+
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,73 @@
 # app.py
 
 import streamlit as st
-import psycopg2
 import pandas as pd
+import plotly.express as px
 import hashlib
-from datetime import date
 import os
+import tempfile
+from datetime import date, datetime, time, timedelta
 
-DB_HOST = os.getenv("DB_HOST")
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_PORT = os.getenv("DB_PORT")
-
-
-def get_conn():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS,
-        port=DB_PORT,
-        connect_timeout=5
+import audit
+import bulk_import
+import cache
+import charts
+import customers
+import db
+import export
+import grid
+import ledger
+import metrics
+import migrate
+import paging
+import partitions
+import prepared
+import queries
+import rollups
+import services
+
+
+# One pool per server process, shared by every session and rerun.
+# Every statement it runs is timed and attributed to the current page.
+@st.cache_resource
+def get_pool():
+    return db.Pool(cursor_factory=metrics.Cursor)
+
+
+pool = get_pool()
+
+
+# Prometheus scrape endpoint, only when METRICS_PORT is set.
+@st.cache_resource
+def start_metrics_server():
+    port = os.getenv("METRICS_PORT")
+    return metrics.serve(int(port)) if port else None
+
+
+start_metrics_server()
+
+metrics.begin_rerun("Login")
+
+
+# Read-through cache for get_df, shared across sessions like the pool.
+@st.cache_resource
+def get_query_cache():
+    return cache.QueryCache()
+
+
+qcache = get_query_cache()
+
+
+# Audit entries are written in batches by a background thread.
+@st.cache_resource
+def get_auditor():
+    return audit.AuditWriter(
+        pool,
+        on_flush=lambda: qcache.invalidate("activity_logs")
     )
 
 
-conn = get_conn()
-conn.autocommit = True
-cur = conn.cursor()
+auditor = get_auditor()
 
 
 # ---------------- CONFIG ----------------
@@ -83,112 +123,267 @@ input, textarea, select {
 </style>
 """, unsafe_allow_html=True)
 
-LOW_STOCK_LIMIT = 10
+# ---------------- SCHEMA ----------------
 
-# ---------------- TABLES ----------------
+# Applies pending migrations and opens the coming months' partitions once
+# per server process; later reruns skip this entirely. Deployments can
+# also run `python migrate.py` and `python partitions.py maintain` up front.
+@st.cache_resource
+def init_schema():
+    with pool.connection() as conn:
+        migrate.migrate(conn)
+    pool.run(partitions.ensure)
+    return True
 
-def create_tables():
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users(
-        id SERIAL PRIMARY KEY,
-        username TEXT UNIQUE,
-        password TEXT,
-        role TEXT
-    )
-    """)
+init_schema()
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS flavors(
-        id SERIAL PRIMARY KEY,
-        name TEXT UNIQUE,
-        active BOOLEAN DEFAULT TRUE
-    )
-    """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS inventory(
-        flavor_id INTEGER REFERENCES flavors(id),
-        stock INTEGER DEFAULT 0,
-        PRIMARY KEY(flavor_id)
-    )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS customers(
-        id SERIAL PRIMARY KEY,
-        name TEXT,
-        phone TEXT,
-        shop TEXT,
-        area TEXT,
-        active BOOLEAN DEFAULT TRUE
+# Opens the next months' partitions as the months turn, however long this
+# process runs.
+@st.cache_resource
+def start_partition_maintainer():
+    return partitions.maintain_in_background(pool)
+
+
+start_partition_maintainer()
+
+
+# ---------------- HELPERS ----------------
+
+def hash_pass(p):
+    return hashlib.sha256(p.encode()).hexdigest()
+
+
+def log(action):
+    auditor.log(st.session_state.user["username"], action)
+
+
+def read_df(q, params=None):
+    with pool.connection() as conn:
+        return pd.read_sql(q, conn, params=params)
+
+
+# Cached by SQL + params and tagged with the tables the query reads.
+# Pages mutate the frames they get back, so hand out copies.
+def get_df(q, params=None):
+    return qcache.get_or_load(q, params, lambda: read_df(q, params), copy=True)
+
+
+def read_prepared(name, params=()):
+    with pool.cursor() as cur:
+        prepared.execute(cur, name, params)
+        return pd.DataFrame(cur.fetchall(), columns=[d[0] for d in cur.description])
+
+
+# get_df for the hot queries in prepared.STATEMENTS, executed by name.
+def get_prepared_df(name, params=()):
+    s = prepared.STATEMENTS[name]
+    return qcache.get_or_load(s.sql, tuple(params), lambda: read_prepared(name, params), copy=True)
+
+
+# Call after every write with the tables it touched.
+def invalidate(*tables):
+    qcache.invalidate(*tables)
+
+
+# Search-as-you-type customer selection. Returns the chosen customer as a
+# dict, or None until something is picked.
+def customer_picker(key, label="Customer"):
+
+    text = st.text_input(
+        f"🔎 Search {label}",
+        key=f"{key}_q",
+        placeholder="Name, phone, shop or area"
     )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sales(
-        id SERIAL PRIMARY KEY,
-        customer_id INTEGER,
-        total_boxes INTEGER,
-        sale_date TEXT,
-        created_by TEXT
+
+    if not text.strip():
+        st.caption("Type to search customers")
+        return None
+
+    q, params = customers.search_query(text)
+
+    matches = get_df(q, params)
+
+    if matches.empty:
+        st.warning("No matching customers")
+        return None
+
+    rows = {int(r["id"]): r for r in matches.to_dict("records")}
+
+    cid = st.selectbox(
+        label,
+        list(rows),
+        format_func=lambda i: customers.label(rows[i]),
+        key=f"{key}_sel"
     )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sale_items(
-        id SERIAL PRIMARY KEY,
-        sale_id INTEGER,
-        flavor_id INTEGER,
-        quantity INTEGER
+
+    return rows[cid]
+
+
+# CURRENT_STOCK rows -> one row per flavor with a column per depot (in
+# depot order) and the total.
+def depot_pivot(df):
+
+    out = df.pivot(index="name", columns="depot", values="stock")
+    out = out[list(dict.fromkeys(df["depot"]))].fillna(0).astype("int64")
+
+    out["Total"] = out.sum(axis=1)
+
+    return out.reset_index()
+
+
+# Newest-first keyset-paged view of an append-only table, with
+# newer/older navigation and jump-to-date.
+def paged_table(table, date_col, empty_msg):
+
+    key = f"{table}_page"
+
+    if key not in st.session_state:
+        st.session_state[key] = {"before": None, "after": None}
+
+    state = st.session_state[key]
+
+    c1, c2, c3 = st.columns([1, 1, 1])
+
+    size = c1.selectbox(
+        "Rows per page",
+        paging.PAGE_SIZES,
+        index=1,
+        key=f"{table}_size"
     )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS returns(
-        id SERIAL PRIMARY KEY,
-        customer_name TEXT,
-        return_date TEXT,
-        returned_boxes INTEGER,
-        damaged_boxes INTEGER,
-        damaged_bottles INTEGER,
-        note TEXT,
-        created_by TEXT
+
+    day = c2.date_input("Jump to date", value=None, key=f"{table}_day")
+
+    if c3.button("Go", key=f"{table}_go") and day:
+
+        k = paging.key_on_or_before(pool, table, date_col, day)
+
+        if k is None:
+            st.info("Nothing recorded on or before that date.")
+        else:
+            # Just past that row, so it heads the page
+            st.session_state[key] = {"before": (k[0], k[1] + 1), "after": None}
+            st.rerun()
+
+    pg = qcache.get_or_load(
+        f"page:{table}",
+        (size, state["before"], state["after"]),
+        lambda: paging.fetch_page(
+            pool, table, date_col, size,
+            before=state["before"],
+            after=state["after"]
+        ),
+        tags=[table]
     )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS activity_logs(
-        id SERIAL PRIMARY KEY,
-        username TEXT,
-        action TEXT,
-        log_date TEXT
+
+    if pg.df.empty:
+        st.info(empty_msg)
+        return
+
+    st.dataframe(
+        pg.df,
+        use_container_width=True,
+        height=400
     )
-    """)
 
+    n1, n2, n3 = st.columns([1, 1, 1])
 
-create_tables()
+    if n1.button("⏮ Latest", key=f"{table}_latest", disabled=not pg.has_newer):
+        st.session_state[key] = {"before": None, "after": None}
+        st.rerun()
 
+    if n2.button("⬅ Newer", key=f"{table}_newer", disabled=not pg.has_newer):
+        st.session_state[key] = {"before": None, "after": pg.newest}
+        st.rerun()
 
-# ---------------- HELPERS ----------------
+    if n3.button("Older ➡", key=f"{table}_older", disabled=not pg.has_older):
+        st.session_state[key] = {"before": pg.oldest, "after": None}
+        st.rerun()
 
-def hash_pass(p):
-    return hashlib.sha256(p.encode()).hexdigest()
+# Editable list: one st.data_editor for all rows, with a Deactivate
+# checkbox column. Saving commits every change with apply(cur, rows) in a
+# single transaction and queues the audit entries together.
+def edit_grid(key, df, columns, kind, apply, disabled=(), unique_name=False):
+
+    before = df.set_index("id").assign(deactivate=False)
+
+    edited = st.data_editor(
+        before,
+        key=key,
+        hide_index=True,
+        num_rows="fixed",
+        disabled=[c for c in before.columns if c not in columns and c != "deactivate"] + list(disabled),
+        column_config={
+            "active": None,
+            "deactivate": st.column_config.CheckboxColumn("Deactivate")
+        },
+        use_container_width=True,
+        height=400
+    )
 
+    try:
+        rows = grid.diff(before, edited, columns, unique_name)
+    except ValueError as e:
+        st.error(str(e))
+        return
 
-def log(action):
-    cur.execute("""
-    INSERT INTO activity_logs(username,action,log_date)
-    VALUES(%s,%s,%s)
-    """, (
-        st.session_state.user["username"],
-        action,
-        date.today().isoformat()
+    if not st.button(f"💾 Save {len(rows)} Changes", key=f"{key}_save", disabled=rows.empty):
+        return
+
+    try:
+        with pool.transaction() as cur:
+            apply(cur, rows)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    invalidate(f"{kind}s")
+
+    auditor.log_many(grid.audit_entries(
+        kind, before, rows, st.session_state.user["username"]
     ))
 
+    # Drop the editor's pending edits; they are saved now
+    del st.session_state[key]
+
+    st.success(f"Saved {len(rows)} changes")
+    st.rerun()
+
+
+# Reruns on its own (Refresh) without re-rendering the sale form above.
+@st.fragment
+def sales_history():
+
+    c1, c2 = st.columns([4, 1])
+
+    c1.subheader("📋 Sales History")
+
+    # Clicking reruns just this fragment
+    c2.button("🔄 Refresh", key="sales_history_refresh")
+
+    sales_df = get_prepared_df("sales_history")
+
+    if sales_df.empty:
+
+        st.info("No sales recorded yet.")
+        return
+
+    sales_df.columns = [
+        "Date",
+        "Customer",
+        "Flavor",
+        "Quantity",
+        "Boxes Given",
+        "Staff"
+    ]
+
+    st.dataframe(
+        sales_df,
+        use_container_width=True,
+        height=400
+    )
 
-def get_df(q, params=None):
-    return pd.read_sql(q, conn, params=params)
 
 def is_mobile():
     return st.session_state.get("is_mobile", False)
@@ -332,16 +527,6 @@ div[data-baseweb="notification"] {
 </style>
 """, unsafe_allow_html=True)
 
-# ---------------- INIT ADMIN ----------------
-
-cur.execute("SELECT COUNT(*) FROM users")
-if cur.fetchone()[0] == 0:
-    cur.execute("""
-    INSERT INTO users(username,password,role)
-    VALUES(%s,%s,%s)
-    """, ("admin", hash_pass("admin123"), "admin"))
-
-
 # ---------------- SESSION ----------------
 
 if "user" not in st.session_state:
@@ -359,12 +544,10 @@ def login_page():
 
     if st.button("Login"):
 
-        cur.execute("""
-        SELECT id,role FROM users
-        WHERE username=%s AND password=%s
-        """, (u, hash_pass(p)))
+        with pool.cursor() as cur:
+            prepared.execute(cur, "login", (u, hash_pass(p)))
 
-        r = cur.fetchone()
+            r = cur.fetchone()
 
         if r:
             st.session_state.user = {
@@ -395,15 +578,49 @@ if st.sidebar.button("Logout"):
 
 ROLE = st.session_state.user["role"]
 
+if ROLE == "admin":
+    with st.sidebar.expander("🔌 DB Pool"):
+        st.json(pool.stats())
+    with st.sidebar.expander("🗃️ Query Cache"):
+        st.json(qcache.stats())
+    with st.sidebar.expander("📝 Audit Writer"):
+        st.json(auditor.stats())
+
+
+# ---------------- DEPOT ----------------
+
+depots_df = get_df(queries.DEPOT_LIST)
+DEPOTS = dict(zip(depots_df["id"].astype(int), depots_df["name"]))
+
+# None means all depots: stock views add them up, and pages that move
+# stock ask for one. A single-depot setup starts with it picked.
+DEPOT = st.sidebar.selectbox(
+    "Depot",
+    [None] + list(DEPOTS),
+    index=1 if len(DEPOTS) == 1 else 0,
+    format_func=lambda d: "All depots" if d is None else DEPOTS[d],
+    key="depot"
+)
+
+
+def require_depot():
+    if DEPOT is None:
+        st.info("Pick a depot in the sidebar")
+        st.stop()
+
 
 if ROLE == "admin":
     pages = [
         "Dashboard",
         "Flavors",
+        "Depots",
         "Add Stock",
         "Record Sale",
         "Returns",
         "Customers",
+        "Reports",
+        "Bulk Import",
+        "Export",
         "Users",
         "Admin Activity"
     ]
@@ -418,6 +635,8 @@ else:
 
 page = st.sidebar.radio("Menu", pages)
 
+metrics.set_page(page)
+
 
 # ---------------- DASHBOARD ----------------
 
@@ -425,15 +644,10 @@ if page == "Dashboard":
 
     st.title("📊 Dashboard")
 
-    df = get_df("""
-        SELECT
-            f.name,
-            COALESCE(i.stock,0) AS stock
-        FROM flavors f
-        LEFT JOIN inventory i ON f.id=i.flavor_id
-        WHERE f.active=TRUE
-        ORDER BY f.name
-        """)
+    if DEPOT is None:
+        df = get_prepared_df("dashboard_stock")
+    else:
+        df = get_prepared_df("depot_dashboard_stock", (DEPOT, DEPOT))
 
     if df.empty:
 
@@ -441,8 +655,8 @@ if page == "Dashboard":
 
     else:
 
-        # Low stock flag
-        df["Low"] = df["stock"] < LOW_STOCK_LIMIT
+        # Low stock: at or below the flavor's forecast reorder point
+        df["Low"] = df["stock"] <= df["reorder_point"].fillna(-1)
 
         # Metrics
         total_stock = int(df["stock"].sum())
@@ -473,11 +687,17 @@ if page == "Dashboard":
         st.subheader("📦 Stock Overview")
 
         st.dataframe(
-            df[["name", "stock", "Low"]],
+            df[["name", "stock", "per_day", "days_of_cover", "reorder_point", "Low"]],
             use_container_width=True,
             height=400
         )
 
+        if df["forecast_at"].notna().any():
+            st.caption(f"Reorder points from the {df['forecast_at'].max():%Y-%m-%d %H:%M} forecast"
+                       + ("" if DEPOT is None else ", scaled to this depot's share of the last 90 days' sales"))
+        else:
+            st.caption("No forecast yet, so no reorder points")
+
         # ---------- LOW STOCK ALERT ----------
         low = df[df["Low"] == True]
 
@@ -486,10 +706,59 @@ if page == "Dashboard":
             st.subheader("⚠️ Low Stock Alert")
 
             st.dataframe(
-                low[["name", "stock"]],
+                low[["name", "stock", "days_of_cover", "reorder_point"]],
                 use_container_width=True
             )
 
+    # ---------- TRENDS ----------
+    st.markdown("---")
+    st.subheader("📈 Trends")
+
+    c1, c2, c3 = st.columns(3)
+
+    t_start = c1.date_input("From", date.today() - timedelta(days=365), key="trend_from")
+    t_end = c2.date_input("To", date.today(), key="trend_to")
+    bucket = c3.selectbox("Period", charts.BUCKETS, key="trend_bucket")
+
+    p = {"bucket": bucket, "start": t_start, "end": t_end, "depot": DEPOT}
+
+    # Aggregated per period in SQL, then thinned to a fixed point budget
+    sales = charts.downsample(get_df(charts.SALES_OVER_TIME, p), "period", "quantity")
+
+    if sales.empty:
+
+        st.info("No sales in this range.")
+
+    else:
+
+        st.plotly_chart(
+            px.line(sales, x="period", y=["quantity", "boxes", "sales"], title="Sales Over Time"),
+            use_container_width=True
+        )
+
+        top = get_df(charts.TOP_FLAVOR_IDS, dict(p, top=charts.TOP_FLAVORS))
+        p["flavors"] = [int(f) for f in top["flavor_id"]]
+
+        trend = charts.downsample(
+            get_df(charts.FLAVOR_TREND, p), "period", "quantity", by="flavor"
+        )
+
+        st.plotly_chart(
+            px.line(trend, x="period", y="quantity", color="flavor",
+                    title=f"Top {charts.TOP_FLAVORS} Flavors"),
+            use_container_width=True
+        )
+
+        levels = charts.downsample(
+            get_df(charts.STOCK_HISTORY, p), "period", "stock", by="flavor"
+        )
+
+        st.plotly_chart(
+            px.line(levels, x="period", y="stock", color="flavor",
+                    line_shape="hv", title="Stock Level (end of period)"),
+            use_container_width=True
+        )
+
 # ---------------- FLAVORS ----------------
 
 elif page == "Flavors":
@@ -510,11 +779,12 @@ elif page == "Flavors":
         fname = name.strip()
 
         # Check if flavor exists (even inactive)
-        cur.execute("""
-        SELECT id, active FROM flavors WHERE name=%s
-        """, (fname,))
+        with pool.cursor() as cur:
+            cur.execute("""
+            SELECT id, active FROM flavors WHERE name=%s
+            """, (fname,))
 
-        row = cur.fetchone()
+            row = cur.fetchone()
 
         if row:
 
@@ -522,13 +792,16 @@ elif page == "Flavors":
 
             if not active:
                 # Reactivate flavor and reset stock
-                cur.execute("""
-                UPDATE flavors SET active=TRUE WHERE id=%s
-                """, (int(fid),))
+                with pool.transaction() as cur:
+                    cur.execute("""
+                    UPDATE flavors SET active=TRUE WHERE id=%s
+                    """, (int(fid),))
 
-                cur.execute("""
-                UPDATE inventory SET stock=0 WHERE flavor_id=%s
-                """, (int(fid),))
+                    services.reset_stock(
+                        cur, fid, st.session_state.user["username"]
+                    )
+
+                invalidate("flavors", *services.STOCK_TABLES)
 
                 log(f"Reactivated flavor {fname}")
 
@@ -541,18 +814,21 @@ elif page == "Flavors":
         else:
 
             # New flavor
-            cur.execute("""
-            INSERT INTO flavors(name)
-            VALUES(%s)
-            RETURNING id
-            """, (fname,))
+            with pool.cursor() as cur:
+                cur.execute("""
+                INSERT INTO flavors(name)
+                VALUES(%s)
+                RETURNING id
+                """, (fname,))
 
-            fid = cur.fetchone()[0]
+                fid = cur.fetchone()[0]
 
-            cur.execute("""
-            INSERT INTO inventory(flavor_id,stock)
-            VALUES(%s,0)
-            """, (int(fid),))
+                cur.execute("""
+                INSERT INTO inventory(depot_id,flavor_id,stock)
+                SELECT id, %s, 0 FROM depots
+                """, (int(fid),))
+
+            invalidate("flavors", "inventory")
 
             log(f"Added flavor {fname}")
 
@@ -561,13 +837,7 @@ elif page == "Flavors":
 
     st.subheader("📋 Flavor List")
 
-    df = get_df("""
-    SELECT f.id,f.name,i.stock
-    FROM flavors f
-    LEFT JOIN inventory i ON f.id=i.flavor_id
-    WHERE f.active=TRUE
-    ORDER BY f.name
-    """)
+    df = get_df(queries.FLAVOR_LIST)
 
     if df.empty:
 
@@ -575,22 +845,125 @@ elif page == "Flavors":
 
     else:
 
-        for _, r in df.iterrows():
+        edit_grid(
+            "flavor_grid", df, grid.FLAVOR_COLUMNS, "flavor",
+            grid.apply_flavors, unique_name=True
+        )
+
+# ---------------- DEPOTS ----------------
+
+elif page == "Depots":
+
+    if ROLE != "admin":
+        st.stop()
+
+    st.title("🏬 Depots")
+
+    with st.form("depot_form"):
+
+        name = st.text_input("New Depot")
+
+        add = st.form_submit_button("Add")
+
+    if add and name.strip():
+
+        try:
+            pool.run(lambda cur: services.add_depot(cur, name))
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+
+        invalidate(*services.DEPOT_TABLES)
+
+        log(f"Added depot {name.strip()}")
+
+        st.success("Depot added")
+        st.rerun()
+
+    st.subheader("📦 Stock by Depot")
+
+    stock_df = get_df(queries.CURRENT_STOCK)
+
+    if stock_df.empty:
+        st.info("No stock yet")
+    else:
+        st.dataframe(
+            depot_pivot(stock_df),
+            use_container_width=True,
+            height=300
+        )
+
+    # -------- Transfer --------
 
-            c1, c2, c3 = st.columns([3,2,1])
+    st.subheader("🔁 Transfer Stock")
 
-            c1.write(r["name"])
-            c2.write(f"Stock: {r['stock']}")
+    if len(DEPOTS) < 2:
+        st.info("Add a second depot to transfer stock")
+        st.stop()
 
-            if c3.button("❌", key=f"fl_{r['id']}"):
+    c1, c2 = st.columns(2)
 
-                cur.execute("""
-                UPDATE flavors SET active=FALSE WHERE id=%s
-                """, (int(r["id"]),))
+    src = c1.selectbox("From", list(DEPOTS), format_func=DEPOTS.get, key="transfer_from")
+    dst = c2.selectbox("To", [d for d in DEPOTS if d != src], format_func=DEPOTS.get, key="transfer_to")
 
-                log(f"Deleted flavor {r['name']}")
+    stock = get_prepared_df("sale_stock", (src,))
 
-                st.rerun()
+    # Same pattern as Record Sale: one form, fresh keys after each save
+    n = st.session_state.setdefault("transfer_form_n", 0)
+
+    with st.form(f"transfer_form_{n}"):
+
+        cols = st.columns(1 if is_mobile() else 3)
+
+        qty = {}
+
+        for i, r in enumerate(stock.itertuples()):
+            qty[r.id] = cols[i % len(cols)].number_input(
+                f"{r.name} (Available: {r.stock})",
+                0,
+                step=1,
+                key=f"transfer_{n}_{r.id}"
+            )
+
+        note = st.text_input("Note")
+
+        save = st.form_submit_button("Transfer")
+
+    if save:
+
+        items = [(fid, q) for fid, q in qty.items() if q > 0]
+
+        if not items:
+            st.error("Select at least one item")
+            st.stop()
+
+        # Both depots' rows move in one transaction, retried on deadlock
+        try:
+            pool.run(lambda cur: services.transfer_stock(
+                cur, src, dst, items, st.session_state.user["username"], note
+            ))
+
+        except services.InsufficientStock as e:
+            st.error(str(e))
+            st.stop()
+
+        invalidate(*services.TRANSFER_TABLES)
+
+        log(f"Transferred {sum(q for _, q in items)} units from {DEPOTS[src]} to {DEPOTS[dst]}")
+
+        st.session_state.transfer_form_n = n + 1
+
+        st.success("Transfer recorded")
+        st.rerun()
+
+    st.subheader("History")
+
+    transfers_df = get_df(queries.TRANSFER_HISTORY)
+
+    if transfers_df.empty:
+        st.info("No transfers yet")
+    else:
+        st.dataframe(transfers_df, use_container_width=True, height=300)
 
 # ---------------- ADD STOCK ----------------
 
@@ -601,7 +974,11 @@ elif page == "Add Stock":
 
     st.title("🏭 Add Stock")
 
-    df = get_df("SELECT * FROM flavors WHERE active=TRUE")
+    require_depot()
+
+    st.caption(f"Receiving into {DEPOTS[DEPOT]}")
+
+    df = get_df(queries.ACTIVE_FLAVORS)
 
     f = st.selectbox("Flavor", df["name"])
 
@@ -611,36 +988,60 @@ elif page == "Add Stock":
 
         fid = int(df[df["name"] == f]["id"].values[0])
 
-        cur.execute("""
-        UPDATE inventory
-        SET stock = stock + %s
-        WHERE flavor_id=%s
-        """, (qty, fid))
+        pool.run(lambda cur: services.receive_stock(
+            cur, DEPOT, fid, qty, st.session_state.user["username"]
+        ))
+
+        invalidate(*services.STOCK_TABLES)
 
-        log(f"Added {qty} to {f}")
+        log(f"Added {qty} to {f} at {DEPOTS[DEPOT]}")
 
         st.success("Updated")
         st.rerun()
 
-        st.subheader("📦 Current Stock")
+    st.subheader("📦 Current Stock")
 
-    stock_df = get_df("""
-        SELECT f.name,i.stock
-        FROM flavors f
-        JOIN inventory i ON f.id=i.flavor_id
-        WHERE f.active=TRUE
-        ORDER BY f.name
-        """)
+    stock_df = get_df(queries.CURRENT_STOCK)
 
     if stock_df.empty:
         st.info("No stock yet")
     else:
         st.dataframe(
-            stock_df,
+            depot_pivot(stock_df),
             use_container_width=True,
             height=300
         )
 
+    # -------- Ledger --------
+
+    st.subheader("🕒 Stock As Of")
+
+    c1, c2 = st.columns(2)
+
+    as_day = c1.date_input("Date", date.today(), key="asof_day")
+    as_time = c2.time_input("Time", time(23, 59), key="asof_time")
+
+    asof_df = get_df(ledger.STOCK_AS_OF, {
+        "at": datetime.combine(as_day, as_time)
+    })
+
+    st.dataframe(
+        asof_df,
+        use_container_width=True,
+        height=300
+    )
+
+    if st.button("🔍 Reconcile Ledger"):
+
+        with pool.connection() as conn:
+            diff = ledger.reconcile(conn)
+
+        if diff.empty:
+            st.success("Ledger matches inventory")
+        else:
+            st.warning(f"{len(diff)} flavors differ from the ledger")
+            st.dataframe(diff, use_container_width=True)
+
 
 # ---------------- RECORD SALE ----------------
 
@@ -648,187 +1049,178 @@ elif page == "Record Sale":
 
     st.title("🧾 Record Sale")
 
-    customers = get_df("SELECT * FROM customers WHERE active=TRUE")
+    require_depot()
 
-    stock = get_df("""
-    SELECT f.id,f.name,i.stock
-    FROM flavors f
-    JOIN inventory i ON f.id=i.flavor_id
-    WHERE f.active=TRUE
-    """)
+    stock = get_prepared_df("sale_stock", (DEPOT,))
 
     # -------- Sale Form --------
 
-    if customers.empty or stock.empty:
+    if stock.empty:
 
-        st.warning("Add customers and stock first.")
+        st.warning("Add stock first.")
         st.stop()
 
-    cust = st.selectbox("Customer", customers["name"])
+    cust = customer_picker("sale_cust")
 
-    boxes = st.number_input("Total Boxes Given", 0, step=1)
+    # Quantities live inside a form, so typing them never reruns the
+    # script; stock is checked server-side by post_sale on submit. The
+    # form key changes after each saved sale to start from blank inputs.
+    n = st.session_state.setdefault("sale_form_n", 0)
 
-    items = []
+    with st.form(f"sale_form_{n}"):
 
-    st.subheader("Select Items")
+        boxes = st.number_input("Total Boxes Given", 0, step=1)
 
-    for _, r in stock.iterrows():
+        st.subheader("Select Items")
 
-        label = f"{r['name']} (Available: {r['stock']})"
+        cols = st.columns(1 if is_mobile() else 3)
 
-        q = st.number_input(
-            label,
-            0,
-            int(r["stock"]),
-            key=f"sale_{r['id']}"
-        )
+        qty = {}
 
-        if q > 0:
-            items.append((r["id"], r["name"], q))
+        for i, r in enumerate(stock.itertuples()):
+            qty[r.id] = cols[i % len(cols)].number_input(
+                f"{r.name} (Available: {r.stock})",
+                0,
+                step=1,
+                key=f"sale_{n}_{r.id}"
+            )
+
+        save = st.form_submit_button("Save Sale")
 
     # -------- Save Sale --------
 
-    if st.button("Save Sale"):
+    if save:
+
+        items = [(fid, q) for fid, q in qty.items() if q > 0]
 
-        if not items:
+        if cust is None:
 
-            st.error("Select at least one item")
+            st.error("Select a customer")
             st.stop()
 
-        cid = int(
-            customers[customers["name"] == cust]["id"].values[0]
-        )
+        if not items:
 
-        # Insert sale
-        cur.execute("""
-        INSERT INTO sales(customer_id,total_boxes,sale_date,created_by)
-        VALUES(%s,%s,%s,%s)
-        RETURNING id
-        """, (
-            cid,
-            int(boxes),
-            date.today().isoformat(),
-            st.session_state.user["username"]
-        ))
+            st.error("Select at least one item")
+            st.stop()
 
-        sid = cur.fetchone()[0]
+        # One transaction: stock check + decrement, sale row, line items.
+        # Retried if it loses a deadlock to a concurrent sale.
+        try:
+            pool.run(lambda cur: services.post_sale(
+                cur,
+                DEPOT,
+                cust["id"],
+                int(boxes),
+                items,
+                st.session_state.user["username"]
+            ))
 
-        # Insert items + update stock
-        for fid, name, q in items:
+        except (services.InsufficientStock, ValueError) as e:
+            st.error(str(e))
+            st.stop()
 
-            cur.execute("""
-            INSERT INTO sale_items(sale_id,flavor_id,quantity)
-            VALUES(%s,%s,%s)
-            """, (sid, fid, int(q)))
+        invalidate(*services.SALE_TABLES)
 
-            cur.execute("""
-            UPDATE inventory
-            SET stock = stock - %s
-            WHERE flavor_id=%s
-            """, (int(q), fid))
+        log(f"Sale to {cust['name']}")
 
-        log(f"Sale to {cust}")
+        st.session_state.sale_form_n = n + 1
 
         st.success("Sale recorded successfully")
         st.rerun()
 
     # -------- Sales History --------
 
-    st.subheader("📋 Sales History")
-
-    sales_df = get_df("""
-    SELECT
-        s.sale_date,
-        c.name AS customer,
-        f.name AS flavor,
-        si.quantity,
-        s.total_boxes,
-        s.created_by
-    FROM sales s
-    JOIN customers c ON s.customer_id = c.id
-    JOIN sale_items si ON s.id = si.sale_id
-    JOIN flavors f ON si.flavor_id = f.id
-    ORDER BY s.id DESC
-    LIMIT 50
-    """)
+    sales_history()
 
-    if sales_df.empty:
+# ---------------- RETURNS ----------------
 
-        st.info("No sales recorded yet.")
+elif page == "Returns":
 
-    else:
+    st.title("↩️ Returns")
 
-        sales_df.columns = [
-            "Date",
-            "Customer",
-            "Flavor",
-            "Quantity",
-            "Boxes Given",
-            "Staff"
-        ]
+    require_depot()
 
-        st.dataframe(
-            sales_df,
-            use_container_width=True,
-            height=400
-        )
+    cust = customer_picker("ret_cust")
 
-# ---------------- RETURNS ----------------
+    if cust is not None:
 
-elif page == "Returns":
+        boxes = get_df(queries.CUSTOMER_BOXES, (int(cust["id"]),))
 
-    st.title("↩️ Returns")
+        if not boxes.empty:
+            b = boxes.iloc[0]
+            st.caption(
+                f"Boxes outstanding: {int(b['outstanding'])} "
+                f"({int(b['boxes_out'])} out, {int(b['boxes_returned'])} returned, "
+                f"{int(b['boxes_damaged'])} damaged)"
+            )
 
-    custs = get_df("SELECT name FROM customers WHERE active=TRUE")
+    stock = get_prepared_df("sale_stock", (DEPOT,))
 
-    cname = st.selectbox("Customer", custs["name"])
+    # Same pattern as Record Sale: one form, fresh keys after each save
+    n = st.session_state.setdefault("ret_form_n", 0)
 
-    rbox = st.number_input("Returned Boxes", 0)
-    dbox = st.number_input("Damaged Boxes", 0)
-    dbot = st.number_input("Damaged Bottles", 0)
+    with st.form(f"ret_form_{n}"):
 
-    note = st.text_input("Note")
+        c1, c2 = st.columns(2)
 
-    if st.button("Save Return"):
+        rbox = c1.number_input("Returned Boxes", 0, step=1)
+        dbox = c2.number_input("Damaged Boxes", 0, step=1)
 
-        cur.execute("""
-        INSERT INTO returns(
-            customer_name,
-            return_date,
-            returned_boxes,
-            damaged_boxes,
-            damaged_bottles,
-            note,
-            created_by
-        )
-        VALUES(%s,%s,%s,%s,%s,%s,%s)
-        """, (
-            cname,
-            date.today().isoformat(),
-            rbox,
-            dbox,
-            dbot,
-            note,
-            st.session_state.user["username"]
-        ))
+        st.subheader("Returned Bottles")
+        st.caption("Good bottles go back into stock; damaged ones are written off.")
+
+        lines = {}
+
+        for r in stock.itertuples():
+
+            c1, c2 = st.columns(2)
+
+            lines[r.id] = (
+                c1.number_input(f"{r.name} returned", 0, step=1, key=f"ret_{n}_{r.id}"),
+                c2.number_input(f"{r.name} damaged", 0, step=1, key=f"ret_{n}_{r.id}_d")
+            )
+
+        note = st.text_input("Note")
+
+        save = st.form_submit_button("Save Return")
+
+    if save:
+
+        if cust is None:
+            st.error("Select a customer")
+            st.stop()
 
-        log(f"Return from {cname}")
+        items = [(fid, ret, dmg) for fid, (ret, dmg) in lines.items() if ret or dmg]
+
+        # Restock, write-off, return row and rollups in one transaction
+        try:
+            pool.run(lambda cur: services.post_return(
+                cur,
+                DEPOT,
+                cust["id"],
+                int(rbox),
+                int(dbox),
+                items,
+                note,
+                st.session_state.user["username"]
+            ))
+
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+
+        invalidate(*services.RETURN_TABLES)
+
+        log(f"Return from {cust['name']}")
+
+        st.session_state.ret_form_n = n + 1
 
         st.success("Saved")
         st.rerun()
-        st.subheader("History")
 
-    df = get_df("SELECT * FROM returns ORDER BY id DESC")
+    st.subheader("History")
 
-    if df.empty:
-        st.info("No returns recorded yet.")
-    else:
-
-        st.dataframe(
-            df,
-            use_container_width=True,
-            height=400
-        )
+    paged_table("returns", "return_date", "No returns recorded yet.")
 
 
 
@@ -838,44 +1230,40 @@ elif page == "Customers":
 
     st.title("👥 Customers")
 
-    df = get_df("SELECT * FROM customers WHERE active=TRUE ORDER BY id DESC")
+    df = get_df(queries.CUSTOMER_LIST)
 
     st.subheader("➕ Add / Update Customer")
 
-    with st.form("cust_form"):
+    mode = st.radio("Mode", ["New", "Edit"], horizontal=True)
 
-        cid = st.selectbox(
-            "Select (For Edit)",
-            ["New"] + df["name"].tolist()
-        )
+    row = None
 
-        name = st.text_input("Name")
-        phone = st.text_input("Phone")
-        shop = st.text_input("Shop")
-        area = st.text_input("Area")
+    if mode == "Edit":
+        row = customer_picker("cust_edit", "Customer To Edit")
 
-        save = st.form_submit_button("Save")
+    # Pre-filled from the picked customer when editing
+    prefill = row or {}
 
-    # Load existing
-    if cid != "New":
+    with st.form("cust_form"):
 
-        row = df[df["name"] == cid].iloc[0]
+        name = st.text_input("Name", value=prefill.get("name") or "")
+        phone = st.text_input("Phone", value=prefill.get("phone") or "")
+        shop = st.text_input("Shop", value=prefill.get("shop") or "")
+        area = st.text_input("Area", value=prefill.get("area") or "")
 
-        name = row["name"]
-        phone = row["phone"]
-        shop = row["shop"]
-        area = row["area"]
+        save = st.form_submit_button("Save", disabled=mode == "Edit" and row is None)
 
     if save:
 
-        if cid == "New":
+        if row is None:
 
             # Check if customer exists (even inactive)
-            cur.execute("""
-            SELECT id, active FROM customers WHERE name=%s
-            """, (name,))
+            with pool.cursor() as cur:
+                cur.execute("""
+                SELECT id, active FROM customers WHERE name=%s
+                """, (name,))
 
-            row2 = cur.fetchone()
+                row2 = cur.fetchone()
 
             if row2:
 
@@ -884,11 +1272,14 @@ elif page == "Customers":
                 if not active2:
 
                     # Reactivate and update
-                    cur.execute("""
-                    UPDATE customers
-                    SET phone=%s, shop=%s, area=%s, active=TRUE
-                    WHERE id=%s
-                    """, (phone, shop, area, cid2))
+                    with pool.cursor() as cur:
+                        cur.execute("""
+                        UPDATE customers
+                        SET phone=%s, shop=%s, area=%s, active=TRUE
+                        WHERE id=%s
+                        """, (phone, shop, area, cid2))
+
+                    invalidate("customers")
 
                     log(f"Reactivated customer {name}")
 
@@ -901,23 +1292,29 @@ elif page == "Customers":
             else:
 
                 # New customer
-                cur.execute("""
-                INSERT INTO customers(name,phone,shop,area)
-                VALUES(%s,%s,%s,%s)
-                """, (name, phone, shop, area))
+                with pool.cursor() as cur:
+                    cur.execute("""
+                    INSERT INTO customers(name,phone,shop,area)
+                    VALUES(%s,%s,%s,%s)
+                    """, (name, phone, shop, area))
+
+                invalidate("customers")
 
                 log(f"Added customer {name}")
 
         else:
 
-            cur.execute("""
-            UPDATE customers
-            SET name=%s, phone=%s, shop=%s, area=%s
-            WHERE id=%s
-            """, (
-                name, phone, shop, area,
-                int(row["id"])
-            ))
+            with pool.cursor() as cur:
+                cur.execute("""
+                UPDATE customers
+                SET name=%s, phone=%s, shop=%s, area=%s
+                WHERE id=%s
+                """, (
+                    name, phone, shop, area,
+                    int(row["id"])
+                ))
+
+            invalidate("customers")
 
             log(f"Updated customer {name}")
 
@@ -926,26 +1323,224 @@ elif page == "Customers":
 
     st.subheader("📋 Customer List")
 
-    for _, r in df.iterrows():
+    if df.empty:
 
-        c1, c2, c3, c4, c5 = st.columns([2,2,2,2,1])
+        st.info("No customers yet")
 
-        c1.write(r["name"])
-        c2.write(r["phone"])
-        c3.write(r["shop"])
-        c4.write(r["area"])
+    else:
 
-        if ROLE == "admin":
+        st.metric("Boxes outstanding", int(df["boxes_outstanding"].sum()))
 
-            if c5.button("❌", key=f"del_{r['id']}"):
+        # Only admins may deactivate
+        edit_grid(
+            "customer_grid", df, grid.CUSTOMER_COLUMNS, "customer",
+            grid.apply_customers,
+            disabled=() if ROLE == "admin" else ("deactivate",)
+        )
 
-                cur.execute("""
-                UPDATE customers SET active=FALSE WHERE id=%s
-                """, (int(r["id"]),))
+# ---------------- REPORTS ----------------
 
-                log(f"Deleted customer {r['name']}")
+elif page == "Reports":
 
-                st.rerun()
+    if ROLE != "admin":
+        st.stop()
+
+    st.title("📈 Reports")
+
+    c1, c2, c3, c4 = st.columns(4)
+
+    start = c1.date_input("From", date.today() - timedelta(days=30))
+    end = c2.date_input("To", date.today())
+    by = c3.selectbox("Group By", list(rollups.REPORTS))
+    bucket = c4.selectbox("Period", ["day", "week", "month", "year"])
+
+    # Reads only the daily rollups, never raw sales
+    df = get_df(rollups.REPORTS[by], {
+        "bucket": bucket,
+        "start": start,
+        "end": end
+    })
+
+    if df.empty:
+
+        st.info("No sales in this range.")
+
+    else:
+
+        col1, col2, col3 = st.columns(3)
+
+        col1.metric("Quantity Sold", int(df["quantity"].sum()))
+        # A sale with several flavors counts once per flavor here
+        col2.metric(
+            "Sale Lines" if by == "Flavor" else "Sales",
+            int(df["sales"].sum())
+        )
+
+        if "boxes" in df:
+            col3.metric("Boxes Given", int(df["boxes"].sum()))
+
+        st.subheader(f"📋 By {by}")
+
+        st.dataframe(
+            df,
+            use_container_width=True,
+            height=400
+        )
+
+        st.subheader("Totals")
+
+        st.dataframe(
+            df.drop(columns=["period"])
+              .groupby(df.columns[1], dropna=False)
+              .sum()
+              .sort_values("quantity", ascending=False),
+            use_container_width=True
+        )
+
+# ---------------- BULK IMPORT ----------------
+
+elif page == "Bulk Import":
+
+    if ROLE != "admin":
+        st.stop()
+
+    st.title("📥 Bulk Import")
+
+    kind = st.radio("Import", list(bulk_import.KINDS), horizontal=True)
+
+    st.caption("Columns: " + ", ".join(bulk_import.KINDS[kind]))
+
+    upload = st.file_uploader("CSV or Excel file", type=["csv", "xlsx", "xls"])
+
+    if upload is None:
+        st.stop()
+
+    try:
+
+        raw = bulk_import.read_upload(upload, upload.name)
+
+        # Validate against fresh data, not the page cache
+        if kind == "Stock Receipts":
+
+            require_depot()
+
+            plan = bulk_import.validate_stock(raw, read_df(f"""
+            SELECT f.id,f.name,i.stock
+            FROM flavors f
+            LEFT JOIN ({queries.ONE_DEPOT}) i ON f.id=i.flavor_id
+            WHERE f.active=TRUE
+            """, (DEPOT,)))
+        else:
+            plan = bulk_import.validate_customers(raw, read_df("""
+            SELECT id,name,phone,shop,area,active FROM customers
+            """))
+
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+    st.write(f"{len(raw)} lines read, {len(plan.rows)} to apply, {len(plan.errors)} rejected")
+
+    if not plan.errors.empty:
+        st.subheader("⚠️ Rejected Lines")
+        st.dataframe(plan.errors, use_container_width=True)
+
+    st.subheader("🔍 Dry Run")
+    st.dataframe(plan.diff, use_container_width=True, height=400)
+
+    if plan.rows.empty:
+        st.info("Nothing to apply")
+        st.stop()
+
+    # Guards against a second click re-applying the same receipts
+    digest = hashlib.sha256(upload.getvalue()).hexdigest()
+
+    if st.session_state.get("last_import") == digest:
+        st.success("This file has been imported")
+        st.stop()
+
+    if st.button("Apply Import"):
+
+        user = st.session_state.user["username"]
+
+        # COPY into staging + one set-based merge, all in one transaction
+        if kind == "Stock Receipts":
+            pool.run(lambda cur: bulk_import.apply_stock(cur, DEPOT, plan, user))
+        else:
+            pool.run(lambda cur: bulk_import.apply_customers(cur, plan))
+
+        if kind == "Stock Receipts":
+            invalidate(*services.STOCK_TABLES)
+            log(f"Imported stock for {len(plan.rows)} flavors ({int(plan.rows['quantity'].sum())} units) into {DEPOTS[DEPOT]} from {upload.name}")
+        else:
+            invalidate("customers")
+            log(f"Imported {len(plan.rows)} customers from {upload.name}")
+
+        st.session_state.last_import = digest
+        st.rerun()
+
+# ---------------- EXPORT ----------------
+
+elif page == "Export":
+
+    if ROLE != "admin":
+        st.stop()
+
+    st.title("📤 Export")
+
+    labels = {
+        "sales": "Sales Lines",
+        "returns": "Returns",
+        "activity": "Activity Log"
+    }
+
+    c1, c2, c3, c4 = st.columns(4)
+
+    kind = c1.selectbox("Data", list(export.EXPORTS), format_func=labels.get)
+    start = c2.date_input("From", date.today() - timedelta(days=30), key="exp_from")
+    end = c3.date_input("To", date.today(), key="exp_to")
+    fmt = c4.selectbox("Format", ["csv", "parquet"])
+
+    if st.button("Prepare Export"):
+
+        old = st.session_state.pop("export_file", None)
+
+        if old and os.path.exists(old["path"]):
+            os.remove(old["path"])
+
+        # Rows stream from a server-side cursor straight into a temp file
+        tmp = tempfile.NamedTemporaryFile(
+            mode="wb" if fmt == "parquet" else "w",
+            newline=None if fmt == "parquet" else "",
+            suffix=f".{fmt}",
+            delete=False
+        )
+
+        with tmp:
+            with pool.transaction(name=f"export_{kind}", itersize=export.CHUNK_ROWS) as cur:
+                n = export.write(cur, kind, start, end, fmt, tmp)
+
+        st.session_state.export_file = {
+            "path": tmp.name,
+            "name": f"{kind}_{start}_{end}.{fmt}",
+            "rows": n
+        }
+
+        log(f"Exported {n} {labels[kind]} rows ({start} to {end})")
+
+    ex = st.session_state.get("export_file")
+
+    if ex and os.path.exists(ex["path"]):
+
+        st.write(f"{ex['rows']} rows ready")
+
+        with open(ex["path"], "rb") as f:
+            st.download_button(
+                "⬇️ Download",
+                f,
+                file_name=ex["name"],
+                mime="application/octet-stream"
+            )
 
 elif page == "Users":
 
@@ -954,7 +1549,7 @@ elif page == "Users":
 
     st.title("👤 User Management")
 
-    df = get_df("SELECT id,username,role FROM users ORDER BY id")
+    df = get_df(queries.USER_LIST)
 
     st.subheader("➕ Add Staff")
 
@@ -973,14 +1568,17 @@ elif page == "Users":
 
             try:
 
-                cur.execute("""
-                INSERT INTO users(username,password,role)
-                VALUES(%s,%s,%s)
-                """, (
-                    uname,
-                    hash_pass(pwd),
-                    role
-                ))
+                with pool.cursor() as cur:
+                    cur.execute("""
+                    INSERT INTO users(username,password,role)
+                    VALUES(%s,%s,%s)
+                    """, (
+                        uname,
+                        hash_pass(pwd),
+                        role
+                    ))
+
+                invalidate("users")
 
                 log(f"Created user {uname}")
 
@@ -1004,10 +1602,42 @@ elif page == "Admin Activity":
 
     st.title("🛡️ Activity Log")
 
-    df = get_df("SELECT * FROM activity_logs ORDER BY id DESC")
+    paged_table("activity_logs", "log_date", "No activity yet.")
 
-    st.dataframe(
-        df,
-        use_container_width=True,
-        height=400
-    )
\ No newline at end of file
+
+# ---------------- QUERY PANEL ----------------
+
+# Rendered last so it covers every statement this rerun issued. Reruns cut
+# short by st.rerun()/st.stop() don't reach here and aren't counted.
+rerun_queries = metrics.rerun_queries()
+metrics.registry.end_rerun(page, rerun_queries)
+
+if ROLE == "admin":
+
+    with st.sidebar.expander("⏱️ Queries"):
+
+        st.metric(
+            "This rerun",
+            f"{len(rerun_queries)} queries",
+            f"{sum(ms for _, ms, _ in rerun_queries):.1f} ms",
+            delta_color="off"
+        )
+
+        if rerun_queries:
+            st.dataframe(
+                pd.DataFrame(rerun_queries, columns=["statement", "ms", "rows"]),
+                use_container_width=True
+            )
+
+        st.caption(f"Slowest statements since start (>{metrics.registry.slow_ms:g} ms is logged)")
+        st.dataframe(
+            pd.DataFrame(metrics.registry.top(10)),
+            use_container_width=True
+        )
+
+        st.download_button(
+            "Prometheus metrics",
+            metrics.registry.prometheus(),
+            "metrics.txt",
+            "text/plain"
+        )
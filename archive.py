@@ -0,0 +1,229 @@
+# archive.py
+#
+# Retention for the monthly partitions (see partitions.py). archive()
+# writes every month older than ARCHIVE_KEEP_MONTHS to a zstd Parquet file
+# per table under ARCHIVE_DIR, then detaches and drops its partitions.
+# Archived months stay readable through read_archive() and the `read`
+# command; their daily rollups are kept, so Reports still cover them.
+#
+# Usage:
+#   python archive.py run [--keep 24] [--dry-run]
+#   python archive.py list                  archived months per table
+#   python archive.py read sales --from 2023-01-01 --to 2023-03-31 [-o FILE]
+
+import argparse
+import os
+import re
+import sys
+from datetime import date
+
+import pandas as pd
+from psycopg2 import sql
+
+import db
+import export
+import partitions
+
+ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "24"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+
+def archive_path(table, month, directory=ARCHIVE_DIR):
+    return os.path.join(directory, table, f"{month:%Y-%m}.parquet")
+
+
+# {month: file} for the archived months of a table
+def archived(table, directory=ARCHIVE_DIR):
+
+    folder = os.path.join(directory, table)
+
+    if not os.path.isdir(folder):
+        return {}
+
+    out = {}
+
+    for fn in os.listdir(folder):
+
+        m = re.match(r"^(\d{4})-(\d{2})\.parquet$", fn)
+
+        if m:
+            out[date(int(m.group(1)), int(m.group(2)), 1)] = os.path.join(folder, fn)
+
+    return dict(sorted(out.items()))
+
+
+# Months (across all tables) older than the retention horizon
+def expired(cur, keep=ARCHIVE_KEEP_MONTHS):
+
+    cutoff = partitions.add_months(partitions.month_start(date.today()), -keep)
+
+    months = set()
+
+    for table in partitions.TABLES:
+        months.update(m for m in partitions.partitions(cur, table) if m < cutoff)
+
+    return sorted(months)
+
+
+# Archives one month of every table in one transaction: the partitions are
+# locked against writes (reads carry on), written out, then detached and
+# dropped. A failure rolls everything back and leaves at most a stale file
+# that the next run overwrites.
+def archive_month(conn, month, directory=ARCHIVE_DIR):
+
+    written = {}
+
+    with conn:
+
+        with conn.cursor() as cur:
+
+            have = {
+                table: partitions.partitions(cur, table).get(month)
+                for table in partitions.TABLES
+            }
+
+            have = {t: p for t, p in have.items() if p}
+
+            if have:
+                cur.execute(sql.SQL("LOCK TABLE {} IN SHARE MODE").format(
+                    sql.SQL(", ").join(sql.Identifier(p) for p in have.values())
+                ))
+
+        for table, part in have.items():
+
+            path = archive_path(table, month, directory)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Written beside the final name and renamed, so a file under
+            # the month's name is always complete.
+            tmp = path + ".tmp"
+
+            with open(tmp, "wb") as f:
+                with conn.cursor(name=f"archive_{part}") as cur:
+                    written[table] = export.write_query_parquet(
+                        cur,
+                        sql.SQL("SELECT * FROM {} ORDER BY id").format(sql.Identifier(part)),
+                        None,
+                        f
+                    )
+
+            os.replace(tmp, path)
+
+        with conn.cursor() as cur:
+
+            for table, part in have.items():
+
+                cur.execute(sql.SQL("ALTER TABLE {t} DETACH PARTITION {p}").format(
+                    t=sql.Identifier(table), p=sql.Identifier(part)
+                ))
+
+                cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(part)))
+
+    return written
+
+
+def archive(conn, keep=ARCHIVE_KEEP_MONTHS, directory=ARCHIVE_DIR, log=None):
+
+    with conn.cursor() as cur:
+        months = expired(cur, keep)
+
+    conn.commit()
+
+    for month in months:
+
+        written = archive_month(conn, month, directory)
+
+        if log:
+            log(f"Archived {month:%Y-%m}: " + ", ".join(
+                f"{t} {n}" for t, n in written.items()
+            ))
+
+    return months
+
+
+# Rows of archived months of `table`, optionally narrowed to a date range.
+def read_archive(table, start=None, end=None, directory=ARCHIVE_DIR):
+
+    files = [
+        path for month, path in archived(table, directory).items()
+        if (start is None or month >= partitions.month_start(start))
+        and (end is None or month <= end)
+    ]
+
+    if not files:
+        return pd.DataFrame()
+
+    df = pd.concat([pd.read_parquet(p) for p in files], ignore_index=True)
+
+    day = pd.to_datetime(df[partitions.TABLES[table]]).dt.date
+
+    if start is not None:
+        df = df[day >= start]
+    if end is not None:
+        df = df[day <= end]
+
+    return df.reset_index(drop=True)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Archive old monthly partitions")
+    parser.add_argument("command", choices=["run", "list", "read"])
+    parser.add_argument("table", nargs="?", choices=list(partitions.TABLES))
+    parser.add_argument("--keep", type=int, default=ARCHIVE_KEEP_MONTHS, help="months kept in the database")
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+    parser.add_argument("-o", "--output", help="read: write CSV here instead of printing")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "read":
+
+        if args.table is None:
+            parser.error("read needs a table")
+
+        df = read_archive(args.table, args.start, args.end, args.dir)
+
+        if args.output:
+            df.to_csv(args.output, index=False)
+            print(f"Wrote {len(df)} rows to {args.output}")
+        else:
+            print(df.to_string(index=False))
+
+        return 0
+
+    if args.command == "list":
+
+        for table in partitions.TABLES:
+            months = ", ".join(f"{m:%Y-%m}" for m in archived(table, args.dir))
+            print(f"{table}: {months or 'nothing archived'}")
+
+        return 0
+
+    conn = db.get_conn()
+
+    try:
+
+        if args.dry_run:
+
+            with conn.cursor() as cur:
+                months = expired(cur, args.keep)
+
+            conn.rollback()
+
+            print("Would archive " + ", ".join(f"{m:%Y-%m}" for m in months) if months else "Nothing to archive")
+
+        else:
+            months = archive(conn, args.keep, args.dir, log=print)
+
+            if not months:
+                print("Nothing to archive")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
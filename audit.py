@@ -0,0 +1,198 @@
+# audit.py
+#
+# Background writer for activity_logs. log() only enqueues; a worker
+# thread drains the queue and writes each batch with one multi-row INSERT.
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+import partitions
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_SECS = float(os.getenv("AUDIT_FLUSH_SECS", "1"))
+
+# How long log() blocks on a full queue before writing inline instead.
+AUDIT_PUT_TIMEOUT = float(os.getenv("AUDIT_PUT_TIMEOUT", "2"))
+
+RETRIES = 5
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+
+    def __init__(
+        self,
+        pool,
+        maxsize=AUDIT_QUEUE_SIZE,
+        batch_size=AUDIT_BATCH_SIZE,
+        flush_secs=AUDIT_FLUSH_SECS,
+        put_timeout=AUDIT_PUT_TIMEOUT,
+        on_flush=None
+    ):
+
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_secs = flush_secs
+        self.put_timeout = put_timeout
+        self.on_flush = on_flush
+
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "batches": 0,
+            "inline_writes": 0,
+            "failed": 0,
+            "flush_ms_total": 0.0,
+            "flush_ms_last": 0.0,
+            "flush_ms_max": 0.0
+        }
+
+        self._thread = threading.Thread(
+            target=self._run,
+            name="audit-writer",
+            daemon=True
+        )
+        self._thread.start()
+
+        atexit.register(self.close)
+
+    # ---------------- PRODUCERS ----------------
+
+    def log(self, username, action):
+        self.log_many([(username, action)])
+
+    def log_many(self, entries):
+
+        now = datetime.now(timezone.utc)
+
+        for username, action in entries:
+
+            event = (username, action, now)
+
+            if self._stop.is_set():
+                self._count("inline_writes")
+                self._flush([event])
+                continue
+
+            try:
+                # Backpressure: block the caller while the writer catches up
+                self._queue.put(event, timeout=self.put_timeout)
+                self._count("enqueued")
+
+            except queue.Full:
+                # Never drop audit entries; pay the round-trip instead
+                self._count("inline_writes")
+                self._flush([event])
+
+    # ---------------- WORKER ----------------
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _drain(self):
+
+        batch = []
+        deadline = time.monotonic() + self.flush_secs
+
+        while len(batch) < self.batch_size:
+
+            if self._stop.is_set():
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                continue
+
+            timeout = deadline - time.monotonic()
+
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _write(self, batch):
+
+        with self.pool.cursor() as cur:
+
+            # activity_logs is partitioned by month
+            partitions.ensure_current(cur)
+
+            execute_values(cur, """
+            INSERT INTO activity_logs(username,action,log_date)
+            VALUES %s
+            """, batch, page_size=len(batch))
+
+    def _flush(self, batch):
+
+        t = time.perf_counter()
+
+        for attempt in range(RETRIES):
+
+            try:
+                self._write(batch)
+                break
+
+            except Exception:
+
+                if attempt == RETRIES - 1:
+                    logger.exception("Dropping %d audit entries: %r", len(batch), batch)
+                    self._count("failed", len(batch))
+                    return
+
+                time.sleep(min(0.1 * 2 ** attempt, 2))
+
+        ms = (time.perf_counter() - t) * 1000
+
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["flush_ms_total"] += ms
+            self._stats["flush_ms_last"] = ms
+            self._stats["flush_ms_max"] = max(self._stats["flush_ms_max"], ms)
+
+        if self.on_flush:
+            self.on_flush()
+
+    def _run(self):
+
+        while not (self._stop.is_set() and self._queue.empty()):
+
+            batch = self._drain()
+
+            if batch:
+                self._flush(batch)
+
+    def close(self, timeout=10):
+
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+
+        with self._lock:
+            s = dict(self._stats)
+
+        s["queue_depth"] = self._queue.qsize()
+        s["flush_ms_avg"] = round(s["flush_ms_total"] / s["batches"], 2) if s["batches"] else 0.0
+        s["alive"] = self._thread.is_alive()
+
+        return s
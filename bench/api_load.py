@@ -0,0 +1,221 @@
+# bench/api_load.py
+#
+# Load test for api.py: N concurrent clients post sales (plus some returns
+# and stock reads) for a fixed time and report writes per second and
+# latency. A share of requests is retried with the same Idempotency-Key to
+# check that retries replay instead of posting twice.
+#
+# Without --url the API is started in this process against a dataset
+# from bench/seed.py (sales posted here are real rows in that schema).
+#
+# Usage:
+#   python -m bench.api_load [--schema bench_data] [--clients 50] [--seconds 30]
+#   python -m bench.api_load --url http://host:8080 --user admin --password admin123
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+
+import aiohttp
+from aiohttp import web
+
+import api
+import db
+
+from bench import seed
+
+PORT = 18080
+
+
+async def worker(session, url, ctx, deadline, stats, rnd):
+
+    while time.monotonic() < deadline:
+
+        roll = rnd.random()
+
+        if roll < 0.05:
+            t = time.perf_counter()
+            async with session.get(f"{url}/stock") as r:
+                await r.read()
+            stats["reads"].append((time.perf_counter() - t) * 1000)
+            continue
+
+        if roll < 0.15:
+            path = "/returns"
+            body = {
+                "customer_id": rnd.choice(ctx["customers"]),
+                "returned_boxes": rnd.randint(0, 5),
+                "damaged_boxes": rnd.randint(0, 1),
+                "items": [
+                    {"flavor_id": fid, "returned": rnd.randint(0, 3), "damaged": rnd.randint(0, 1)}
+                    for fid in rnd.sample(ctx["flavors"], min(2, len(ctx["flavors"])))
+                ]
+            }
+        else:
+            path = "/sales"
+            body = {
+                "customer_id": rnd.choice(ctx["customers"]),
+                "total_boxes": rnd.randint(1, 10),
+                "items": [
+                    {"flavor_id": fid, "quantity": rnd.randint(1, 5)}
+                    for fid in rnd.sample(ctx["flavors"], min(ctx["items"], len(ctx["flavors"])))
+                ]
+            }
+
+        key = str(uuid.uuid4())
+        headers = {"Idempotency-Key": key}
+
+        t = time.perf_counter()
+
+        async with session.post(f"{url}{path}", json=body, headers=headers) as r:
+            first = await r.json()
+            status = r.status
+
+        stats["writes"].append((time.perf_counter() - t) * 1000)
+        stats["status"][status] = stats["status"].get(status, 0) + 1
+
+        # Simulate a client that lost the response and retried
+        if status == 201 and rnd.random() < ctx["retry_rate"]:
+
+            async with session.post(f"{url}{path}", json=body, headers=headers) as r:
+                again = await r.json()
+
+            stats["retries"] += 1
+
+            if not again.get("replayed") or {k: v for k, v in again.items() if k != "replayed"} != first:
+                stats["duplicates"] += 1
+
+
+def context(args):
+
+    conn = db.get_conn()
+
+    try:
+        with conn.cursor() as cur:
+
+            cur.execute("SELECT id FROM flavors WHERE active ORDER BY id")
+            flavors = [r[0] for r in cur.fetchall()]
+
+            cur.execute("SELECT id FROM customers WHERE active ORDER BY id LIMIT 1000")
+            customers = [r[0] for r in cur.fetchall()]
+
+    finally:
+        conn.close()
+
+    if not flavors or not customers:
+        raise SystemExit("No data; run python -m bench.seed first")
+
+    return {
+        "flavors": flavors,
+        "customers": customers,
+        "items": args.items,
+        "retry_rate": args.retry_rate
+    }
+
+
+def pct(values, p):
+
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+
+    return values[max(0, int(len(values) * p) - 1)]
+
+
+async def run(args):
+
+    runner = None
+    url = args.url
+
+    if url is None:
+
+        runner = web.AppRunner(api.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+        url = f"http://127.0.0.1:{PORT}"
+
+    ctx = context(args)
+
+    stats = {"writes": [], "reads": [], "status": {}, "retries": 0, "duplicates": 0}
+
+    auth = aiohttp.BasicAuth(args.user, args.password)
+    connector = aiohttp.TCPConnector(limit=args.clients)
+
+    try:
+        async with aiohttp.ClientSession(auth=auth, connector=connector) as session:
+
+            t = time.monotonic()
+            deadline = t + args.seconds
+
+            await asyncio.gather(*[
+                worker(session, url, ctx, deadline, stats, random.Random(i))
+                for i in range(args.clients)
+            ])
+
+            elapsed = time.monotonic() - t
+
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    w = stats["writes"]
+
+    result = {
+        "clients": args.clients,
+        "seconds": round(elapsed, 1),
+        "writes": len(w),
+        "writes_per_sec": round(len(w) / elapsed, 1),
+        "write_p50_ms": round(statistics.median(w), 2) if w else 0.0,
+        "write_p95_ms": round(pct(w, 0.95), 2),
+        "write_max_ms": round(max(w), 2) if w else 0.0,
+        "reads": len(stats["reads"]),
+        "read_p50_ms": round(statistics.median(stats["reads"]), 2) if stats["reads"] else 0.0,
+        "status": {str(k): v for k, v in sorted(stats["status"].items())},
+        "retries": stats["retries"],
+        "duplicates": stats["duplicates"]
+    }
+
+    return result
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="API load test")
+    parser.add_argument("--url", help="target a running API instead of starting one")
+    parser.add_argument("--schema", default=seed.SCHEMA)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--items", type=int, default=5, help="flavors per sale")
+    parser.add_argument("--retry-rate", type=float, default=0.05)
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--json", help="write results to this file")
+
+    args = parser.parse_args(argv)
+
+    # A remote API must share the database the DB_* settings point at,
+    # which is where flavor and customer ids are read from.
+    if args.url is None:
+        seed.use_schema(args.schema)
+
+    result = asyncio.run(run(args))
+
+    for k, v in result.items():
+        print(f"  {k:<16} {v}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    return 1 if result["duplicates"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
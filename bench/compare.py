@@ -0,0 +1,58 @@
+# bench/compare.py
+#
+# Side-by-side p50 of two bench/run.py result files, e.g. before and after
+# a change to a page's queries.
+#
+# Usage:
+#   python -m bench.compare base.json head.json [--threshold 10]
+
+import argparse
+import json
+import sys
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10, help="percent change to flag")
+
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    print(f"base {base.get('commit')}  {base.get('dataset')}")
+    print(f"head {head.get('commit')}  {head.get('dataset')}")
+    print()
+    print(f"{'page':<16} {'query':<18} {'base ms':>9} {'head ms':>9} {'change':>8}")
+
+    slower = 0
+
+    for page, qs in head["results"].items():
+        for name, r in qs.items():
+
+            old = base["results"].get(page, {}).get(name)
+
+            if old is None:
+                print(f"{page:<16} {name:<18} {'-':>9} {r['p50_ms']:>9.2f} {'new':>8}")
+                continue
+
+            pct = (r["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0
+            flag = ""
+
+            if pct >= args.threshold:
+                flag = " !"
+                slower += 1
+
+            print(f"{page:<16} {name:<18} {old['p50_ms']:>9.2f} {r['p50_ms']:>9.2f} {pct:>+7.0f}%{flag}")
+
+    # Non-zero exit lets CI fail on a regression
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# bench/contention.py
+#
+# Contention harness for services.post_sale. N worker threads post sales
+# against the same few "hot" flavors as fast as they can, through one
+# db.Pool and Pool.run() exactly like the pages and the API. With
+# --depots N the sales are spread over N depots, whose inventory and
+# flavor/area rollup rows are locked independently; each customer buys
+# from one depot, as shops do, so sales/second should grow with N.
+# Afterwards it checks that nothing was oversold: every depot's stock of
+# each flavor is the opening stock minus what its sales say was sold,
+# never negative, and the ledger still reconciles.
+#
+# Runs in a scratch schema (migrations applied, small synthetic data).
+#
+# Usage:
+#   python -m bench.contention [--workers 16] [--seconds 20] [--hot 5] [--stock 2000] [--depots 1]
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+import db
+import ledger
+import migrate
+import services
+
+from bench import seed
+
+SCHEMA = "bench_contention"
+
+
+def setup(args):
+
+    conn = db.get_conn()
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+
+        migrate.migrate(conn)
+
+        with conn.cursor() as cur:
+
+            cur.execute("""
+            INSERT INTO flavors(name)
+            SELECT 'Flavor ' || g FROM generate_series(1, %s) g
+            """, (args.flavors,))
+
+            # Main (id 1) comes from the migrations
+            cur.execute("""
+            INSERT INTO depots(name)
+            SELECT 'Depot ' || g FROM generate_series(2, %s) g
+            """, (args.depots,))
+
+            cur.execute("""
+            INSERT INTO inventory(depot_id,flavor_id,stock)
+            SELECT d.id, f.id, %s FROM depots d CROSS JOIN flavors f
+            """, (args.stock,))
+
+            cur.execute("""
+            INSERT INTO inventory_movements(depot_id,flavor_id,kind,quantity,created_by)
+            SELECT depot_id, flavor_id, 'adjustment', stock, 'bench' FROM inventory
+            """)
+
+            cur.execute("""
+            INSERT INTO customers(name,area)
+            SELECT 'Customer ' || g, 'Area ' || (g % 5) FROM generate_series(1, 50) g
+            """)
+
+    finally:
+        conn.close()
+
+
+def worker(pool, args, deadline, stats, lock, rnd):
+
+    hot = list(range(1, args.hot + 1))
+    cold = list(range(args.hot + 1, args.flavors + 1))
+
+    while time.monotonic() < deadline:
+
+        # Every sale touches several hot flavors, listed in random order
+        picks = rnd.sample(hot, min(len(hot), rnd.randint(2, 4)))
+        picks += rnd.sample(cold, min(len(cold), rnd.randint(0, 3)))
+        rnd.shuffle(picks)
+
+        items = [(fid, rnd.randint(1, 5)) for fid in picks]
+        depot_id = rnd.randint(1, args.depots)
+
+        # Customers are split between depots (customer c buys from depot
+        # 1 + (c - 1) % depots), so their rollup rows stay per depot too
+        customer_id = rnd.randrange(depot_id, 51, args.depots)
+
+        t = time.perf_counter()
+
+        try:
+            pool.run(lambda cur: services.post_sale(cur, depot_id, customer_id, 1, items, "bench"))
+            outcome = "sales"
+        except services.InsufficientStock:
+            outcome = "insufficient"
+        except Exception as e:
+            outcome = "errors"
+            stats["last_error"] = repr(e)
+
+        ms = (time.perf_counter() - t) * 1000
+
+        with lock:
+            stats[outcome] += 1
+            stats["latencies"].append(ms)
+
+
+def verify(conn, args):
+
+    with conn.cursor() as cur:
+
+        cur.execute("""
+        SELECT i.depot_id, i.flavor_id, i.stock, COALESCE(s.sold, 0)
+        FROM inventory i
+        LEFT JOIN (
+            SELECT s.depot_id, si.flavor_id, SUM(si.quantity) AS sold
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+            GROUP BY 1, 2
+        ) s ON s.depot_id = i.depot_id AND s.flavor_id = i.flavor_id
+        ORDER BY i.depot_id, i.flavor_id
+        """)
+
+        rows = cur.fetchall()
+
+    negative = [(did, fid) for did, fid, stock, _ in rows if stock < 0]
+    mismatched = [(did, fid) for did, fid, stock, sold in rows if stock != args.stock - sold]
+
+    conn.commit()
+
+    return {
+        "negative_stock": negative,
+        "stock_mismatches": mismatched,
+        "ledger_mismatches": len(ledger.reconcile(conn)),
+        "hot_stock_left": {
+            f"{did}/{fid}": stock for did, fid, stock, _ in rows if fid <= args.hot
+        }
+    }
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Stock decrement contention test")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--flavors", type=int, default=20)
+    parser.add_argument("--hot", type=int, default=5, help="flavors every sale fights over")
+    parser.add_argument("--stock", type=int, default=2000, help="opening stock per flavor and depot")
+    parser.add_argument("--depots", type=int, default=1, help="spread sales over this many depots")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+
+    args = parser.parse_args(argv)
+
+    seed.use_schema(SCHEMA)
+
+    setup(args)
+
+    pool = db.Pool(maxconn=args.workers)
+
+    stats = {"sales": 0, "insufficient": 0, "errors": 0, "last_error": None, "latencies": []}
+    lock = threading.Lock()
+
+    deadline = time.monotonic() + args.seconds
+    t = time.monotonic()
+
+    threads = [
+        threading.Thread(target=worker, args=(pool, args, deadline, stats, lock, random.Random(i)))
+        for i in range(args.workers)
+    ]
+
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+
+    elapsed = time.monotonic() - t
+    retries = pool.stats()["tx_retries"]
+
+    pool.close()
+
+    conn = db.get_conn()
+
+    try:
+        check = verify(conn, args)
+
+        if not args.keep:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+    finally:
+        conn.close()
+
+    lat = sorted(stats["latencies"])
+    attempts = stats["sales"] + stats["insufficient"] + stats["errors"]
+
+    result = {
+        "workers": args.workers,
+        "depots": args.depots,
+        "seconds": round(elapsed, 1),
+        "sales": stats["sales"],
+        "sales_per_sec": round(stats["sales"] / elapsed, 1),
+        "insufficient_stock": stats["insufficient"],
+        "errors": stats["errors"],
+        "last_error": stats["last_error"],
+        "deadlock_retries": retries,
+        "retry_rate": round(retries / attempts, 4) if attempts else 0.0,
+        "p50_ms": round(lat[len(lat) // 2], 2) if lat else 0.0,
+        "p95_ms": round(lat[max(0, int(len(lat) * 0.95) - 1)], 2) if lat else 0.0,
+        **check
+    }
+
+    for k, v in result.items():
+        print(f"  {k:<20} {v}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    ok = not (check["negative_stock"] or check["stock_mismatches"] or check["ledger_mismatches"])
+
+    print("PASS" if ok else "FAIL")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
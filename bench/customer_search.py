@@ -0,0 +1,105 @@
+# bench/customer_search.py
+#
+# Latency of the customer picker's search queries at a realistic customer
+# count. Builds the schema up to migration 0005 in a scratch schema, loads
+# synthetic customers and times a mix of prefix and substring searches.
+#
+# Usage:
+#   python -m bench.customer_search --customers 100000 [--runs 200]
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+import customers
+import db
+import migrate
+
+SCHEMA = "bench_search"
+
+WORDS = [
+    "fresh", "corner", "royal", "star", "city", "green", "sun", "lucky",
+    "new", "super", "daily", "family", "metro", "golden", "cool", "king"
+]
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Customer search latency")
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}, public")
+
+    try:
+
+        for version, _, path in migrate.available():
+            if version <= 5:
+                migrate.apply(cur, path)
+
+        cur.execute("""
+        INSERT INTO customers(name,phone,shop,area)
+        SELECT
+            'Customer ' || g,
+            '9' || lpad(g::text, 9, '0'),
+            (%(words)s::text[])[1 + g %% %(n)s] || ' ' ||
+            (%(words)s::text[])[1 + (g / %(n)s) %% %(n)s] || ' Store',
+            'Area ' || (g %% 200)
+        FROM generate_series(1, %(customers)s) g
+        """, {"words": WORDS, "n": len(WORDS), "customers": args.customers})
+
+        cur.execute("VACUUM ANALYZE customers")
+
+        rnd = random.Random(42)
+
+        inputs = []
+
+        for _ in range(args.runs):
+            inputs.append(rnd.choice([
+                "cu",
+                "Customer " + str(rnd.randint(1, args.customers)),
+                str(rnd.randint(100, 99999)),
+                rnd.choice(WORDS),
+                rnd.choice(WORDS) + " " + rnd.choice(WORDS),
+                "area " + str(rnd.randint(0, 199))
+            ]))
+
+        timings = []
+
+        for text in inputs:
+
+            q, params = customers.search_query(text)
+
+            t = time.perf_counter()
+            cur.execute(q, params)
+            cur.fetchall()
+            timings.append((time.perf_counter() - t) * 1000)
+
+    finally:
+
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+        conn.close()
+
+    timings.sort()
+
+    print(f"{args.customers} customers, {len(timings)} searches (ms, incl. round-trip)")
+    print(f"  p50 {statistics.median(timings):.2f}")
+    print(f"  p95 {timings[int(len(timings) * 0.95) - 1]:.2f}")
+    print(f"  max {timings[-1]:.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+# bench/explain_history.py
+#
+# Before/after EXPLAIN ANALYZE for migration 0002 (typed dates, FKs,
+# indexes). Builds the 0001 schema in a scratch schema, fills it with
+# synthetic rows, captures plans, applies 0002 and captures them again.
+#
+# Usage:
+#   python -m bench.explain_history --sales 2000000 [--json out.json] [--keep]
+
+import argparse
+import json
+import sys
+import time
+
+import db
+import migrate
+
+SCHEMA = "bench_explain"
+
+QUERIES = {
+
+    "sales_history": """
+    SELECT
+        s.sale_date,
+        c.name AS customer,
+        f.name AS flavor,
+        si.quantity,
+        s.total_boxes,
+        s.created_by
+    FROM sales s
+    JOIN customers c ON s.customer_id = c.id
+    JOIN sale_items si ON s.id = si.sale_id
+    JOIN flavors f ON si.flavor_id = f.id
+    ORDER BY s.id DESC
+    LIMIT 50
+    """,
+
+    "sales_last_week": """
+    SELECT s.id, s.customer_id, s.total_boxes
+    FROM sales s
+    WHERE s.sale_date >= %(week_start)s
+    """,
+
+    "customer_sales": """
+    SELECT s.id, s.sale_date, s.total_boxes
+    FROM sales s
+    WHERE s.customer_id = %(customer_id)s
+    """,
+
+    "flavor_items_last_week": """
+    SELECT si.quantity
+    FROM sale_items si
+    JOIN sales s ON s.id = si.sale_id
+    WHERE si.flavor_id = %(flavor_id)s
+      AND s.sale_date >= %(week_start)s
+    """,
+
+    "returns_last_month": """
+    SELECT * FROM returns
+    WHERE return_date >= %(month_start)s
+    """,
+
+    "activity_last_day": """
+    SELECT * FROM activity_logs
+    WHERE log_date >= %(day_start)s
+    """
+}
+
+
+# ---------------- DATA ----------------
+
+def apply_migration(cur, version):
+
+    for v, name, path in migrate.available():
+        if v == version:
+            migrate.apply(cur, path)
+            return
+
+    raise SystemExit(f"Migration {version} not found")
+
+
+def populate(cur, args):
+
+    p = {
+        "flavors": args.flavors,
+        "customers": args.customers,
+        "sales": args.sales,
+        "days": args.days
+    }
+
+    cur.execute("""
+    INSERT INTO flavors(name)
+    SELECT 'Flavor ' || g FROM generate_series(1, %(flavors)s) g
+    """, p)
+
+    cur.execute("INSERT INTO inventory(flavor_id,stock) SELECT id, 1000 FROM flavors")
+
+    cur.execute("""
+    INSERT INTO customers(name,phone,shop,area)
+    SELECT 'Customer ' || g,
+           '9' || lpad(g::text, 9, '0'),
+           'Shop ' || g,
+           'Area ' || (g %% 50)
+    FROM generate_series(1, %(customers)s) g
+    """, p)
+
+    # Dates increase with id, like real history
+    cur.execute("""
+    INSERT INTO sales(customer_id,total_boxes,sale_date,created_by)
+    SELECT 1 + (random() * (%(customers)s - 1))::int,
+           (random() * 20)::int,
+           to_char(CURRENT_DATE - %(days)s + (g::bigint * %(days)s / %(sales)s)::int, 'YYYY-MM-DD'),
+           'staff'
+    FROM generate_series(1, %(sales)s) g
+    """, p)
+
+    cur.execute("""
+    INSERT INTO sale_items(sale_id,flavor_id,quantity)
+    SELECT s.id,
+           1 + (s.id * 7 + k * 13) %% %(flavors)s,
+           1 + (random() * 10)::int
+    FROM sales s, generate_series(1, 3) k
+    """, p)
+
+    cur.execute("""
+    INSERT INTO returns(customer_name,return_date,returned_boxes,damaged_boxes,damaged_bottles,note,created_by)
+    SELECT 'Customer ' || (1 + (random() * (%(customers)s - 1))::int),
+           to_char(CURRENT_DATE - %(days)s + (g::bigint * %(days)s / (%(sales)s / 10))::int, 'YYYY-MM-DD'),
+           (random() * 10)::int, (random() * 2)::int, (random() * 5)::int, '', 'staff'
+    FROM generate_series(1, %(sales)s / 10) g
+    """, p)
+
+    cur.execute("""
+    INSERT INTO activity_logs(username,action,log_date)
+    SELECT 'staff',
+           'Sale to Customer ' || g,
+           to_char(CURRENT_DATE - %(days)s + (g::bigint * %(days)s / %(sales)s)::int, 'YYYY-MM-DD')
+    FROM generate_series(1, %(sales)s) g
+    """, p)
+
+
+# ---------------- EXPLAIN ----------------
+
+def plan_nodes(node, out):
+
+    label = node["Node Type"]
+
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+
+    out.append(label)
+
+    for child in node.get("Plans", []):
+        plan_nodes(child, out)
+
+    return out
+
+
+def explain_all(cur, params):
+
+    results = {}
+
+    for name, q in QUERIES.items():
+
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + q, params)
+
+        plan = cur.fetchone()[0][0]
+
+        results[name] = {
+            "execution_ms": plan["Execution Time"],
+            "planning_ms": plan["Planning Time"],
+            "nodes": plan_nodes(plan["Plan"], [])
+        }
+
+    return results
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Before/after EXPLAIN for migration 0002")
+    parser.add_argument("--sales", type=int, default=2_000_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--flavors", type=int, default=40)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}, public")
+
+    try:
+
+        apply_migration(cur, 1)
+
+        t = time.perf_counter()
+        populate(cur, args)
+        cur.execute("VACUUM ANALYZE")
+        print(f"Populated {args.sales} sales in {time.perf_counter() - t:.1f}s")
+
+        cur.execute("SELECT CURRENT_DATE - 7, CURRENT_DATE - 30, CURRENT_DATE - 1")
+        week, month, day = cur.fetchone()
+
+        params = {
+            "week_start": week.isoformat(),
+            "month_start": month.isoformat(),
+            "day_start": day.isoformat(),
+            "customer_id": args.customers // 2,
+            "flavor_id": 1
+        }
+
+        before = explain_all(cur, params)
+
+        t = time.perf_counter()
+        apply_migration(cur, 2)
+        cur.execute("VACUUM ANALYZE")
+        print(f"Applied 0002 in {time.perf_counter() - t:.1f}s")
+
+        after = explain_all(cur, params)
+
+    finally:
+
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+        conn.close()
+
+    print()
+    print(f"{'query':<24} {'before ms':>10} {'after ms':>10}")
+
+    for name in QUERIES:
+        print(f"{name:<24} {before[name]['execution_ms']:>10.2f} {after[name]['execution_ms']:>10.2f}")
+
+    for name in QUERIES:
+        print()
+        print(name)
+        print("  before:", " > ".join(before[name]["nodes"]))
+        print("  after: ", " > ".join(after[name]["nodes"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "before": before, "after": after}, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
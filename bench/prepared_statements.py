@@ -0,0 +1,134 @@
+# bench/prepared_statements.py
+#
+# Planning time saved by prepared.py. For each registered statement,
+# EXPLAIN ANALYZE reports the server's planning and execution time for the
+# plain SQL and for EXECUTE of the prepared statement (after the warm-up
+# runs, when Postgres has settled on a cached plan). Then sums the saving
+# over the statements each page issues per rerun.
+#
+# Runs against a dataset from bench/seed.py; writes are rolled back.
+#
+# Usage:
+#   python -m bench.prepared_statements [--schema bench_data] [--runs 50] [--json out.json]
+
+import argparse
+import json
+import statistics
+import sys
+
+import db
+import prepared
+
+from bench import seed
+from bench.run import ADMIN_HASH
+
+# Prepared statements each page runs on a cache-missing rerun
+RERUNS = {
+    "Login": ["login"],
+    "Dashboard": ["dashboard_stock"],
+    "Record Sale": ["sale_stock", "sales_history"],
+    "Add Stock": ["inventory_add"]
+}
+
+
+def explain(cur, q, params):
+
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + q, params)
+
+    plan = cur.fetchone()[0][0]
+
+    return plan["Planning Time"], plan["Execution Time"]
+
+
+def measure(cur, name, params, runs, warmup):
+
+    plain = prepared.STATEMENTS[name].sql
+
+    prepared.prepare(cur, name)
+    execute = prepared.execute_sql(name, params)
+
+    out = {}
+
+    for label, q in (("plain", plain), ("prepared", execute)):
+
+        for _ in range(warmup):
+            explain(cur, q, params)
+
+        timings = [explain(cur, q, params) for _ in range(runs)]
+
+        out[label] = {
+            "planning_ms": round(statistics.median(t[0] for t in timings), 4),
+            "execution_ms": round(statistics.median(t[1] for t in timings), 4)
+        }
+
+    out["planning_saved_ms"] = round(
+        out["plain"]["planning_ms"] - out["prepared"]["planning_ms"], 4
+    )
+
+    return out
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Prepared statement planning savings")
+    parser.add_argument("--schema", default=seed.SCHEMA)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--json", help="write results to this file")
+
+    args = parser.parse_args(argv)
+
+    seed.use_schema(args.schema)
+
+    conn = db.get_conn()
+
+    try:
+
+        with conn.cursor() as cur:
+
+            cur.execute("SELECT depot_id, flavor_id FROM inventory ORDER BY 1, 2 LIMIT 1")
+            depot_id, flavor_id = cur.fetchone()
+
+            params = {
+                "login": ("admin", ADMIN_HASH),
+                "dashboard_stock": (),
+                "depot_dashboard_stock": (depot_id,),
+                "sale_stock": (depot_id,),
+                "sales_history": (),
+                "inventory_add": (depot_id, flavor_id, 0)
+            }
+
+            results = {
+                name: measure(cur, name, params[name], args.runs, args.warmup)
+                for name in prepared.STATEMENTS
+            }
+
+    finally:
+        # inventory_add ran for real; undo it
+        conn.rollback()
+        conn.close()
+
+    print(f"{'statement':<18} {'plan ms':>9} {'prep plan':>10} {'exec ms':>9} {'prep exec':>10}")
+
+    for name, r in results.items():
+        print(
+            f"{name:<18} {r['plain']['planning_ms']:>9.3f} {r['prepared']['planning_ms']:>10.3f}"
+            f" {r['plain']['execution_ms']:>9.3f} {r['prepared']['execution_ms']:>10.3f}"
+        )
+
+    print()
+    print("Planning time saved per rerun")
+
+    per_rerun = {}
+
+    for page, names in RERUNS.items():
+        per_rerun[page] = round(sum(results[n]["planning_saved_ms"] for n in names), 4)
+        print(f"  {page:<14} {per_rerun[page]:.3f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "statements": results, "per_rerun": per_rerun}, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
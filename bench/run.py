@@ -0,0 +1,312 @@
+# bench/run.py
+#
+# Times every query each page issues, plus the sale-posting write path,
+# against a dataset from bench/seed.py. Reads go through db.Pool exactly
+# as app.py issues them (pandas.read_sql, or prepared statements for the
+# hot queries), uncached, so the numbers are what a cache miss costs.
+# Sales are posted inside a transaction that is rolled back, so repeated
+# runs see the same data.
+#
+# Results are written as JSON (git commit, dataset counts, per-query
+# timings) for bench/compare.py to diff across commits.
+#
+# Usage:
+#   python -m bench.run [--schema bench_data] [--runs 20] [--out results.json]
+
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import charts
+import customers
+import db
+import ledger
+import paging
+import prepared
+import queries
+import rollups
+import services
+
+from bench import seed
+
+ADMIN_HASH = "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9"
+
+
+def read(pool, q, params=None):
+    with pool.connection() as conn:
+        return len(pd.read_sql(q, conn, params=params))
+
+
+def read_prepared(pool, name, params=()):
+    with pool.cursor() as cur:
+        prepared.execute(cur, name, params)
+        return len(cur.fetchall())
+
+
+# Last 90 days by week, the Reports page's typical view
+def report(q):
+    return lambda pool, ctx: read(pool, q, {
+        "bucket": "week",
+        "start": ctx["today"] - timedelta(days=90),
+        "end": ctx["today"]
+    })
+
+
+# Dashboard trends for the last year by day, downsampled like the page
+def trends(pool, ctx):
+
+    p = {"bucket": "day", "start": ctx["today"] - timedelta(days=365), "end": ctx["today"], "depot": None}
+
+    with pool.connection() as conn:
+
+        n = len(charts.downsample(pd.read_sql(charts.SALES_OVER_TIME, conn, params=p), "period", "quantity"))
+
+        top = pd.read_sql(charts.TOP_FLAVOR_IDS, conn, params=dict(p, top=charts.TOP_FLAVORS))
+        p["flavors"] = [int(f) for f in top["flavor_id"]]
+
+        for q, y in ((charts.FLAVOR_TREND, "quantity"), (charts.STOCK_HISTORY, "stock")):
+            n += len(charts.downsample(pd.read_sql(q, conn, params=p), "period", y, by="flavor"))
+
+    return n
+
+
+# Jump-to-date paging as paged_table() does it
+def jump(pool, table, date_col, day):
+
+    k = paging.key_on_or_before(pool, table, date_col, day)
+
+    return len(paging.fetch_page(
+        pool, table, date_col, 50,
+        before=(k[0], k[1] + 1) if k else None
+    ).df)
+
+
+# ---------------- PAGES ----------------
+
+# Each page maps query names to callables (pool, ctx) -> row count. Keep
+# this in step with app.py when a page gains or loses a query.
+PAGES = {
+
+    "Login": {
+        "login": lambda pool, ctx: read_prepared(pool, "login", ("admin", ADMIN_HASH))
+    },
+
+    "Dashboard": {
+        "stock": lambda pool, ctx: read_prepared(pool, "dashboard_stock"),
+        "depot_stock": lambda pool, ctx: read_prepared(pool, "depot_dashboard_stock", (ctx["depot_id"],) * 2),
+        "trends": trends
+    },
+
+    "Flavors": {
+        "list": lambda pool, ctx: read(pool, queries.FLAVOR_LIST)
+    },
+
+    "Depots": {
+        "stock": lambda pool, ctx: read(pool, queries.CURRENT_STOCK),
+        "transfer_stock": lambda pool, ctx: read_prepared(pool, "sale_stock", (ctx["depot_id"],)),
+        "transfers": lambda pool, ctx: read(pool, queries.TRANSFER_HISTORY)
+    },
+
+    "Add Stock": {
+        "flavors": lambda pool, ctx: read(pool, queries.ACTIVE_FLAVORS),
+        "current_stock": lambda pool, ctx: read(pool, queries.CURRENT_STOCK),
+        "stock_as_of": lambda pool, ctx: read(pool, ledger.STOCK_AS_OF, {"at": ctx["as_of"]})
+    },
+
+    "Record Sale": {
+        "customer_search": lambda pool, ctx: read(pool, *customers.search_query(ctx["search"])),
+        "stock": lambda pool, ctx: read_prepared(pool, "sale_stock", (ctx["depot_id"],)),
+        "history": lambda pool, ctx: read_prepared(pool, "sales_history")
+    },
+
+    "Returns": {
+        "customer_search": lambda pool, ctx: read(pool, *customers.search_query(ctx["search"])),
+        "stock": lambda pool, ctx: read_prepared(pool, "sale_stock", (ctx["depot_id"],)),
+        "history_latest": lambda pool, ctx: len(paging.fetch_page(pool, "returns", "return_date", 50).df),
+        "history_jump": lambda pool, ctx: jump(pool, "returns", "return_date", ctx["mid_day"])
+    },
+
+    "Customers": {
+        "list": lambda pool, ctx: read(pool, queries.CUSTOMER_LIST),
+        "search": lambda pool, ctx: read(pool, *customers.search_query(ctx["search"]))
+    },
+
+    "Reports": {
+        name.lower(): report(q) for name, q in rollups.REPORTS.items()
+    },
+
+    "Users": {
+        "list": lambda pool, ctx: read(pool, queries.USER_LIST)
+    },
+
+    "Admin Activity": {
+        "latest": lambda pool, ctx: len(paging.fetch_page(pool, "activity_logs", "log_date", 50).df),
+        "jump": lambda pool, ctx: jump(pool, "activity_logs", "log_date", ctx["mid_day"])
+    }
+}
+
+
+# ---------------- WRITES ----------------
+
+def post_sale(pool, ctx):
+
+    rnd = ctx["rnd"]
+    items = [(fid, rnd.randint(1, 10)) for fid in rnd.sample(ctx["flavor_ids"], ctx["items"])]
+
+    with pool.connection() as conn:
+
+        conn.autocommit = False
+
+        try:
+            with conn.cursor() as cur:
+                services.post_sale(cur, ctx["depot_id"], rnd.choice(ctx["customer_ids"]), 10, items, "bench")
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+
+    return len(items)
+
+
+WRITES = {
+    "Record Sale": {
+        "post_sale": post_sale
+    }
+}
+
+
+# ---------------- TIMING ----------------
+
+def context(pool, args):
+
+    with pool.cursor() as cur:
+
+        cur.execute("SELECT id FROM flavors WHERE active ORDER BY id")
+        flavor_ids = [r[0] for r in cur.fetchall()]
+
+        cur.execute("SELECT id FROM customers WHERE active ORDER BY id LIMIT 1000")
+        customer_ids = [r[0] for r in cur.fetchall()]
+
+        cur.execute("SELECT MIN(sale_date), MAX(sale_date) FROM sales")
+        first, last = cur.fetchone()
+
+    if not flavor_ids or not customer_ids:
+        raise SystemExit("No data; run python -m bench.seed first")
+
+    today = date.today()
+    first = first or today
+    last = last or today
+
+    return {
+        "rnd": random.Random(42),
+        "depot_id": services.MAIN_DEPOT,
+        "flavor_ids": flavor_ids,
+        "customer_ids": customer_ids,
+        "items": min(args.items, len(flavor_ids)),
+        "search": args.search,
+        "today": today,
+        "mid_day": first + (last - first) / 2,
+        "as_of": datetime.combine(first + (last - first) / 2, datetime.min.time())
+    }
+
+
+def measure(fn, pool, ctx, runs, warmup):
+
+    for _ in range(warmup):
+        fn(pool, ctx)
+
+    timings = []
+
+    for _ in range(runs):
+        t = time.perf_counter()
+        rows = fn(pool, ctx)
+        timings.append((time.perf_counter() - t) * 1000)
+
+    timings.sort()
+
+    return {
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+        "mean_ms": round(statistics.mean(timings), 3),
+        "min_ms": round(timings[0], 3),
+        "max_ms": round(timings[-1], 3),
+        "rows": rows
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Page query benchmarks")
+    parser.add_argument("--schema", default=seed.SCHEMA)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--items", type=int, default=15, help="flavors per benchmark sale")
+    parser.add_argument("--search", default="golden", help="customer search text")
+    parser.add_argument("--page", action="append", help="only these pages (repeatable)")
+    parser.add_argument("--out", help="write JSON results to this file")
+
+    args = parser.parse_args(argv)
+
+    seed.use_schema(args.schema)
+
+    pool = db.Pool(maxconn=2)
+
+    try:
+
+        ctx = context(pool, args)
+
+        with pool.cursor() as cur:
+            dataset = seed.counts(cur)
+
+        results = {}
+
+        for group in (PAGES, WRITES):
+            for page, fns in group.items():
+
+                if args.page and page not in args.page:
+                    continue
+
+                for name, fn in fns.items():
+                    results.setdefault(page, {})[name] = measure(
+                        fn, pool, ctx, args.runs, args.warmup
+                    )
+
+    finally:
+        pool.close()
+
+    print(f"{'page':<16} {'query':<18} {'p50 ms':>9} {'p95 ms':>9} {'rows':>7}")
+
+    for page, qs in results.items():
+        for name, r in qs.items():
+            print(f"{page:<16} {name:<18} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['rows']:>7}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "commit": git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "schema": args.schema,
+                "runs": args.runs,
+                "dataset": dataset,
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
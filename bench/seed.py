@@ -0,0 +1,298 @@
+# bench/seed.py
+#
+# Fills a database schema with a synthetic dataset for bench/run.py:
+# depots, flavors, customers, sales with line items, returns and activity logs,
+# then the ledger opening balances and rollups the app expects. Sizes scale
+# from 10k to 10M sales; rows go in with generate_series in chunks so large
+# seeds don't build one enormous transaction.
+#
+# The schema defaults to a scratch one (bench_data) so a dev database's own
+# rows are never touched; pass --schema public to seed the app's tables.
+#
+# Usage:
+#   python -m bench.seed --sales 1000000 [--schema bench_data] [--reset]
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import db
+import migrate
+import partitions
+import rollups
+
+SCHEMA = "bench_data"
+
+CHUNK = 1_000_000
+
+WORDS = [
+    "fresh", "corner", "royal", "star", "city", "green", "sun", "lucky",
+    "new", "super", "daily", "family", "metro", "golden", "cool", "king"
+]
+
+TABLES = [
+    "activity_logs", "return_items", "returns", "sale_items", "sales",
+    "transfer_items", "transfers",
+    "inventory_movements", "inventory_snapshots", "inventory",
+    "customers", "flavors", "depots"
+] + list(rollups.TABLES) + [rollups.BALANCES]
+
+
+# Every connection libpq opens from here on (db.get_conn and db.Pool alike)
+# starts with this search_path.
+def use_schema(schema):
+    os.environ["PGOPTIONS"] = f"-c search_path={schema},public"
+
+
+def counts(cur):
+
+    out = {}
+
+    for t in ("flavors", "customers", "sales", "sale_items", "returns", "return_items", "activity_logs"):
+        cur.execute(f"SELECT COUNT(*) FROM {t}")
+        out[t] = cur.fetchone()[0]
+
+    return out
+
+
+# ---------------- DATA ----------------
+
+def seed_reference(cur, args):
+
+    p = {
+        "flavors": args.flavors,
+        "customers": args.customers,
+        "depots": args.depots,
+        "words": WORDS,
+        "n": len(WORDS),
+        "areas": args.areas
+    }
+
+    # Depot 1 is Main, as migration 0009 creates it. Ids are explicit:
+    # seed_sales() spreads sales over ids 1..depots, and a conflicting
+    # insert through the sequence would still use up an id.
+    cur.execute("""
+    INSERT INTO depots(id,name)
+    SELECT g, CASE WHEN g = 1 THEN 'Main' ELSE 'Depot ' || g END
+    FROM generate_series(1, %(depots)s) g
+    ON CONFLICT DO NOTHING
+    """, p)
+
+    cur.execute("SELECT setval('depots_id_seq', (SELECT MAX(id) FROM depots))")
+
+    cur.execute("""
+    INSERT INTO flavors(name)
+    SELECT 'Flavor ' || g FROM generate_series(1, %(flavors)s) g
+    """, p)
+
+    # Deep stock so the write benchmark never runs a flavor dry
+    cur.execute("""
+    INSERT INTO inventory(depot_id,flavor_id,stock)
+    SELECT d.id, f.id, 100000000 FROM depots d CROSS JOIN flavors f
+    """)
+
+    cur.execute("""
+    INSERT INTO inventory_movements(depot_id,flavor_id,kind,quantity,created_by)
+    SELECT depot_id, flavor_id, 'adjustment', stock, 'seed' FROM inventory
+    """)
+
+    # A few percent inactive, like customers who stopped ordering
+    cur.execute("""
+    INSERT INTO customers(name,phone,shop,area,active)
+    SELECT
+        'Customer ' || g,
+        '9' || lpad(g::text, 9, '0'),
+        (%(words)s::text[])[1 + g %% %(n)s] || ' ' ||
+        (%(words)s::text[])[1 + (g / %(n)s) %% %(n)s] || ' Store',
+        'Area ' || (g %% %(areas)s),
+        g %% 25 <> 0
+    FROM generate_series(1, %(customers)s) g
+    """, p)
+
+    cur.execute("""
+    INSERT INTO users(username,password,role)
+    VALUES('staff', '10176e7b7b24d317acfcf8d2064cfd2f24e154f7b5a96603077d5ef813d6a6b6', 'staff')
+    ON CONFLICT (username) DO NOTHING
+    """)
+
+
+# Sales lo..hi of --sales; dates increase with id, like real history.
+# Each statement autocommits, so a chunk is its own transaction.
+def seed_sales(cur, args, lo, hi):
+
+    p = {
+        "lo": lo,
+        "hi": hi,
+        "sales": args.sales,
+        "days": args.days,
+        "flavors": args.flavors,
+        "customers": args.customers,
+        "depots": args.depots,
+        "items": args.items
+    }
+
+    cur.execute("SELECT COALESCE(MAX(id),0) FROM sales")
+    last = cur.fetchone()[0]
+
+    cur.execute("""
+    INSERT INTO sales(depot_id,customer_id,total_boxes,sale_date,created_by)
+    SELECT 1 + g %% %(depots)s,
+           1 + (random() * (%(customers)s - 1))::int,
+           1 + (random() * 20)::int,
+           CURRENT_DATE - %(days)s + (g::bigint * %(days)s / %(sales)s)::int,
+           CASE WHEN g %% 4 = 0 THEN 'admin' ELSE 'staff' END
+    FROM generate_series(%(lo)s, %(hi)s) g
+    """, p)
+
+    # 1..items distinct flavors per sale
+    cur.execute("""
+    INSERT INTO sale_items(sale_id,sale_date,flavor_id,quantity)
+    SELECT s.id,
+           s.sale_date,
+           1 + (s.id * 7 + k * 13) %% %(flavors)s,
+           1 + (random() * 10)::int
+    FROM sales s
+    CROSS JOIN LATERAL generate_series(1, 1 + (s.id %% %(items)s)) k
+    WHERE s.id > %(last)s
+    """, dict(p, last=last))
+
+    cur.execute("""
+    INSERT INTO activity_logs(username,action,log_date)
+    SELECT CASE WHEN g %% 4 = 0 THEN 'admin' ELSE 'staff' END,
+           'Sale to Customer ' || (1 + g %% %(customers)s),
+           (CURRENT_DATE - %(days)s + (g::bigint * %(days)s / %(sales)s)::int)::timestamptz
+               + (g %% 86400) * interval '1 second'
+    FROM generate_series(%(lo)s, %(hi)s) g
+    """, p)
+
+
+def seed_returns(cur, args):
+
+    p = {
+        "returns": args.returns,
+        "days": args.days,
+        "customers": args.customers,
+        "depots": args.depots,
+        "flavors": args.flavors
+    }
+
+    if not args.returns:
+        return
+
+    cur.execute("""
+    INSERT INTO returns(
+        depot_id,customer_id,customer_name,return_date,returned_boxes,
+        damaged_boxes,damaged_bottles,note,created_by
+    )
+    SELECT 1 + g %% %(depots)s, c, 'Customer ' || c,
+           CURRENT_DATE - %(days)s + (g::bigint * %(days)s / %(returns)s)::int,
+           (random() * 10)::int, (random() * 2)::int, (random() * 5)::int,
+           '', 'staff'
+    FROM (
+        SELECT g, 1 + (random() * (%(customers)s - 1))::int AS c
+        FROM generate_series(1, %(returns)s) g
+    ) x
+    """, p)
+
+    # One or two flavor lines per return
+    cur.execute("""
+    INSERT INTO return_items(return_id,flavor_id,returned,damaged)
+    SELECT r.id,
+           1 + (r.id * 11 + k * 17) %% %(flavors)s,
+           1 + (random() * 5)::int,
+           (random() * 1.4)::int
+    FROM returns r
+    CROSS JOIN LATERAL generate_series(1, 1 + (r.id %% 2)) k
+    """, p)
+
+
+def reset(cur):
+    cur.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+    cur.execute("DELETE FROM users WHERE username <> 'admin'")
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Seed a synthetic dataset")
+    parser.add_argument("--schema", default=SCHEMA)
+    parser.add_argument("--sales", type=int, default=100_000)
+    parser.add_argument("--items", type=int, default=5, help="max flavors per sale")
+    parser.add_argument("--customers", type=int, default=None, help="default: sales / 100")
+    parser.add_argument("--returns", type=int, default=None, help="default: sales / 10")
+    parser.add_argument("--flavors", type=int, default=40)
+    parser.add_argument("--areas", type=int, default=50)
+    parser.add_argument("--depots", type=int, default=1)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--reset", action="store_true", help="truncate existing data first")
+
+    args = parser.parse_args(argv)
+
+    if args.customers is None:
+        args.customers = max(100, args.sales // 100)
+    if args.returns is None:
+        args.returns = args.sales // 10
+
+    use_schema(args.schema)
+
+    conn = db.get_conn()
+    conn.autocommit = True
+
+    try:
+
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {args.schema}")
+
+        migrate.migrate(conn)
+
+        with conn.cursor() as cur:
+
+            # Monthly partitions for the whole seeded range
+            partitions.ensure(cur, start=date.today() - timedelta(days=args.days))
+
+            if args.reset:
+                reset(cur)
+
+            cur.execute("SELECT EXISTS (SELECT 1 FROM flavors)")
+
+            if cur.fetchone()[0]:
+                print(f"Schema {args.schema} already has data; use --reset to replace it")
+                return 1
+
+            t = time.perf_counter()
+
+            seed_reference(cur, args)
+
+            for lo in range(1, args.sales + 1, CHUNK):
+
+                hi = min(lo + CHUNK - 1, args.sales)
+
+                seed_sales(cur, args, lo, hi)
+
+                print(f"  sales {hi}/{args.sales}")
+
+            seed_returns(cur, args)
+
+            # rebuild() locks the rollup tables, which needs a transaction
+            conn.autocommit = False
+
+            with conn:
+                rollups.rebuild(cur)
+                rollups.rebuild_balances(cur)
+
+            conn.autocommit = True
+
+            cur.execute("VACUUM ANALYZE")
+
+            print(f"Seeded {args.schema} in {time.perf_counter() - t:.1f}s")
+
+            for table, n in counts(cur).items():
+                print(f"  {table:<14} {n:>12}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
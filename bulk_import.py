@@ -0,0 +1,254 @@
+# bulk_import.py
+#
+# CSV / Excel import of stock receipts and customers. validate_*() checks
+# and deduplicates a whole upload in pandas and builds the dry-run diff;
+# apply_*() COPYs the clean rows into a temp staging table and merges them
+# with one set-based statement inside the caller's transaction.
+
+import io
+from collections import namedtuple
+
+import pandas as pd
+
+import services
+
+KINDS = {
+    "Stock Receipts": ["flavor", "quantity"],
+    "Customers": ["name", "phone", "shop", "area"]
+}
+
+REQUIRED = {
+    "Stock Receipts": ["flavor", "quantity"],
+    "Customers": ["name"]
+}
+
+Plan = namedtuple("Plan", ["rows", "errors", "diff"])
+
+
+def read_upload(f, filename):
+
+    if filename.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(f, dtype=str)
+    else:
+        df = pd.read_csv(f, dtype=str, keep_default_na=False)
+
+    df.columns = [str(c).strip().lower() for c in df.columns]
+
+    return df
+
+
+def _missing_columns(df, kind):
+    return [c for c in REQUIRED[kind] if c not in df.columns]
+
+
+def _errors(df, mask, reason):
+    out = df.loc[mask].copy()
+    out.insert(0, "error", reason)
+    return out
+
+
+def _clean(series):
+    return series.fillna("").astype(str).str.strip()
+
+
+# ---------------- STOCK RECEIPTS ----------------
+
+# flavors: DataFrame of active flavors with id, name, stock
+def validate_stock(df, flavors):
+
+    missing = _missing_columns(df, "Stock Receipts")
+
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    df = df.copy()
+    df.insert(0, "row", df.index + 2)  # spreadsheet row, after the header
+
+    df["flavor"] = _clean(df["flavor"])
+    df["key"] = df["flavor"].str.lower()
+
+    keys = (
+        flavors.assign(key=flavors["name"].str.strip().str.lower())
+               .drop_duplicates("key")[["key", "id"]]
+    )
+    df = df.merge(keys, on="key", how="left")
+
+    qty = pd.to_numeric(_clean(df["quantity"]), errors="coerce")
+
+    bad_qty = qty.isna() | (qty <= 0) | (qty % 1 != 0)
+    unknown = df["id"].isna() & ~bad_qty
+
+    errors = pd.concat([
+        _errors(df, bad_qty, "quantity must be a positive whole number"),
+        _errors(df, unknown, "unknown or inactive flavor")
+    ])[["error", "row", "flavor", "quantity"]]
+
+    ok = df.loc[~bad_qty & ~unknown, ["id"]].assign(quantity=qty[~bad_qty & ~unknown])
+
+    # Several lines for the same flavor become one receipt
+    rows = (
+        ok.astype({"id": "int64", "quantity": "int64"})
+          .groupby("id", as_index=False)["quantity"].sum()
+          .rename(columns={"id": "flavor_id"})
+    )
+
+    diff = rows.merge(
+        flavors[["id", "name", "stock"]].rename(columns={"id": "flavor_id"}),
+        on="flavor_id"
+    )
+    diff["stock"] = diff["stock"].fillna(0).astype("int64")
+    diff["new_stock"] = diff["stock"] + diff["quantity"]
+    diff = diff[["name", "stock", "quantity", "new_stock"]].sort_values("name")
+
+    return Plan(rows, errors.sort_values("row"), diff)
+
+
+def apply_stock(cur, depot_id, plan, username):
+
+    cur.execute("""
+    CREATE TEMP TABLE stage_stock(
+        flavor_id INTEGER,
+        quantity INTEGER
+    ) ON COMMIT DROP
+    """)
+
+    _copy(cur, "stage_stock", plan.rows[["flavor_id", "quantity"]])
+
+    # Same lock order as sales, so an import can't deadlock with them
+    services.lock_stock(cur, depot_id, plan.rows["flavor_id"].tolist())
+
+    # Upserted like services._add_stock, so a missing row can't drop a
+    # receipt the ledger records
+    cur.execute("""
+    WITH upd AS (
+        INSERT INTO inventory AS i(depot_id,flavor_id,stock)
+        SELECT %(depot)s, flavor_id, quantity FROM stage_stock
+        ON CONFLICT (depot_id,flavor_id) DO UPDATE
+        SET stock = i.stock + EXCLUDED.stock
+        RETURNING i.depot_id, i.flavor_id
+    )
+    INSERT INTO inventory_movements(depot_id,flavor_id,kind,quantity,created_by)
+    SELECT u.depot_id, u.flavor_id, 'receipt', s.quantity, %(user)s
+    FROM upd u
+    JOIN stage_stock s ON s.flavor_id = u.flavor_id
+    """, {"depot": int(depot_id), "user": username})
+
+
+# ---------------- CUSTOMERS ----------------
+
+# existing: DataFrame of all customers (active and inactive)
+def validate_customers(df, existing):
+
+    missing = _missing_columns(df, "Customers")
+
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    df = df.copy()
+    df.insert(0, "row", df.index + 2)
+
+    for c in KINDS["Customers"]:
+        df[c] = _clean(df[c]) if c in df.columns else ""
+
+    no_name = df["name"] == ""
+
+    errors = _errors(df, no_name, "name is required")[["error", "row", "name"]]
+
+    df = df.loc[~no_name]
+    df["key"] = df["name"].str.lower()
+
+    # Last line wins when the file repeats a customer
+    df = df.drop_duplicates("key", keep="last")
+
+    # When several customers share a name, the import updates one of them:
+    # the active one first, then the oldest. apply_customers() picks the
+    # same one.
+    ex = existing.assign(key=existing["name"].fillna("").str.strip().str.lower())
+    ex = ex.sort_values(["active", "id"], ascending=[False, True])
+    ex = ex.drop_duplicates("key", keep="first")
+
+    m = df.merge(ex, on="key", how="left", suffixes=("", "_old"), indicator=True)
+
+    is_new = m["_merge"] == "left_only"
+
+    # Blank cells keep the stored value
+    changed = pd.Series(False, index=m.index)
+
+    for c in ("phone", "shop", "area"):
+        old = m[f"{c}_old"].fillna("").astype(str)
+        changed |= (m[c] != "") & (m[c] != old)
+
+    reactivate = ~is_new & ~m["active"].fillna(True).astype(bool)
+
+    m["action"] = "unchanged"
+    m.loc[~is_new & changed, "action"] = "update"
+    m.loc[reactivate, "action"] = "reactivate"
+    m.loc[is_new, "action"] = "insert"
+
+    rows = m.loc[m["action"] != "unchanged", ["name", "phone", "shop", "area"]]
+
+    diff = m[[
+        "action", "name",
+        "phone_old", "phone",
+        "shop_old", "shop",
+        "area_old", "area"
+    ]].sort_values(["action", "name"])
+
+    return Plan(rows.reset_index(drop=True), errors.sort_values("row"), diff)
+
+
+def apply_customers(cur, plan):
+
+    cur.execute("""
+    CREATE TEMP TABLE stage_customers(
+        name TEXT,
+        phone TEXT,
+        shop TEXT,
+        area TEXT
+    ) ON COMMIT DROP
+    """)
+
+    _copy(cur, "stage_customers", plan.rows[["name", "phone", "shop", "area"]])
+
+    # Update/reactivate matches and insert the rest in one statement. Each
+    # staged row updates a single customer, chosen as validate_customers()
+    # chose it.
+    cur.execute("""
+    WITH target AS (
+        SELECT DISTINCT ON (lower(trim(c.name))) c.id, s.phone, s.shop, s.area
+        FROM customers c
+        JOIN stage_customers s ON lower(trim(c.name)) = lower(s.name)
+        ORDER BY lower(trim(c.name)), c.active DESC, c.id
+    ),
+    upd AS (
+        UPDATE customers c
+        SET phone = COALESCE(t.phone, c.phone),
+            shop = COALESCE(t.shop, c.shop),
+            area = COALESCE(t.area, c.area),
+            active = TRUE
+        FROM target t
+        WHERE c.id = t.id
+        RETURNING c.id
+    )
+    INSERT INTO customers(name,phone,shop,area)
+    SELECT s.name, s.phone, s.shop, s.area
+    FROM stage_customers s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM customers c
+        WHERE lower(trim(c.name)) = lower(s.name)
+    )
+    """)
+
+
+# ---------------- COPY ----------------
+
+def _copy(cur, table, df):
+
+    buf = io.StringIO()
+
+    # Blank cells go out as empty fields, which COPY reads as NULL
+    df.mask(df == "").to_csv(buf, index=False, header=False)
+    buf.seek(0)
+
+    cur.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv)", buf)
+
@@ -0,0 +1,139 @@
+# cache.py
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "60"))
+CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)", re.I)
+
+
+def tables_in(sql):
+    return frozenset(t.lower() for t in _TABLE_RE.findall(sql))
+
+
+def _freeze(value):
+
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+
+    return value
+
+
+# ---------------- QUERY CACHE ----------------
+
+class QueryCache:
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+
+        # key -> (expires_at, tags, value), oldest first
+        self._entries = OrderedDict()
+        self._by_tag = {}
+
+        # Bumped on every invalidation; a load that overlaps one is not stored.
+        self._generation = {}
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+    def _drop(self, key):
+
+        _, tags, _ = self._entries.pop(key)
+
+        for t in tags:
+            keys = self._by_tag.get(t)
+            if keys:
+                keys.discard(key)
+
+    # copy=True hands every caller its own copy of the cached value (for
+    # values callers mutate, like DataFrames); the cached one stays pristine.
+    def get_or_load(self, sql, params, loader, tags=None, copy=False):
+
+        key = (sql, _freeze(params))
+        tags = frozenset(tags) if tags is not None else tables_in(sql)
+        now = time.monotonic()
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[2].copy() if copy else entry[2]
+
+            if entry:
+                self._drop(key)
+
+            self._stats["misses"] += 1
+
+            seen = {t: self._generation.get(t, 0) for t in tags}
+
+        value = loader()
+
+        with self._lock:
+
+            if any(self._generation.get(t, 0) != g for t, g in seen.items()):
+                return value.copy() if copy else value
+
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (now + self.ttl, tags, value)
+
+            for t in tags:
+                self._by_tag.setdefault(t, set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+        return value.copy() if copy else value
+
+    def invalidate(self, *tables):
+
+        with self._lock:
+
+            for t in tables:
+
+                t = t.lower()
+
+                self._generation[t] = self._generation.get(t, 0) + 1
+
+                for key in list(self._by_tag.pop(t, ())):
+                    if key in self._entries:
+                        self._drop(key)
+                        self._stats["invalidations"] += 1
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self):
+
+        with self._lock:
+            s = dict(self._stats)
+            s["entries"] = len(self._entries)
+
+        total = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / total, 3) if total else 0.0
+
+        return s
@@ -0,0 +1,165 @@
+# charts.py
+#
+# Dashboard time series. Each query aggregates in SQL to one row per
+# period (day / week / month) from the rollups or the inventory ledger,
+# for one depot or, with %(depot)s NULL, all of them. downsample() then
+# thins every series to a fixed point budget with LTTB (largest-
+# triangle-three-buckets), so a multi-year daily range ships a few
+# hundred points per line to the browser, not raw sales.
+
+import numpy as np
+import pandas as pd
+
+BUCKETS = ["day", "week", "month"]
+
+# Points per plotted series
+POINT_BUDGET = 400
+
+# Flavors shown in the trend and stock charts
+TOP_FLAVORS = 5
+
+SALES_OVER_TIME = """
+SELECT
+    date_trunc(%(bucket)s, day)::date AS period,
+    SUM(sales) AS sales,
+    SUM(quantity) AS quantity,
+    SUM(boxes) AS boxes
+FROM sales_daily_area
+WHERE day BETWEEN %(start)s AND %(end)s
+  AND (%(depot)s::int IS NULL OR depot_id = %(depot)s)
+GROUP BY 1
+ORDER BY 1
+"""
+
+TOP_FLAVOR_IDS = """
+SELECT flavor_id
+FROM sales_daily_flavor
+WHERE day BETWEEN %(start)s AND %(end)s
+  AND (%(depot)s::int IS NULL OR depot_id = %(depot)s)
+GROUP BY flavor_id
+ORDER BY SUM(quantity) DESC
+LIMIT %(top)s
+"""
+
+FLAVOR_TREND = """
+SELECT
+    date_trunc(%(bucket)s, r.day)::date AS period,
+    f.name AS flavor,
+    SUM(r.quantity) AS quantity
+FROM sales_daily_flavor r
+JOIN flavors f ON f.id = r.flavor_id
+WHERE r.day BETWEEN %(start)s AND %(end)s
+  AND (%(depot)s::int IS NULL OR r.depot_id = %(depot)s)
+  AND r.flavor_id = ANY(%(flavors)s)
+GROUP BY 1, 2
+ORDER BY 2, 1
+"""
+
+# Stock at the end of each period: the opening balance at %(start)s (last
+# snapshot plus later movements) plus a running sum of per-period deltas.
+# Snapshots are totals over all depots, so for one depot the opening
+# balance is the sum of all its movements before %(start)s instead.
+STOCK_HISTORY = """
+WITH opening AS (
+    SELECT
+        f.id AS flavor_id,
+        COALESCE(s.stock,0) + COALESCE(d.quantity,0) AS stock
+    FROM flavors f
+    LEFT JOIN LATERAL (
+        SELECT stock, last_movement_id
+        FROM inventory_snapshots
+        WHERE flavor_id = f.id AND taken_at < %(start)s
+          AND %(depot)s::int IS NULL
+        ORDER BY taken_at DESC
+        LIMIT 1
+    ) s ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT SUM(m.quantity) AS quantity
+        FROM inventory_movements m
+        WHERE m.flavor_id = f.id
+          AND m.id > COALESCE(s.last_movement_id, 0)
+          AND m.created_at < %(start)s
+          AND (%(depot)s::int IS NULL OR m.depot_id = %(depot)s)
+    ) d ON TRUE
+    WHERE f.id = ANY(%(flavors)s)
+),
+deltas AS (
+    SELECT
+        flavor_id,
+        date_trunc(%(bucket)s, created_at)::date AS period,
+        SUM(quantity) AS quantity
+    FROM inventory_movements
+    WHERE flavor_id = ANY(%(flavors)s)
+      AND created_at >= %(start)s
+      AND created_at < %(end)s::date + 1
+      AND (%(depot)s::int IS NULL OR depot_id = %(depot)s)
+    GROUP BY 1, 2
+)
+SELECT
+    d.period,
+    f.name AS flavor,
+    (o.stock + SUM(d.quantity) OVER (PARTITION BY d.flavor_id ORDER BY d.period))::bigint AS stock
+FROM deltas d
+JOIN opening o ON o.flavor_id = d.flavor_id
+JOIN flavors f ON f.id = d.flavor_id
+ORDER BY 2, 1
+"""
+
+
+# ---------------- DOWNSAMPLING ----------------
+
+# Indices of the n points LTTB keeps from (x, y); x must be increasing.
+def lttb(x, y, n):
+
+    size = len(x)
+
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # First and last points are always kept; the rest is split into n-2
+    # buckets and each keeps the point forming the largest triangle with
+    # the previously kept point and the next bucket's average.
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+
+    keep = np.empty(n, dtype=int)
+    keep[0] = 0
+    keep[-1] = size - 1
+
+    a = 0
+
+    for i in range(n - 2):
+
+        lo, hi = edges[i], edges[i + 1]
+
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        cx = x[nlo:nhi].mean()
+        cy = y[nlo:nhi].mean()
+
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a]) -
+            (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+
+    return keep
+
+
+# Downsamples each series (one per `by` value) of df to `budget` points.
+def downsample(df, x, y, by=None, budget=POINT_BUDGET):
+
+    if df.empty:
+        return df
+
+    def one(g):
+        xs = pd.to_datetime(g[x]).map(pd.Timestamp.toordinal).to_numpy()
+        return g.iloc[lttb(xs, g[y].to_numpy(), budget)]
+
+    if by is None:
+        return one(df)
+
+    return pd.concat([one(g) for _, g in df.groupby(by, sort=False)], ignore_index=True)
@@ -0,0 +1,53 @@
+# customers.py
+
+SEARCH_LIMIT = 20
+
+# Trigrams need at least three characters; shorter input only matches
+# name prefixes, which the btree index handles.
+MIN_SUBSTRING = 3
+
+SEARCH_BY_PREFIX = """
+SELECT id, name, phone, shop, area
+FROM customers
+WHERE active
+  AND lower(name) LIKE %(pattern)s
+ORDER BY id
+LIMIT %(limit)s
+"""
+
+# The expression must match customers_search_trgm_idx exactly.
+SEARCH_BY_SUBSTRING = """
+SELECT id, name, phone, shop, area
+FROM customers
+WHERE active
+  AND lower(
+        coalesce(name,'') || ' ' ||
+        coalesce(phone,'') || ' ' ||
+        coalesce(shop,'') || ' ' ||
+        coalesce(area,'')
+      ) LIKE %(pattern)s
+ORDER BY id
+LIMIT %(limit)s
+"""
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_query(text, limit=SEARCH_LIMIT):
+
+    text = text.strip().lower()
+    pattern = _escape_like(text)
+
+    if len(text) < MIN_SUBSTRING:
+        return SEARCH_BY_PREFIX, {"pattern": pattern + "%", "limit": limit}
+
+    return SEARCH_BY_SUBSTRING, {"pattern": "%" + pattern + "%", "limit": limit}
+
+
+def label(row):
+
+    extra = ", ".join(str(v) for v in (row["shop"], row["area"], row["phone"]) if v)
+
+    return f"{row['name']} — {extra}" if extra else str(row["name"])
@@ -0,0 +1,245 @@
+# db.py
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import errors
+from psycopg2 import pool as pg_pool
+
+DB_HOST = os.getenv("DB_HOST")
+DB_NAME = os.getenv("DB_NAME")
+DB_USER = os.getenv("DB_USER")
+DB_PASS = os.getenv("DB_PASS")
+DB_PORT = os.getenv("DB_PORT")
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+# Seconds a caller waits for a free connection before giving up.
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# Connections idle for longer than this are pinged before being handed out.
+HEALTHCHECK_AFTER = float(os.getenv("DB_HEALTHCHECK_AFTER", "30"))
+
+# Times Pool.run() retries a transaction that lost a deadlock or
+# serialization conflict before giving up.
+TX_RETRIES = int(os.getenv("DB_TX_RETRIES", "5"))
+
+RETRYABLE = (errors.DeadlockDetected, errors.SerializationFailure)
+
+
+def conn_kwargs():
+    return dict(
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASS,
+        port=DB_PORT,
+        connect_timeout=5
+    )
+
+
+def get_conn():
+    return psycopg2.connect(**conn_kwargs())
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# ---------------- POOL ----------------
+
+class Pool:
+
+    # cursor_factory becomes the default cursor class of every pooled
+    # connection (e.g. metrics.Cursor to instrument all statements).
+    def __init__(
+        self,
+        minconn=POOL_MIN,
+        maxconn=POOL_MAX,
+        timeout=POOL_TIMEOUT,
+        cursor_factory=None
+    ):
+
+        self.maxconn = maxconn
+        self.timeout = timeout
+
+        kwargs = conn_kwargs()
+
+        if cursor_factory is not None:
+            kwargs["cursor_factory"] = cursor_factory
+
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **kwargs)
+
+        # ThreadedConnectionPool raises as soon as it is exhausted, so
+        # callers queue on this semaphore instead.
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "reconnects": 0,
+            "tx_retries": 0
+        }
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _healthy(self, conn):
+
+        if conn.closed:
+            return False
+
+        last = self._last_used.get(id(conn))
+
+        if last is None or time.monotonic() - last < HEALTHCHECK_AFTER:
+            return True
+
+        self._count("health_checks")
+
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _acquire(self):
+
+        if not self._slots.acquire(blocking=False):
+
+            self._count("waits")
+
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count("timeouts")
+                raise PoolTimeout(
+                    f"No database connection free after {self.timeout}s"
+                )
+
+        try:
+            conn = self._pool.getconn()
+
+            if not self._healthy(conn):
+                self._discard(conn)
+                self._count("reconnects")
+                conn = self._pool.getconn()
+
+            conn.autocommit = True
+
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._in_use += 1
+
+        return conn
+
+    def _release(self, conn, broken=False):
+
+        try:
+            if broken or conn.closed:
+                self._discard(conn)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+
+        conn = self._acquire()
+        broken = False
+
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    @contextmanager
+    def cursor(self):
+
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+
+    # Pass a name to get a server-side cursor that streams rows in
+    # itersize batches instead of buffering the whole result client-side.
+    @contextmanager
+    def transaction(self, name=None, itersize=2000):
+
+        with self.connection() as conn:
+
+            conn.autocommit = False
+
+            try:
+                with conn.cursor(name=name) as cur:
+                    if name:
+                        cur.itersize = itersize
+                    yield cur
+                conn.commit()
+
+            except BaseException:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+
+            finally:
+                if not conn.closed:
+                    conn.autocommit = True
+
+    # Runs fn(cur) in a transaction and returns its result. A deadlock or
+    # serialization failure rolls back and reruns fn from the start, with
+    # jittered backoff, so fn must not have side effects outside the DB.
+    def run(self, fn, retries=TX_RETRIES):
+
+        for attempt in range(retries + 1):
+
+            try:
+                with self.transaction() as cur:
+                    return fn(cur)
+
+            except RETRYABLE:
+
+                if attempt == retries:
+                    raise
+
+                self._count("tx_retries")
+                time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+    def stats(self):
+
+        with self._lock:
+            s = dict(self._stats)
+            s["in_use"] = self._in_use
+
+        s["open"] = len(self._pool._pool) + len(self._pool._used)
+        s["idle"] = len(self._pool._pool)
+        s["max"] = self.maxconn
+
+        return s
+
+    def close(self):
+        self._pool.closeall()
@@ -0,0 +1,227 @@
+# export.py
+#
+# Streaming CSV / Parquet export. Rows come off a named server-side cursor
+# CHUNK_ROWS at a time and each chunk is written out before the next is
+# fetched, so memory stays flat however long the date range is.
+#
+# Usage:
+#   python export.py sales --from 2024-01-01 --to 2024-12-31 --format parquet -o sales.parquet
+
+import argparse
+import csv
+import sys
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import db
+
+CHUNK_ROWS = 10_000
+
+EXPORTS = {
+
+    "sales": """
+    SELECT
+        s.id AS sale_id,
+        s.sale_date,
+        c.name AS customer,
+        c.shop,
+        c.area,
+        f.name AS flavor,
+        si.quantity,
+        s.total_boxes,
+        s.created_by
+    FROM sales s
+    JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+    JOIN customers c ON c.id = s.customer_id
+    JOIN flavors f ON f.id = si.flavor_id
+    WHERE s.sale_date BETWEEN %(start)s AND %(end)s
+    ORDER BY s.id
+    """,
+
+    "returns": """
+    SELECT
+        r.id AS return_id,
+        r.return_date,
+        COALESCE(c.name, r.customer_name) AS customer,
+        c.shop,
+        c.area,
+        f.name AS flavor,
+        ri.returned,
+        ri.damaged,
+        r.returned_boxes,
+        r.damaged_boxes,
+        r.damaged_bottles,
+        r.note,
+        r.created_by
+    FROM returns r
+    LEFT JOIN customers c ON c.id = r.customer_id
+    LEFT JOIN return_items ri ON ri.return_id = r.id
+    LEFT JOIN flavors f ON f.id = ri.flavor_id
+    WHERE r.return_date BETWEEN %(start)s AND %(end)s
+    ORDER BY r.id
+    """,
+
+    "activity": """
+    SELECT *
+    FROM activity_logs
+    WHERE log_date >= %(start)s
+      AND log_date < %(end)s::date + 1
+    ORDER BY id
+    """
+}
+
+# Postgres type OID -> Arrow type, for the columns the exports produce
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC")
+}
+
+
+def _fetch_chunks(cur):
+
+    while True:
+
+        rows = cur.fetchmany(CHUNK_ROWS)
+
+        if not rows:
+            break
+
+        yield rows
+
+
+def chunks(cur, kind, start, end):
+
+    cur.execute(EXPORTS[kind], {"start": start, "end": end})
+
+    yield from _fetch_chunks(cur)
+
+
+def _columns(cur):
+    return [d[0] for d in cur.description]
+
+
+def write_csv(cur, kind, start, end, f):
+
+    w = csv.writer(f)
+    header = False
+    n = 0
+
+    for rows in chunks(cur, kind, start, end):
+
+        if not header:
+            w.writerow(_columns(cur))
+            header = True
+
+        w.writerows(rows)
+        n += len(rows)
+
+    # Empty range: still emit the header
+    if not header and cur.description:
+        w.writerow(_columns(cur))
+
+    return n
+
+
+def _schema(cur):
+    return pa.schema([
+        (d[0], ARROW_TYPES.get(d[1], pa.string()))
+        for d in cur.description
+    ])
+
+
+def write_parquet(cur, kind, start, end, f):
+    return _write_parquet(cur, chunks(cur, kind, start, end), f)
+
+
+# Any query, e.g. a whole partition for archive.archive()
+def write_query_parquet(cur, query, params, f):
+
+    cur.execute(query, params)
+
+    return _write_parquet(cur, _fetch_chunks(cur), f)
+
+
+def _write_parquet(cur, batches, f):
+
+    writer = None
+    n = 0
+
+    try:
+
+        for rows in batches:
+
+            if writer is None:
+                schema = _schema(cur)
+                writer = pq.ParquetWriter(f, schema, compression="zstd")
+
+            # One row group per chunk
+            cols = list(zip(*rows))
+
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(c, type=t) for c, t in zip(cols, schema.types)],
+                schema=schema
+            ))
+
+            n += len(rows)
+
+        # Empty range: still produce a valid file with the schema
+        if writer is None and cur.description:
+            writer = pq.ParquetWriter(f, _schema(cur), compression="zstd")
+
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return n
+
+
+# cur should be a named (server-side) cursor.
+def write(cur, kind, start, end, fmt, f):
+
+    if fmt == "parquet":
+        return write_parquet(cur, kind, start, end, f)
+
+    return write_csv(cur, kind, start, end, f)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Export history")
+    parser.add_argument("kind", choices=list(EXPORTS))
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, required=True)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("-o", "--output", required=True)
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+
+    try:
+
+        mode = "wb" if args.format == "parquet" else "w"
+        newline = None if args.format == "parquet" else ""
+
+        with open(args.output, mode, newline=newline) as f:
+            with conn.cursor(name=f"export_{args.kind}") as cur:
+                n = write(cur, args.kind, args.start, args.end, args.format, f)
+
+        conn.rollback()
+
+        print(f"Wrote {n} rows to {args.output}")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
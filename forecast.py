@@ -0,0 +1,156 @@
+# forecast.py
+#
+# Sales-velocity forecast per flavor. Daily quantities for every flavor
+# come out of the flavor rollup as one days x flavors matrix, and
+# exponential smoothing runs over all columns at once (pandas ewm), giving
+# each flavor's smoothed daily velocity and its spread. From those:
+#
+#   reorder point = velocity * lead time + z * sigma * sqrt(lead time)
+#   days of cover = stock / velocity
+#
+# Results go to flavor_forecasts for the Dashboard, which only reads them.
+#
+# Usage:
+#   python forecast.py run [--days 90] [--alpha 0.3] [--lead-time 7]   (run from cron)
+
+import argparse
+import math
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+import db
+
+# Days of history fed to the smoother
+FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", "90"))
+
+# Smoothing factor: higher reacts faster to recent days
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.3"))
+
+# Days between placing an order and the stock arriving
+LEAD_TIME_DAYS = float(os.getenv("LEAD_TIME_DAYS", "7"))
+
+# Safety stock in standard deviations of daily demand (1.65 ~ 95% service)
+SERVICE_Z = float(os.getenv("SERVICE_Z", "1.65"))
+
+TABLES = ("flavor_forecasts",)
+
+
+def daily_matrix(cur, start, end):
+
+    cur.execute("""
+    SELECT f.id, r.day, r.quantity
+    FROM flavors f
+    LEFT JOIN sales_daily_flavor r
+      ON r.flavor_id = f.id
+     AND r.day BETWEEN %s AND %s
+    WHERE f.active
+    """, (start, end))
+
+    df = pd.DataFrame(cur.fetchall(), columns=["flavor_id", "day", "quantity"])
+
+    # Days without sales are zero demand, not missing data
+    return (
+        df.pivot_table(index="day", columns="flavor_id", values="quantity",
+                       aggfunc="sum", fill_value=0)
+          .reindex(pd.date_range(start, end).date, fill_value=0)
+          .reindex(columns=sorted(df["flavor_id"].unique()), fill_value=0)
+          .astype(float)
+    )
+
+
+def forecast(matrix, stock, alpha=FORECAST_ALPHA, lead_time=LEAD_TIME_DAYS, z=SERVICE_Z):
+
+    smoothed = matrix.ewm(alpha=alpha, adjust=False)
+
+    out = pd.DataFrame({
+        "velocity": smoothed.mean().iloc[-1],
+        "sigma": smoothed.std().iloc[-1].fillna(0)
+    })
+
+    out["stock"] = stock.reindex(out.index).fillna(0).astype(int)
+
+    out["reorder_point"] = (
+        out["velocity"] * lead_time + z * out["sigma"] * math.sqrt(lead_time)
+    ).round().astype(int)
+
+    out["days_of_cover"] = (out["stock"] / out["velocity"]).where(out["velocity"] > 0)
+
+    return out
+
+
+def run(cur, days=FORECAST_DAYS, alpha=FORECAST_ALPHA, lead_time=LEAD_TIME_DAYS):
+
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=days - 1)
+
+    matrix = daily_matrix(cur, start, end)
+
+    if matrix.empty or not len(matrix.columns):
+        return 0
+
+    # Velocity is business-wide, so cover is against stock at all depots
+    cur.execute("SELECT flavor_id, SUM(stock) FROM inventory GROUP BY flavor_id")
+    stock = pd.Series(dict(cur.fetchall()), dtype="int64")
+
+    out = forecast(matrix, stock, alpha, lead_time)
+
+    rows = [
+        (int(fid), float(r.velocity), float(r.sigma), int(r.stock),
+         None if pd.isna(r.days_of_cover) else float(r.days_of_cover),
+         int(r.reorder_point))
+        for fid, r in out.iterrows()
+    ]
+
+    execute_values(cur, """
+    INSERT INTO flavor_forecasts(flavor_id,velocity,sigma,stock,days_of_cover,reorder_point)
+    VALUES %s
+    ON CONFLICT (flavor_id) DO UPDATE
+    SET computed_at = now(),
+        velocity = EXCLUDED.velocity,
+        sigma = EXCLUDED.sigma,
+        stock = EXCLUDED.stock,
+        days_of_cover = EXCLUDED.days_of_cover,
+        reorder_point = EXCLUDED.reorder_point
+    """, rows, page_size=1000)
+
+    # Deactivated flavors drop off the Dashboard's forecast
+    cur.execute("""
+    DELETE FROM flavor_forecasts
+    WHERE flavor_id NOT IN (SELECT id FROM flavors WHERE active)
+    """)
+
+    return len(rows)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Sales velocity forecast")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--days", type=int, default=FORECAST_DAYS)
+    parser.add_argument("--alpha", type=float, default=FORECAST_ALPHA)
+    parser.add_argument("--lead-time", type=float, default=LEAD_TIME_DAYS)
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+
+    try:
+        t = time.perf_counter()
+
+        with conn:
+            with conn.cursor() as cur:
+                n = run(cur, args.days, args.alpha, args.lead_time)
+
+        print(f"Forecast {n} flavors in {time.perf_counter() - t:.1f}s")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# grid.py
+#
+# Batch editing for the Flavors and Customers lists. The pages render one
+# st.data_editor per list (a single widget however many rows there are);
+# diff() turns the editor's output into the changed rows, and apply_*()
+# commits them with one UPDATE ... FROM (VALUES ...) inside the caller's
+# transaction.
+
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+
+FLAVOR_COLUMNS = ["name"]
+CUSTOMER_COLUMNS = ["name", "phone", "shop", "area"]
+
+
+def _clean(df, columns):
+    return df[columns].fillna("").astype(str).apply(lambda s: s.str.strip())
+
+
+# before: the rows given to the editor, indexed by id; after: what the
+# editor returned. Returns the changed rows (edited columns + active),
+# indexed by id.
+def diff(before, after, columns, unique_name=False):
+
+    b = _clean(before, columns)
+    a = _clean(after.loc[before.index], columns)
+
+    gone = after.loc[before.index, "deactivate"].fillna(False).astype(bool)
+    changed = (a != b).any(axis=1) | gone
+
+    rows = a.loc[changed].assign(active=~gone[changed])
+
+    if (rows["name"] == "").any():
+        raise ValueError("Name can't be blank")
+
+    if unique_name:
+
+        names = a.loc[~gone, "name"]
+        dupes = sorted(set(names[names.duplicated()]))
+
+        if dupes:
+            raise ValueError(f"Duplicate names: {', '.join(dupes)}")
+
+    return rows
+
+
+def audit_entries(kind, before, rows, username):
+
+    entries = []
+
+    for rid, r in rows.iterrows():
+
+        old = before.at[rid, "name"]
+
+        if not r["active"]:
+            action = f"Deactivated {kind} {old}"
+        elif r["name"] != old:
+            action = f"Renamed {kind} {old} to {r['name']}"
+        else:
+            action = f"Updated {kind} {r['name']}"
+
+        entries.append((username, action))
+
+    return entries
+
+
+# ---------------- APPLY ----------------
+
+def apply_flavors(cur, rows):
+
+    values = [
+        (int(rid), r["name"], bool(r["active"]))
+        for rid, r in rows.iterrows()
+    ]
+
+    try:
+        # UNIQUE(name) is checked row by row, so renames that swap or
+        # shuffle names within the batch would trip over each other. The
+        # renamed rows get a placeholder name (chr(1), which no real name
+        # holds, plus the id) first and their final name second.
+        execute_values(cur, """
+        UPDATE flavors f
+        SET name = chr(1) || f.id
+        FROM (VALUES %s) AS v(id, name)
+        WHERE f.id = v.id AND f.name <> v.name
+        """, [(rid, name) for rid, name, _ in values], page_size=len(values))
+
+        execute_values(cur, """
+        UPDATE flavors f
+        SET name = v.name,
+            active = v.active
+        FROM (VALUES %s) AS v(id, name, active)
+        WHERE f.id = v.id
+        """, values, page_size=len(values))
+
+    # Names are unique across active and inactive flavors
+    except errors.UniqueViolation:
+        raise ValueError("A flavor with that name already exists")
+
+
+def apply_customers(cur, rows):
+
+    values = [
+        (int(rid), r["name"], r["phone"], r["shop"], r["area"], bool(r["active"]))
+        for rid, r in rows.iterrows()
+    ]
+
+    execute_values(cur, """
+    UPDATE customers c
+    SET name = v.name,
+        phone = v.phone,
+        shop = v.shop,
+        area = v.area,
+        active = v.active
+    FROM (VALUES %s) AS v(id, name, phone, shop, area, active)
+    WHERE c.id = v.id
+    """, values, page_size=len(values))
@@ -0,0 +1,210 @@
+# ledger.py
+#
+# Inventory movement ledger. Every change to inventory.stock is mirrored by
+# a signed row in inventory_movements; inventory_snapshots checkpoints the
+# running total so point-in-time stock never replays the whole ledger.
+#
+# Usage:
+#   python ledger.py snapshot              take a snapshot (run from cron)
+#   python ledger.py reconcile             compare ledger with inventory
+#   python ledger.py as-of 2026-01-31T18:00
+
+import argparse
+import sys
+from datetime import datetime
+
+import pandas as pd
+from psycopg2.extras import execute_values
+
+import db
+
+KINDS = ("receipt", "sale", "return", "writeoff", "transfer", "adjustment", "reset")
+
+TABLES = ("inventory_movements",)
+
+
+# ---------------- MOVEMENTS ----------------
+
+# rows: [(depot_id, flavor_id, kind, signed quantity, ref_id), ...]
+def record(cur, rows, username):
+
+    if not rows:
+        return
+
+    execute_values(cur, """
+    INSERT INTO inventory_movements(depot_id,flavor_id,kind,quantity,ref_id,created_by)
+    VALUES %s
+    """, [(did, fid, kind, q, ref, username) for did, fid, kind, q, ref in rows], page_size=len(rows))
+
+
+# ---------------- SNAPSHOTS ----------------
+
+def snapshot(cur):
+
+    # SHARE mode waits for in-flight movement inserts to commit and holds
+    # off new ones, so no id below the snapshot's cut-off can appear later.
+    cur.execute("LOCK TABLE inventory_movements IN SHARE MODE")
+
+    cur.execute("""
+    WITH cutoff AS (
+        SELECT COALESCE(MAX(id),0) AS id FROM inventory_movements
+    ),
+    prev AS (
+        SELECT DISTINCT ON (flavor_id) flavor_id, stock, last_movement_id
+        FROM inventory_snapshots
+        ORDER BY flavor_id, taken_at DESC
+    ),
+    delta AS (
+        SELECT m.flavor_id, SUM(m.quantity) AS quantity
+        FROM inventory_movements m
+        LEFT JOIN prev p ON p.flavor_id = m.flavor_id
+        WHERE m.id > COALESCE(p.last_movement_id, 0)
+          AND m.id <= (SELECT id FROM cutoff)
+        GROUP BY m.flavor_id
+    )
+    INSERT INTO inventory_snapshots(flavor_id,taken_at,stock,last_movement_id)
+    SELECT f.id,
+           now(),
+           COALESCE(p.stock,0) + COALESCE(d.quantity,0),
+           (SELECT id FROM cutoff)
+    FROM flavors f
+    LEFT JOIN prev p ON p.flavor_id = f.id
+    LEFT JOIN delta d ON d.flavor_id = f.id
+    """)
+
+    return cur.rowcount
+
+
+# ---------------- POINT IN TIME ----------------
+
+STOCK_AS_OF = """
+SELECT
+    f.name,
+    COALESCE(s.stock,0) + COALESCE(d.quantity,0) AS stock
+FROM flavors f
+LEFT JOIN LATERAL (
+    SELECT stock, last_movement_id
+    FROM inventory_snapshots
+    WHERE flavor_id = f.id AND taken_at <= %(at)s
+    ORDER BY taken_at DESC
+    LIMIT 1
+) s ON TRUE
+LEFT JOIN LATERAL (
+    SELECT SUM(m.quantity) AS quantity
+    FROM inventory_movements m
+    WHERE m.flavor_id = f.id
+      AND m.id > COALESCE(s.last_movement_id, 0)
+      AND m.created_at <= %(at)s
+) d ON TRUE
+ORDER BY f.name
+"""
+
+
+# ---------------- RECONCILIATION ----------------
+
+def reconcile(conn):
+
+    # All three reads see one snapshot, so concurrent postings can't show
+    # up as false mismatches.
+    conn.autocommit = False
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+        return _reconcile(conn)
+
+    finally:
+        conn.rollback()
+
+
+def _reconcile(conn):
+
+    # Snapshots are per flavor, so compare totals across depots
+    inv = pd.read_sql("""
+    SELECT f.id AS flavor_id, f.name, COALESCE(SUM(i.stock),0) AS stock
+    FROM flavors f
+    LEFT JOIN inventory i ON i.flavor_id = f.id
+    GROUP BY f.id, f.name
+    """, conn)
+
+    snap = pd.read_sql("""
+    SELECT DISTINCT ON (flavor_id) flavor_id, stock AS snap_stock, last_movement_id
+    FROM inventory_snapshots
+    ORDER BY flavor_id, taken_at DESC
+    """, conn)
+
+    # Only movements after each flavor's latest snapshot are summed
+    moves = pd.read_sql("""
+    SELECT m.flavor_id, SUM(m.quantity) AS delta
+    FROM inventory_movements m
+    LEFT JOIN (
+        SELECT DISTINCT ON (flavor_id) flavor_id, last_movement_id
+        FROM inventory_snapshots
+        ORDER BY flavor_id, taken_at DESC
+    ) s ON s.flavor_id = m.flavor_id
+    WHERE m.id > COALESCE(s.last_movement_id, 0)
+    GROUP BY m.flavor_id
+    """, conn)
+
+    df = (
+        inv.merge(snap, on="flavor_id", how="left")
+           .merge(moves, on="flavor_id", how="left")
+    )
+
+    df["ledger_stock"] = (
+        df["snap_stock"].fillna(0) + df["delta"].fillna(0)
+    ).astype("int64")
+
+    df["difference"] = df["stock"] - df["ledger_stock"]
+
+    return df.loc[
+        df["difference"] != 0,
+        ["flavor_id", "name", "stock", "ledger_stock", "difference"]
+    ].reset_index(drop=True)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Inventory ledger")
+    parser.add_argument("command", choices=["snapshot", "reconcile", "as-of"])
+    parser.add_argument("at", nargs="?", type=datetime.fromisoformat)
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+
+    try:
+
+        if args.command == "snapshot":
+
+            with conn:
+                with conn.cursor() as cur:
+                    n = snapshot(cur)
+
+            print(f"Snapshot taken for {n} flavors")
+
+        elif args.command == "reconcile":
+
+            df = reconcile(conn)
+
+            if df.empty:
+                print("Ledger matches inventory")
+            else:
+                print(df.to_string(index=False))
+                return 1
+
+        else:
+
+            if args.at is None:
+                parser.error("as-of needs a timestamp")
+
+            df = pd.read_sql(STOCK_AS_OF, conn, params={"at": args.at})
+            print(df.to_string(index=False))
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# metrics.py
+#
+# SQL instrumentation. Cursor is a psycopg2 cursor class that times every
+# execute/executemany/copy_expert and records the statement fingerprint,
+# duration, row count and the page that issued it. Slow statements are
+# logged with their parameters, except for statements carrying
+# credentials. Totals per (page, fingerprint) are kept per process and
+# rendered in Prometheus text format; the statements of the current
+# Streamlit rerun are kept separately for the admin panel.
+#
+# Wire it in with db.Pool(cursor_factory=metrics.Cursor).
+
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from psycopg2 import sql
+from psycopg2.extensions import cursor as _cursor
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# Longest parameter repr written to the slow-query log
+MAX_PARAMS_LOG = 500
+
+logger = logging.getLogger(__name__)
+
+_page = contextvars.ContextVar("page", default="-")
+_rerun = contextvars.ContextVar("rerun", default=None)
+
+
+# ---------------- FINGERPRINTS ----------------
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s")
+_SPACE = re.compile(r"\s+")
+
+# execute_values / IN lists expand to any number of groups; fold them
+_GROUPS = re.compile(r"\((?:\s*\?\s*,)*\s*\?\s*\)(?:\s*,\s*\((?:\s*\?\s*,)*\s*\?\s*\))+")
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def fingerprint(query):
+
+    q = _STRING.sub("?", query)
+    q = _PARAM.sub("?", q)
+    q = _NUMBER.sub("?", q)
+    q = _GROUPS.sub("(...)", q)
+    q = _LIST.sub("...", q)
+
+    return _SPACE.sub(" ", q).strip()
+
+
+def query_id(fp):
+    return hashlib.md5(fp.encode()).hexdigest()[:12]
+
+
+# ---------------- CONTEXT ----------------
+
+# Called at the top of each rerun; statements run from then on in this
+# thread are attributed to `page` and collected for the rerun panel.
+def begin_rerun(page="-"):
+    _page.set(page)
+    _rerun.set([])
+
+
+def set_page(page):
+    _page.set(page)
+
+
+# [(fingerprint, ms, rows), ...] for this rerun so far
+def rerun_queries():
+    return list(_rerun.get() or [])
+
+
+# ---------------- REGISTRY ----------------
+
+class Registry:
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS):
+
+        self.slow_ms = slow_ms
+
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._statements = {}
+        self._reruns = {}
+
+    def record(self, page, fp, ms, rows):
+
+        key = (page, query_id(fp))
+        slow = ms >= self.slow_ms
+
+        with self._lock:
+
+            self._statements.setdefault(key[1], fp)
+
+            q = self._queries.get(key)
+
+            if q is None:
+                q = self._queries[key] = {"count": 0, "seconds": 0.0, "rows": 0, "slow": 0}
+
+            q["count"] += 1
+            q["seconds"] += ms / 1000
+            q["rows"] += max(rows, 0)
+            q["slow"] += slow
+
+        return slow
+
+    # Per-page rerun totals; queries per rerun is what exposes N+1 loops
+    def end_rerun(self, page, queries):
+
+        with self._lock:
+
+            r = self._reruns.get(page)
+
+            if r is None:
+                r = self._reruns[page] = {"count": 0, "queries": 0, "seconds": 0.0}
+
+            r["count"] += 1
+            r["queries"] += len(queries)
+            r["seconds"] += sum(ms for _, ms, _ in queries) / 1000
+
+    def top(self, n=20):
+
+        with self._lock:
+            rows = [
+                dict(page=page, statement=self._statements[qid], **q)
+                for (page, qid), q in self._queries.items()
+            ]
+
+        rows.sort(key=lambda r: r["seconds"], reverse=True)
+
+        return rows[:n]
+
+    def prometheus(self):
+
+        with self._lock:
+            queries = {k: dict(v) for k, v in self._queries.items()}
+            statements = dict(self._statements)
+            reruns = {k: dict(v) for k, v in self._reruns.items()}
+
+        out = []
+
+        def metric(name, kind, help_, samples):
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                out.append(f"{name}{{{labels}}} {value}")
+
+        def labels(page, qid):
+            return f'page="{_escape(page)}",query="{qid}"'
+
+        metric("sql_queries_total", "counter", "Statements executed.", [
+            (labels(p, qid), q["count"]) for (p, qid), q in queries.items()
+        ])
+        metric("sql_query_seconds_total", "counter", "Time spent executing statements.", [
+            (labels(p, qid), round(q["seconds"], 6)) for (p, qid), q in queries.items()
+        ])
+        metric("sql_query_rows_total", "counter", "Rows returned or affected.", [
+            (labels(p, qid), q["rows"]) for (p, qid), q in queries.items()
+        ])
+        metric("sql_slow_queries_total", "counter", f"Statements slower than {self.slow_ms:g} ms.", [
+            (labels(p, qid), q["slow"]) for (p, qid), q in queries.items()
+        ])
+        metric("sql_query_info", "gauge", "Statement fingerprint for each query id.", [
+            (f'query="{qid}",statement="{_escape(fp[:200])}"', 1) for qid, fp in statements.items()
+        ])
+        metric("page_reruns_total", "counter", "Page reruns that completed.", [
+            (f'page="{_escape(p)}"', r["count"]) for p, r in reruns.items()
+        ])
+        metric("page_rerun_queries_total", "counter", "Statements issued by completed reruns.", [
+            (f'page="{_escape(p)}"', r["queries"]) for p, r in reruns.items()
+        ])
+        metric("page_rerun_query_seconds_total", "counter", "Statement time of completed reruns.", [
+            (f'page="{_escape(p)}"', round(r["seconds"], 6)) for p, r in reruns.items()
+        ])
+
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._statements.clear()
+            self._reruns.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Registry()
+
+
+# ---------------- CURSOR ----------------
+
+# Statements whose parameters are never logged: anything that reads or
+# writes a password column, and the prepared login statement (its EXECUTE
+# text doesn't mention the column).
+_SENSITIVE = re.compile(r"\bpassword\b|^\s*EXECUTE\s+login\b", re.I)
+
+
+def _params_repr(text, params):
+
+    if params and _SENSITIVE.search(text):
+        return "<redacted>"
+
+    s = repr(params)
+
+    if len(s) > MAX_PARAMS_LOG:
+        s = s[:MAX_PARAMS_LOG] + "..."
+
+    return s
+
+
+class Cursor(_cursor):
+
+    def _timed(self, query, params, run):
+
+        if isinstance(query, sql.Composable):
+            text = query.as_string(self)
+        elif isinstance(query, bytes):
+            text = query.decode(errors="replace")
+        else:
+            text = query
+
+        t = time.perf_counter()
+
+        try:
+            return run()
+
+        finally:
+
+            ms = (time.perf_counter() - t) * 1000
+
+            fp = fingerprint(text)
+            page = _page.get()
+
+            if registry.record(page, fp, ms, self.rowcount):
+                logger.warning(
+                    "Slow query (%.1f ms, %d rows, page %s): %s params=%s",
+                    ms, self.rowcount, page, fp, _params_repr(text, params)
+                )
+
+            rerun = _rerun.get()
+
+            if rerun is not None:
+                rerun.append((fp, ms, self.rowcount))
+
+    def execute(self, query, vars=None):
+        return self._timed(query, vars, lambda: super(Cursor, self).execute(query, vars))
+
+    def executemany(self, query, vars_list):
+        return self._timed(query, None, lambda: super(Cursor, self).executemany(query, vars_list))
+
+    def copy_expert(self, query, file, size=8192):
+        return self._timed(query, None, lambda: super(Cursor, self).copy_expert(query, file, size))
+
+
+# ---------------- EXPORT ----------------
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = registry.prometheus().encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Serves /metrics for Prometheus to scrape, from a daemon thread.
+def serve(port, host="0.0.0.0"):
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+    return server
@@ -0,0 +1,187 @@
+# migrate.py
+#
+# Usage:
+#   python migrate.py            apply pending migrations
+#   python migrate.py up --to N  apply pending migrations up to version N
+#   python migrate.py status     show applied and pending migrations
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+
+import db
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "migrations"
+)
+
+# Serializes migrations when several app processes start at once.
+LOCK_KEY = 720_001
+
+
+def available():
+
+    out = []
+
+    for fn in sorted(os.listdir(MIGRATIONS_DIR)):
+
+        m = re.match(r"^(\d+)_(\w+)\.(sql|py)$", fn)
+
+        if m:
+            out.append((
+                int(m.group(1)),
+                m.group(2),
+                os.path.join(MIGRATIONS_DIR, fn)
+            ))
+
+    return out
+
+
+# Migrations are either plain SQL files or Python modules defining
+# up(cur), for steps that need a little Python around their SQL. Either
+# kind carries its own SQL instead of calling app code, so a migration
+# does the same thing on a fresh install as it did when it shipped.
+def apply(cur, path):
+
+    if path.endswith(".py"):
+
+        spec = importlib.util.spec_from_file_location(
+            "migration_" + os.path.basename(path)[:-3], path
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        module.up(cur)
+
+    else:
+
+        with open(path) as f:
+            cur.execute(f.read())
+
+
+def current_version(cur):
+
+    cur.execute("SELECT to_regclass('schema_version')")
+
+    if cur.fetchone()[0] is None:
+        return 0
+
+    cur.execute("SELECT COALESCE(MAX(version),0) FROM schema_version")
+
+    return cur.fetchone()[0]
+
+
+def pending(cur):
+    v = current_version(cur)
+    return [m for m in available() if m[0] > v]
+
+
+def migrate(conn, target=None, log=None):
+
+    conn.autocommit = True
+
+    with conn.cursor() as cur:
+
+        cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+
+    try:
+
+        with conn.cursor() as cur:
+
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version(
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+            """)
+
+            todo = pending(cur)
+
+        applied = []
+
+        for version, name, path in todo:
+
+            if target is not None and version > target:
+                break
+
+            if log:
+                log(f"Applying {version:04d}_{name}")
+
+            # Each migration and its version row commit together.
+            conn.autocommit = False
+
+            try:
+                with conn.cursor() as cur:
+                    apply(cur, path)
+                    cur.execute("""
+                    INSERT INTO schema_version(version,name)
+                    VALUES(%s,%s)
+                    """, (version, name))
+                conn.commit()
+
+            except BaseException:
+                conn.rollback()
+                raise
+
+            finally:
+                conn.autocommit = True
+
+            applied.append(version)
+
+        return applied
+
+    finally:
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+
+
+def status(conn):
+
+    conn.autocommit = True
+
+    with conn.cursor() as cur:
+
+        v = current_version(cur)
+
+        applied = {}
+
+        if v:
+            cur.execute("SELECT version, applied_at FROM schema_version")
+            applied = dict(cur.fetchall())
+
+    for version, name, _ in available():
+
+        when = applied.get(version)
+        state = f"applied {when:%Y-%m-%d %H:%M}" if when else "pending"
+
+        print(f"{version:04d}_{name:<40} {state}")
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    parser.add_argument("command", nargs="?", default="up", choices=["up", "status"])
+    parser.add_argument("--to", type=int, default=None, help="target version")
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+
+    try:
+        if args.command == "status":
+            status(conn)
+        else:
+            applied = migrate(conn, target=args.to, log=print)
+            if not applied:
+                print("Schema is up to date")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
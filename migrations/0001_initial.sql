@@ -0,0 +1,71 @@
+-- 0001_initial.sql
+-- Baseline schema. Uses IF NOT EXISTS so databases created by the old
+-- create_tables() are adopted as-is.
+
+CREATE TABLE IF NOT EXISTS users(
+    id SERIAL PRIMARY KEY,
+    username TEXT UNIQUE,
+    password TEXT,
+    role TEXT
+);
+
+CREATE TABLE IF NOT EXISTS flavors(
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE,
+    active BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS inventory(
+    flavor_id INTEGER REFERENCES flavors(id),
+    stock INTEGER DEFAULT 0,
+    PRIMARY KEY(flavor_id)
+);
+
+CREATE TABLE IF NOT EXISTS customers(
+    id SERIAL PRIMARY KEY,
+    name TEXT,
+    phone TEXT,
+    shop TEXT,
+    area TEXT,
+    active BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS sales(
+    id SERIAL PRIMARY KEY,
+    customer_id INTEGER,
+    total_boxes INTEGER,
+    sale_date TEXT,
+    created_by TEXT
+);
+
+CREATE TABLE IF NOT EXISTS sale_items(
+    id SERIAL PRIMARY KEY,
+    sale_id INTEGER,
+    flavor_id INTEGER,
+    quantity INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS returns(
+    id SERIAL PRIMARY KEY,
+    customer_name TEXT,
+    return_date TEXT,
+    returned_boxes INTEGER,
+    damaged_boxes INTEGER,
+    damaged_bottles INTEGER,
+    note TEXT,
+    created_by TEXT
+);
+
+CREATE TABLE IF NOT EXISTS activity_logs(
+    id SERIAL PRIMARY KEY,
+    username TEXT,
+    action TEXT,
+    log_date TEXT
+);
+
+-- Default admin / admin123 on an empty database
+INSERT INTO users(username,password,role)
+SELECT 'admin',
+       '240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9',
+       'admin'
+WHERE NOT EXISTS (SELECT 1 FROM users);
@@ -0,0 +1,38 @@
+-- 0002_typed_dates_fks_indexes.sql
+-- Typed date columns, missing foreign keys and the indexes behind the
+-- Sales History join and date-range filters. Existing rows were written
+-- as ISO strings (date.today().isoformat()), so they cast directly.
+
+ALTER TABLE sales
+    ALTER COLUMN sale_date TYPE DATE USING NULLIF(sale_date, '')::date,
+    ALTER COLUMN sale_date SET DEFAULT CURRENT_DATE;
+
+ALTER TABLE returns
+    ALTER COLUMN return_date TYPE DATE USING NULLIF(return_date, '')::date,
+    ALTER COLUMN return_date SET DEFAULT CURRENT_DATE;
+
+ALTER TABLE activity_logs
+    ALTER COLUMN log_date TYPE TIMESTAMPTZ USING NULLIF(log_date, '')::timestamptz,
+    ALTER COLUMN log_date SET DEFAULT now();
+
+ALTER TABLE sales
+    ADD CONSTRAINT sales_customer_id_fkey
+    FOREIGN KEY (customer_id) REFERENCES customers(id);
+
+ALTER TABLE sale_items
+    ADD CONSTRAINT sale_items_sale_id_fkey
+    FOREIGN KEY (sale_id) REFERENCES sales(id) ON DELETE CASCADE;
+
+ALTER TABLE sale_items
+    ADD CONSTRAINT sale_items_flavor_id_fkey
+    FOREIGN KEY (flavor_id) REFERENCES flavors(id);
+
+CREATE INDEX sales_customer_id_idx ON sales(customer_id);
+CREATE INDEX sales_sale_date_idx ON sales(sale_date);
+
+-- Covers the sale_items side of the Sales History join (index-only scan)
+CREATE INDEX sale_items_sale_id_idx ON sale_items(sale_id) INCLUDE (flavor_id, quantity);
+CREATE INDEX sale_items_flavor_id_idx ON sale_items(flavor_id);
+
+CREATE INDEX returns_return_date_idx ON returns(return_date);
+CREATE INDEX activity_logs_log_date_idx ON activity_logs(log_date);
@@ -0,0 +1,106 @@
+# 0003_sales_rollups.py
+# Daily rollup tables for the Reports page, backfilled from existing sales
+# and returns. The backfill is the SQL rollups.rebuild() ran when this
+# migration shipped, kept here so later changes to rollups.py can't change
+# what this step does.
+
+
+def up(cur):
+
+    cur.execute("""
+    CREATE TABLE sales_daily_flavor(
+        day DATE NOT NULL,
+        flavor_id INTEGER NOT NULL REFERENCES flavors(id),
+        quantity BIGINT NOT NULL DEFAULT 0,
+        sales INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY(day, flavor_id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE sales_daily_customer(
+        day DATE NOT NULL,
+        customer_id INTEGER NOT NULL REFERENCES customers(id),
+        sales INTEGER NOT NULL DEFAULT 0,
+        quantity BIGINT NOT NULL DEFAULT 0,
+        boxes BIGINT NOT NULL DEFAULT 0,
+        returned_boxes BIGINT NOT NULL DEFAULT 0,
+        damaged_boxes BIGINT NOT NULL DEFAULT 0,
+        damaged_bottles BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY(day, customer_id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE sales_daily_area(
+        day DATE NOT NULL,
+        area TEXT NOT NULL,
+        sales INTEGER NOT NULL DEFAULT 0,
+        quantity BIGINT NOT NULL DEFAULT 0,
+        boxes BIGINT NOT NULL DEFAULT 0,
+        returned_boxes BIGINT NOT NULL DEFAULT 0,
+        damaged_boxes BIGINT NOT NULL DEFAULT 0,
+        damaged_bottles BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY(day, area)
+    )
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_flavor(day,flavor_id,quantity,sales)
+    SELECT s.sale_date, si.flavor_id, SUM(si.quantity), COUNT(DISTINCT s.id)
+    FROM sales s
+    JOIN sale_items si ON si.sale_id = s.id
+    WHERE s.sale_date IS NOT NULL
+    GROUP BY 1, 2
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_customer(
+        day,customer_id,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT day, customer_id,
+           SUM(sales), SUM(quantity), SUM(boxes),
+           SUM(returned_boxes), SUM(damaged_boxes), SUM(damaged_bottles)
+    FROM (
+        SELECT s.sale_date AS day, s.customer_id,
+               1 AS sales,
+               COALESCE(SUM(si.quantity),0) AS quantity,
+               COALESCE(s.total_boxes,0) AS boxes,
+               0 AS returned_boxes, 0 AS damaged_boxes, 0 AS damaged_bottles
+        FROM sales s
+        LEFT JOIN sale_items si ON si.sale_id = s.id
+        WHERE s.sale_date IS NOT NULL
+          AND s.customer_id IS NOT NULL
+        GROUP BY s.id, s.sale_date, s.customer_id, s.total_boxes
+
+        UNION ALL
+
+        SELECT r.return_date, c.id, 0, 0, 0,
+               COALESCE(r.returned_boxes,0),
+               COALESCE(r.damaged_boxes,0),
+               COALESCE(r.damaged_bottles,0)
+        FROM returns r
+        JOIN LATERAL (
+            SELECT id FROM customers
+            WHERE name = r.customer_name
+            ORDER BY active DESC, id
+            LIMIT 1
+        ) c ON TRUE
+        WHERE r.return_date IS NOT NULL
+    ) x
+    GROUP BY day, customer_id
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_area(
+        day,area,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT d.day, COALESCE(c.area,''),
+           SUM(d.sales), SUM(d.quantity), SUM(d.boxes),
+           SUM(d.returned_boxes), SUM(d.damaged_boxes), SUM(d.damaged_bottles)
+    FROM sales_daily_customer d
+    JOIN customers c ON c.id = d.customer_id
+    GROUP BY 1, 2
+    """)
@@ -0,0 +1,31 @@
+-- 0004_inventory_ledger.sql
+-- Append-only stock movements plus periodic per-flavor snapshots, so stock
+-- at any past time is a snapshot lookup plus a short delta scan.
+
+CREATE TABLE inventory_movements(
+    id BIGSERIAL PRIMARY KEY,
+    flavor_id INTEGER NOT NULL REFERENCES flavors(id),
+    kind TEXT NOT NULL
+        CHECK (kind IN ('receipt','sale','return','adjustment','reset')),
+    quantity INTEGER NOT NULL,
+    ref_id INTEGER,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    created_by TEXT
+);
+
+CREATE INDEX inventory_movements_flavor_id_idx ON inventory_movements(flavor_id, id);
+CREATE INDEX inventory_movements_created_at_idx ON inventory_movements(created_at);
+
+CREATE TABLE inventory_snapshots(
+    flavor_id INTEGER NOT NULL REFERENCES flavors(id),
+    taken_at TIMESTAMPTZ NOT NULL,
+    stock INTEGER NOT NULL,
+    last_movement_id BIGINT NOT NULL,
+    PRIMARY KEY(flavor_id, taken_at)
+);
+
+-- Opening balances so the ledger already sums to current stock
+INSERT INTO inventory_movements(flavor_id,kind,quantity,created_by)
+SELECT flavor_id, 'adjustment', stock, 'migration'
+FROM inventory
+WHERE stock <> 0;
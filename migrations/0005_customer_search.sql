@@ -0,0 +1,21 @@
+-- 0005_customer_search.sql
+-- Indexes behind the search-as-you-type customer picker: a btree for
+-- short name prefixes and a trigram index for substrings across name,
+-- phone, shop and area. Needs the pg_trgm extension (contrib).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX customers_name_prefix_idx
+    ON customers (lower(name) text_pattern_ops)
+    WHERE active;
+
+CREATE INDEX customers_search_trgm_idx
+    ON customers USING gin ((
+        lower(
+            coalesce(name,'') || ' ' ||
+            coalesce(phone,'') || ' ' ||
+            coalesce(shop,'') || ' ' ||
+            coalesce(area,'')
+        )
+    ) gin_trgm_ops)
+    WHERE active;
@@ -0,0 +1,16 @@
+-- 0006_api_requests.sql
+-- Idempotency keys for the JSON API. A key is inserted in the same
+-- transaction as the write it guards, together with the response, so a
+-- retried request replays the stored response instead of posting twice.
+
+CREATE TABLE api_requests(
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    username TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status INTEGER,
+    response JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX api_requests_created_at_idx ON api_requests(created_at);
@@ -0,0 +1,13 @@
+-- 0007_flavor_forecasts.sql
+-- Per-flavor sales velocity and reorder points, written by the forecast
+-- batch job (python forecast.py run) and read by the Dashboard.
+
+CREATE TABLE flavor_forecasts(
+    flavor_id INTEGER PRIMARY KEY REFERENCES flavors(id),
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    velocity DOUBLE PRECISION NOT NULL,
+    sigma DOUBLE PRECISION NOT NULL,
+    stock INTEGER NOT NULL,
+    days_of_cover DOUBLE PRECISION,
+    reorder_point INTEGER NOT NULL
+);
@@ -0,0 +1,110 @@
+# 0008_normalized_returns.py
+# Returns keyed by customer_id with per-flavor return lines. Existing rows
+# are matched to a customer by name (case and surrounding spaces ignored,
+# active customers first, then the oldest); names that match nobody keep
+# customer_id NULL and stay out of the customer rollups, as before. The
+# customer and area rollups are then recounted on the new key with the SQL
+# rollups.rebuild() ran when this migration shipped.
+
+
+def up(cur):
+
+    cur.execute("""
+    ALTER TABLE returns
+        ADD COLUMN customer_id INTEGER REFERENCES customers(id)
+    """)
+
+    cur.execute("""
+    WITH names AS (
+        SELECT DISTINCT ON (lower(btrim(name)))
+               lower(btrim(name)) AS key, id
+        FROM customers
+        ORDER BY lower(btrim(name)), active DESC, id
+    )
+    UPDATE returns r
+    SET customer_id = n.id
+    FROM names n
+    WHERE lower(btrim(r.customer_name)) = n.key
+    """)
+
+    cur.execute("""
+    CREATE INDEX returns_customer_id_idx ON returns(customer_id, return_date)
+    """)
+
+    # returned: back on the shelf; damaged: taken back and written off
+    cur.execute("""
+    CREATE TABLE return_items(
+        id BIGSERIAL PRIMARY KEY,
+        return_id INTEGER NOT NULL REFERENCES returns(id) ON DELETE CASCADE,
+        flavor_id INTEGER NOT NULL REFERENCES flavors(id),
+        returned INTEGER NOT NULL DEFAULT 0 CHECK (returned >= 0),
+        damaged INTEGER NOT NULL DEFAULT 0 CHECK (damaged >= 0),
+        CHECK (returned + damaged > 0)
+    )
+    """)
+
+    cur.execute("""
+    CREATE INDEX return_items_return_id_idx ON return_items(return_id)
+        INCLUDE (flavor_id, returned, damaged)
+    """)
+
+    cur.execute("""
+    CREATE INDEX return_items_flavor_id_idx ON return_items(flavor_id)
+    """)
+
+    cur.execute("""
+    ALTER TABLE inventory_movements
+        DROP CONSTRAINT inventory_movements_kind_check,
+        ADD CONSTRAINT inventory_movements_kind_check
+        CHECK (kind IN ('receipt','sale','return','writeoff','adjustment','reset'))
+    """)
+
+    # Customer and area rollups now join returns on customer_id
+    cur.execute("DELETE FROM sales_daily_customer")
+    cur.execute("DELETE FROM sales_daily_area")
+
+    cur.execute("""
+    INSERT INTO sales_daily_customer(
+        day,customer_id,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT day, customer_id,
+           SUM(sales), SUM(quantity), SUM(boxes),
+           SUM(returned_boxes), SUM(damaged_boxes), SUM(damaged_bottles)
+    FROM (
+        SELECT s.sale_date AS day, s.customer_id,
+               1 AS sales,
+               COALESCE(SUM(si.quantity),0) AS quantity,
+               COALESCE(s.total_boxes,0) AS boxes,
+               0 AS returned_boxes, 0 AS damaged_boxes, 0 AS damaged_bottles
+        FROM sales s
+        LEFT JOIN sale_items si ON si.sale_id = s.id
+        WHERE s.sale_date IS NOT NULL
+          AND s.customer_id IS NOT NULL
+        GROUP BY s.id, s.sale_date, s.customer_id, s.total_boxes
+
+        UNION ALL
+
+        SELECT r.return_date, r.customer_id, 0, 0, 0,
+               COALESCE(r.returned_boxes,0),
+               COALESCE(r.damaged_boxes,0),
+               COALESCE(r.damaged_bottles,0)
+        FROM returns r
+        WHERE r.return_date IS NOT NULL
+          AND r.customer_id IS NOT NULL
+    ) x
+    GROUP BY day, customer_id
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_area(
+        day,area,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT d.day, COALESCE(c.area,''),
+           SUM(d.sales), SUM(d.quantity), SUM(d.boxes),
+           SUM(d.returned_boxes), SUM(d.damaged_boxes), SUM(d.damaged_bottles)
+    FROM sales_daily_customer d
+    JOIN customers c ON c.id = d.customer_id
+    GROUP BY 1, 2
+    """)
@@ -0,0 +1,68 @@
+-- 0009_depots.sql
+-- Stock per depot. inventory is keyed by (depot_id, flavor_id), so sales
+-- at different depots lock different rows, and sales, returns and ledger
+-- movements record which depot they hit. Existing stock and history go to
+-- depot 1, "Main". Snapshots stay per flavor across all depots.
+
+CREATE TABLE depots(
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    active BOOLEAN NOT NULL DEFAULT TRUE
+);
+
+INSERT INTO depots(name) VALUES('Main');
+
+-- The constant default fills existing rows without a table rewrite; it is
+-- dropped afterwards so every writer has to name the depot.
+ALTER TABLE inventory
+    ADD COLUMN depot_id INTEGER NOT NULL DEFAULT 1 REFERENCES depots(id);
+
+ALTER TABLE inventory ALTER COLUMN depot_id DROP DEFAULT;
+
+ALTER TABLE inventory
+    DROP CONSTRAINT inventory_pkey,
+    ADD PRIMARY KEY (depot_id, flavor_id);
+
+-- Totals across depots
+CREATE INDEX inventory_flavor_id_idx ON inventory(flavor_id) INCLUDE (stock);
+
+ALTER TABLE inventory_movements
+    ADD COLUMN depot_id INTEGER NOT NULL DEFAULT 1 REFERENCES depots(id);
+
+ALTER TABLE inventory_movements ALTER COLUMN depot_id DROP DEFAULT;
+
+ALTER TABLE inventory_movements
+    DROP CONSTRAINT inventory_movements_kind_check,
+    ADD CONSTRAINT inventory_movements_kind_check
+    CHECK (kind IN ('receipt','sale','return','writeoff','transfer','adjustment','reset'));
+
+CREATE INDEX inventory_movements_depot_id_idx ON inventory_movements(depot_id, flavor_id, id);
+
+ALTER TABLE sales
+    ADD COLUMN depot_id INTEGER NOT NULL DEFAULT 1 REFERENCES depots(id);
+
+ALTER TABLE sales ALTER COLUMN depot_id DROP DEFAULT;
+
+ALTER TABLE returns
+    ADD COLUMN depot_id INTEGER NOT NULL DEFAULT 1 REFERENCES depots(id);
+
+ALTER TABLE returns ALTER COLUMN depot_id DROP DEFAULT;
+
+CREATE TABLE transfers(
+    id SERIAL PRIMARY KEY,
+    from_depot_id INTEGER NOT NULL REFERENCES depots(id),
+    to_depot_id INTEGER NOT NULL REFERENCES depots(id),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    created_by TEXT,
+    note TEXT,
+    CHECK (from_depot_id <> to_depot_id)
+);
+
+CREATE TABLE transfer_items(
+    transfer_id INTEGER NOT NULL REFERENCES transfers(id) ON DELETE CASCADE,
+    flavor_id INTEGER NOT NULL REFERENCES flavors(id),
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    PRIMARY KEY(transfer_id, flavor_id)
+);
+
+CREATE INDEX transfers_created_at_idx ON transfers(created_at);
@@ -0,0 +1,235 @@
+# 0010_monthly_partitions.py
+# sales, sale_items and activity_logs become tables range-partitioned by
+# month (see partitions.py). Each table is rebuilt: the old one is renamed
+# aside, a partitioned one takes its name with partitions covering all
+# existing rows, the rows are copied over, and keys and indexes are added
+# once the data is in. Ids keep coming from the same sequences.
+#
+# Partitioning needs the partition key in every unique key, so primary
+# keys become (id, date). sale_items carries its sale's sale_date, and its
+# foreign key to sales is on (sale_id, sale_date), so both tables can be
+# partitioned and archived by the same months. Rows with no date (from
+# before 0002) are given the table's earliest date.
+#
+# Partitions are created here with their own SQL rather than through
+# partitions.py, and the rollups are recounted with the SQL rollups.py ran
+# when this shipped, so later changes to either module can't change what
+# this migration does. The partition names (table_YYYY_MM) are the ones
+# partitions.py looks for.
+
+from datetime import date
+
+# Months of empty partitions made ready beyond this month
+MONTHS_AHEAD = 3
+
+
+def _month(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month, n):
+    y, m = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def _range(cur, query):
+    cur.execute(query)
+    return cur.fetchone()
+
+
+def _create_partitions(cur, first, last):
+
+    for table in ("sale_items", "sales", "activity_logs"):
+
+        month = first
+
+        while month <= last:
+            cur.execute(f"""
+            CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table}
+            FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')
+            """)
+            month = _add_months(month, 1)
+
+
+def up(cur):
+
+    cur.execute("""
+    UPDATE sales
+    SET sale_date = (SELECT COALESCE(MIN(sale_date), CURRENT_DATE) FROM sales)
+    WHERE sale_date IS NULL
+    """)
+
+    cur.execute("""
+    UPDATE activity_logs
+    SET log_date = (SELECT COALESCE(MIN(log_date), now()) FROM activity_logs)
+    WHERE log_date IS NULL
+    """)
+
+    # Every month from the oldest row through the newest one (rows can be
+    # dated ahead) or MONTHS_AHEAD from now, whichever is later
+    days = [
+        d for d in (
+            _range(cur, "SELECT MIN(sale_date), MAX(sale_date) FROM sales") +
+            _range(cur, "SELECT MIN(log_date)::date, MAX(log_date)::date FROM activity_logs")
+        ) if d
+    ]
+
+    ahead = _add_months(_month(date.today()), MONTHS_AHEAD)
+
+    first = _month(min(days + [date.today()]))
+    last = _month(max(days + [ahead]))
+
+    for t in ("sale_items", "sales", "activity_logs"):
+        cur.execute(f"ALTER TABLE {t} RENAME TO {t}_unpartitioned")
+        cur.execute(f"ALTER SEQUENCE {t}_id_seq OWNED BY NONE")
+
+    cur.execute("""
+    CREATE TABLE sales(
+        id INTEGER NOT NULL DEFAULT nextval('sales_id_seq'),
+        customer_id INTEGER,
+        total_boxes INTEGER,
+        sale_date DATE NOT NULL DEFAULT CURRENT_DATE,
+        created_by TEXT,
+        depot_id INTEGER NOT NULL
+    ) PARTITION BY RANGE (sale_date)
+    """)
+
+    cur.execute("""
+    CREATE TABLE sale_items(
+        id INTEGER NOT NULL DEFAULT nextval('sale_items_id_seq'),
+        sale_id INTEGER NOT NULL,
+        sale_date DATE NOT NULL,
+        flavor_id INTEGER,
+        quantity INTEGER
+    ) PARTITION BY RANGE (sale_date)
+    """)
+
+    cur.execute("""
+    CREATE TABLE activity_logs(
+        id INTEGER NOT NULL DEFAULT nextval('activity_logs_id_seq'),
+        username TEXT,
+        action TEXT,
+        log_date TIMESTAMPTZ NOT NULL DEFAULT now()
+    ) PARTITION BY RANGE (log_date)
+    """)
+
+    _create_partitions(cur, first, last)
+
+    cur.execute("""
+    INSERT INTO sales(id,customer_id,total_boxes,sale_date,created_by,depot_id)
+    SELECT id, customer_id, total_boxes, sale_date, created_by, depot_id
+    FROM sales_unpartitioned
+    """)
+
+    # Items whose sale no longer exists have nothing to be filed under
+    cur.execute("""
+    INSERT INTO sale_items(id,sale_id,sale_date,flavor_id,quantity)
+    SELECT si.id, si.sale_id, s.sale_date, si.flavor_id, si.quantity
+    FROM sale_items_unpartitioned si
+    JOIN sales_unpartitioned s ON s.id = si.sale_id
+    """)
+
+    cur.execute("""
+    INSERT INTO activity_logs(id,username,action,log_date)
+    SELECT id, username, action, log_date
+    FROM activity_logs_unpartitioned
+    """)
+
+    # Frees the old key and index names for the new tables
+    cur.execute("DROP TABLE sale_items_unpartitioned, sales_unpartitioned, activity_logs_unpartitioned")
+
+    for t in ("sale_items", "sales", "activity_logs"):
+        cur.execute(f"ALTER SEQUENCE {t}_id_seq OWNED BY {t}.id")
+
+    cur.execute("ALTER TABLE sales ADD PRIMARY KEY (id, sale_date)")
+    cur.execute("ALTER TABLE sale_items ADD PRIMARY KEY (id, sale_date)")
+    cur.execute("ALTER TABLE activity_logs ADD PRIMARY KEY (id, log_date)")
+
+    cur.execute("""
+    ALTER TABLE sales
+        ADD CONSTRAINT sales_customer_id_fkey
+        FOREIGN KEY (customer_id) REFERENCES customers(id),
+        ADD CONSTRAINT sales_depot_id_fkey
+        FOREIGN KEY (depot_id) REFERENCES depots(id)
+    """)
+
+    cur.execute("""
+    ALTER TABLE sale_items
+        ADD CONSTRAINT sale_items_sale_id_fkey
+        FOREIGN KEY (sale_id, sale_date) REFERENCES sales(id, sale_date) ON DELETE CASCADE,
+        ADD CONSTRAINT sale_items_flavor_id_fkey
+        FOREIGN KEY (flavor_id) REFERENCES flavors(id)
+    """)
+
+    # Newest-first history reads the newest partition's index first and
+    # stops once it has enough rows.
+    cur.execute("CREATE INDEX sales_sale_date_idx ON sales(sale_date, id)")
+    cur.execute("CREATE INDEX sales_customer_id_idx ON sales(customer_id)")
+
+    cur.execute("""
+    CREATE INDEX sale_items_sale_id_idx ON sale_items(sale_id) INCLUDE (flavor_id, quantity)
+    """)
+    cur.execute("CREATE INDEX sale_items_flavor_id_idx ON sale_items(flavor_id)")
+
+    cur.execute("CREATE INDEX activity_logs_log_date_idx ON activity_logs(log_date, id)")
+
+    # Returns aren't partitioned but page the same (date, id) way
+    cur.execute("DROP INDEX returns_return_date_idx")
+    cur.execute("CREATE INDEX returns_return_date_idx ON returns(return_date, id)")
+
+    # Recount the rollups from the copied rows
+    for t in ("sales_daily_flavor", "sales_daily_customer", "sales_daily_area"):
+        cur.execute(f"DELETE FROM {t}")
+
+    cur.execute("""
+    INSERT INTO sales_daily_flavor(day,flavor_id,quantity,sales)
+    SELECT s.sale_date, si.flavor_id, SUM(si.quantity), COUNT(DISTINCT s.id)
+    FROM sales s
+    JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+    GROUP BY 1, 2
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_customer(
+        day,customer_id,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT day, customer_id,
+           SUM(sales), SUM(quantity), SUM(boxes),
+           SUM(returned_boxes), SUM(damaged_boxes), SUM(damaged_bottles)
+    FROM (
+        SELECT s.sale_date AS day, s.customer_id,
+               1 AS sales,
+               COALESCE(SUM(si.quantity),0) AS quantity,
+               COALESCE(s.total_boxes,0) AS boxes,
+               0 AS returned_boxes, 0 AS damaged_boxes, 0 AS damaged_bottles
+        FROM sales s
+        LEFT JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+        WHERE s.customer_id IS NOT NULL
+        GROUP BY s.id, s.sale_date, s.customer_id, s.total_boxes
+
+        UNION ALL
+
+        SELECT r.return_date, r.customer_id, 0, 0, 0,
+               COALESCE(r.returned_boxes,0),
+               COALESCE(r.damaged_boxes,0),
+               COALESCE(r.damaged_bottles,0)
+        FROM returns r
+        WHERE r.return_date IS NOT NULL
+          AND r.customer_id IS NOT NULL
+    ) x
+    GROUP BY day, customer_id
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_area(
+        day,area,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT d.day, COALESCE(c.area,''),
+           SUM(d.sales), SUM(d.quantity), SUM(d.boxes),
+           SUM(d.returned_boxes), SUM(d.damaged_boxes), SUM(d.damaged_bottles)
+    FROM sales_daily_customer d
+    JOIN customers c ON c.id = d.customer_id
+    GROUP BY 1, 2
+    """)
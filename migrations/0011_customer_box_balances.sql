@@ -0,0 +1,19 @@
+-- 0011_customer_box_balances.sql
+-- Running box balance per customer: boxes delivered on sales against boxes
+-- brought back on returns (returned or damaged), kept current in the same
+-- transaction as each sale and return. Backfilled from the customer
+-- rollups, which still hold months whose raw sales have been archived.
+
+CREATE TABLE customer_box_balances(
+    customer_id INTEGER PRIMARY KEY REFERENCES customers(id),
+    boxes_out BIGINT NOT NULL DEFAULT 0,
+    boxes_returned BIGINT NOT NULL DEFAULT 0,
+    boxes_damaged BIGINT NOT NULL DEFAULT 0,
+    outstanding BIGINT GENERATED ALWAYS AS (boxes_out - boxes_returned - boxes_damaged) STORED,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+INSERT INTO customer_box_balances(customer_id,boxes_out,boxes_returned,boxes_damaged)
+SELECT customer_id, SUM(boxes), SUM(returned_boxes), SUM(damaged_boxes)
+FROM sales_daily_customer
+GROUP BY customer_id;
@@ -0,0 +1,73 @@
+-- 0012_depot_rollups.sql
+-- The flavor and area rollups are kept per depot. Every sale upserts its
+-- (day, flavor) and (day, area) rollup rows and holds their locks until
+-- commit, so without the depot in the key, sales at different depots
+-- still queued behind each other on shared flavors and areas.
+--
+-- Days the raw tables still cover (from the oldest month of sales left
+-- after archiving) are recounted per depot. Older rollup rows can't be
+-- split and are filed under depot 1, Main; reports add depots up, so
+-- their totals are unchanged.
+
+ALTER TABLE sales_daily_flavor
+    ADD COLUMN depot_id INTEGER NOT NULL DEFAULT 1 REFERENCES depots(id);
+
+ALTER TABLE sales_daily_flavor ALTER COLUMN depot_id DROP DEFAULT;
+
+ALTER TABLE sales_daily_flavor
+    DROP CONSTRAINT sales_daily_flavor_pkey,
+    ADD PRIMARY KEY (day, depot_id, flavor_id);
+
+ALTER TABLE sales_daily_area
+    ADD COLUMN depot_id INTEGER NOT NULL DEFAULT 1 REFERENCES depots(id);
+
+ALTER TABLE sales_daily_area ALTER COLUMN depot_id DROP DEFAULT;
+
+ALTER TABLE sales_daily_area
+    DROP CONSTRAINT sales_daily_area_pkey,
+    ADD PRIMARY KEY (day, depot_id, area);
+
+CREATE TEMP TABLE rollup_floor ON COMMIT DROP AS
+SELECT COALESCE(date_trunc('month', MIN(sale_date))::date, '-infinity'::date) AS day
+FROM sales;
+
+DELETE FROM sales_daily_flavor WHERE day >= (SELECT day FROM rollup_floor);
+
+DELETE FROM sales_daily_area WHERE day >= (SELECT day FROM rollup_floor);
+
+INSERT INTO sales_daily_flavor(day,depot_id,flavor_id,quantity,sales)
+SELECT s.sale_date, s.depot_id, si.flavor_id, SUM(si.quantity), COUNT(DISTINCT s.id)
+FROM sales s
+JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+GROUP BY 1, 2, 3;
+
+INSERT INTO sales_daily_area(
+    day,depot_id,area,sales,quantity,boxes,
+    returned_boxes,damaged_boxes,damaged_bottles
+)
+SELECT x.day, x.depot_id, COALESCE(c.area,''),
+       SUM(x.sales), SUM(x.quantity), SUM(x.boxes),
+       SUM(x.returned_boxes), SUM(x.damaged_boxes), SUM(x.damaged_bottles)
+FROM (
+    SELECT s.sale_date AS day, s.depot_id, s.customer_id,
+           1 AS sales,
+           COALESCE(SUM(si.quantity),0) AS quantity,
+           COALESCE(s.total_boxes,0) AS boxes,
+           0 AS returned_boxes, 0 AS damaged_boxes, 0 AS damaged_bottles
+    FROM sales s
+    LEFT JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+    WHERE s.customer_id IS NOT NULL
+    GROUP BY s.id, s.sale_date, s.depot_id, s.customer_id, s.total_boxes
+
+    UNION ALL
+
+    SELECT r.return_date, r.depot_id, r.customer_id, 0, 0, 0,
+           COALESCE(r.returned_boxes,0),
+           COALESCE(r.damaged_boxes,0),
+           COALESCE(r.damaged_bottles,0)
+    FROM returns r
+    WHERE r.return_date >= (SELECT day FROM rollup_floor)
+      AND r.customer_id IS NOT NULL
+) x
+JOIN customers c ON c.id = x.customer_id
+GROUP BY 1, 2, 3;
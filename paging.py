@@ -0,0 +1,105 @@
+# paging.py
+#
+# Keyset pagination over append-only tables, newest first by (date, id).
+# Pages are addressed by the (date, id) key just past their edge
+# (before/after) rather than an OFFSET, so page N costs the same as page 1.
+# Ordering by the date as well as the id lets Postgres read a month-
+# partitioned table (see partitions.py) partition by partition from the
+# newest and prune the months outside the page's range.
+
+from collections import namedtuple
+
+import pandas as pd
+from psycopg2 import sql
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# newest / oldest: (date, id) keys of the page's first and last rows
+Page = namedtuple("Page", ["df", "has_newer", "has_older", "newest", "oldest"])
+
+
+def fetch_page(pool, table, date_col, page_size, before=None, after=None):
+
+    t = sql.Identifier(table)
+    d = sql.Identifier(date_col)
+
+    # The plain range test beside each row comparison is what allows
+    # partition pruning; the row comparison alone doesn't.
+    if after is not None:
+        # Newer rows: walk up from `after`, then flip back to newest-first
+        q = sql.SQL("""
+        SELECT * FROM {t}
+        WHERE {d} >= %s AND ({d}, id) > (%s, %s)
+        ORDER BY {d} ASC, id ASC
+        LIMIT %s
+        """).format(t=t, d=d)
+        params = (after[0], after[0], after[1], page_size + 1)
+    elif before is not None:
+        q = sql.SQL("""
+        SELECT * FROM {t}
+        WHERE {d} <= %s AND ({d}, id) < (%s, %s)
+        ORDER BY {d} DESC, id DESC
+        LIMIT %s
+        """).format(t=t, d=d)
+        params = (before[0], before[0], before[1], page_size + 1)
+    else:
+        q = sql.SQL("SELECT * FROM {t} ORDER BY {d} DESC, id DESC LIMIT %s").format(t=t, d=d)
+        params = (page_size + 1,)
+
+    # One extra row tells us whether another page exists.
+    with pool.transaction(name=f"page_{table}", itersize=page_size + 1) as cur:
+        cur.execute(q, params)
+        rows = cur.fetchall()
+        columns = [c[0] for c in cur.description]
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if after is not None:
+        rows.reverse()
+
+    di, ii = columns.index(date_col), columns.index("id")
+
+    newest = (rows[0][di], rows[0][ii]) if rows else None
+    oldest = (rows[-1][di], rows[-1][ii]) if rows else None
+
+    if after is not None:
+        has_newer, has_older = more, True
+    elif before is not None and newest is not None:
+        # A jump can land on the newest row, so ask rather than assume
+        has_newer, has_older = _exists_newer(pool, t, d, newest), more
+    else:
+        has_newer, has_older = False, more
+
+    return Page(pd.DataFrame(rows, columns=columns), has_newer, has_older, newest, oldest)
+
+
+def _exists_newer(pool, t, d, key):
+
+    q = sql.SQL("""
+    SELECT EXISTS (
+        SELECT 1 FROM {t}
+        WHERE {d} >= %s AND ({d}, id) > (%s, %s)
+    )
+    """).format(t=t, d=d)
+
+    with pool.cursor() as cur:
+        cur.execute(q, (key[0], key[0], key[1]))
+        return cur.fetchone()[0]
+
+
+# (date, id) of the newest row on or before `day`
+def key_on_or_before(pool, table, date_col, day):
+
+    q = sql.SQL("""
+    SELECT {d}, id FROM {t}
+    WHERE {d} < %s::date + 1
+    ORDER BY {d} DESC, id DESC
+    LIMIT 1
+    """).format(t=sql.Identifier(table), d=sql.Identifier(date_col))
+
+    with pool.cursor() as cur:
+        cur.execute(q, (day,))
+        r = cur.fetchone()
+
+    return (r[0], r[1]) if r else None
@@ -0,0 +1,214 @@
+# partitions.py
+#
+# Monthly range partitions for sales, sale_items and activity_logs (see
+# migration 0010). ensure() keeps PARTITION_MONTHS_AHEAD months of empty
+# partitions ready. The app and the API call it on startup, again whenever
+# the month turns (ensure_current() on each write into a partitioned table
+# and from a background thread), and `maintain` can also run from cron.
+# Old months are moved out by archive.py. This module needs nothing
+# beyond psycopg2, so the write path (rollups.py) can import it.
+#
+# Usage:
+#   python partitions.py maintain              create upcoming partitions
+#   python partitions.py list                  partitions per table
+
+import argparse
+import logging
+import os
+import re
+import sys
+import threading
+from datetime import date
+
+from psycopg2 import sql
+
+import db
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+# How often the background thread re-checks
+PARTITION_CHECK_SECS = float(os.getenv("PARTITION_CHECK_SECS", "3600"))
+
+# table -> partition key. sale_items before sales: its foreign key to
+# sales has to be gone before a sales partition can be detached.
+TABLES = {
+    "sale_items": "sale_date",
+    "sales": "sale_date",
+    "activity_logs": "log_date"
+}
+
+_NAME = re.compile(r"^(?P<table>\w+)_(?P<y>\d{4})_(?P<m>\d{2})$")
+
+logger = logging.getLogger(__name__)
+
+# Month this process last found every partition in place
+_checked = None
+_lock = threading.Lock()
+
+
+# ---------------- MONTHS ----------------
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, n):
+    y, m = divmod(month.year * 12 + month.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_{month:%Y_%m}"
+
+
+# ---------------- PARTITIONS ----------------
+
+# {month: partition name} for the partitions currently attached
+def partitions(cur, table):
+
+    cur.execute("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+
+    out = {}
+
+    for (name,) in cur.fetchall():
+
+        m = _NAME.match(name)
+
+        if m and m.group("table") == table:
+            out[date(int(m.group("y")), int(m.group("m")), 1)] = name
+
+    return dict(sorted(out.items()))
+
+
+# First month still held in the database, or None if the table isn't
+# partitioned (yet).
+def oldest(cur, table):
+    return next(iter(partitions(cur, table)), None)
+
+
+def create(cur, table, month):
+
+    cur.execute(sql.SQL("""
+    CREATE TABLE IF NOT EXISTS {p} PARTITION OF {t}
+    FOR VALUES FROM (%s) TO (%s)
+    """).format(
+        p=sql.Identifier(partition_name(table, month)),
+        t=sql.Identifier(table)
+    ), (month.isoformat(), add_months(month, 1).isoformat()))
+
+
+# Creates the missing partitions from `start` (default: this month)
+# through PARTITION_MONTHS_AHEAD months from now. Existing ones are
+# skipped before any DDL, so a routine call takes no locks on the tables.
+def ensure(cur, start=None, ahead=PARTITION_MONTHS_AHEAD):
+
+    first = month_start(start or date.today())
+    last = add_months(month_start(date.today()), ahead)
+
+    created = []
+
+    for table in TABLES:
+
+        have = partitions(cur, table)
+
+        month = first
+
+        while month <= last:
+
+            if month not in have:
+                create(cur, table, month)
+                created.append(partition_name(table, month))
+
+            month = add_months(month, 1)
+
+    return created
+
+
+# ensure(), at most once per calendar month per process, so it is cheap
+# enough to call at the start of every write into a partitioned table.
+# In the month a new partition becomes due, the first write creates it.
+def ensure_current(cur):
+
+    global _checked
+
+    month = month_start(date.today())
+
+    with _lock:
+        if _checked == month:
+            return []
+
+    created = ensure(cur)
+
+    # Partitions created just now belong to the caller's transaction and
+    # can still roll back with it, so only a clean check is remembered.
+    if not created:
+        with _lock:
+            _checked = month
+
+    return created
+
+
+# Runs ensure_current() every `interval` seconds on a daemon thread, so an
+# idle process is ready for the new month too. Set the returned event to
+# stop it.
+def maintain_in_background(pool, interval=PARTITION_CHECK_SECS):
+
+    stop = threading.Event()
+
+    def run():
+
+        while True:
+
+            try:
+                pool.run(ensure_current)
+            except Exception:
+                logger.exception("Partition check failed")
+
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=run, name="partition-maintainer", daemon=True).start()
+
+    return stop
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Monthly partitions")
+    parser.add_argument("command", choices=["maintain", "list"])
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+
+    try:
+
+        if args.command == "maintain":
+
+            with conn:
+                with conn.cursor() as cur:
+                    created = ensure(cur)
+
+            print("Created " + ", ".join(created) if created else "Partitions up to date")
+
+        else:
+
+            with conn.cursor() as cur:
+                for table in TABLES:
+                    months = list(partitions(cur, table))
+                    print(f"{table}: {len(months)} partitions"
+                          + (f", {months[0]:%Y-%m} to {months[-1]:%Y-%m}" if months else ""))
+
+            conn.rollback()
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# prepared.py
+#
+# Named server-side prepared statements for the hottest queries. Each
+# pooled connection PREPAREs a statement the first time it is executed on
+# that connection and runs it with EXECUTE afterwards, so Postgres parses
+# and plans it once per connection instead of on every rerun.
+#
+# Which connections have which statements is tracked per connection
+# object. A reconnect hands out a new object, so statements are simply
+# prepared again; if a statement has gone missing server-side anyway
+# (DISCARD ALL, a pooler in between) it is re-prepared and retried.
+
+import re
+import threading
+import weakref
+from collections import namedtuple
+
+from psycopg2 import errors
+
+import queries
+
+# sql: psycopg2 form (%s placeholders); body: the same with $1, $2, ...
+Statement = namedtuple("Statement", ["name", "sql", "body", "nparams"])
+
+_PLACEHOLDER = re.compile(r"%s")
+
+
+def _numbered(sql):
+
+    n = 0
+
+    def repl(_):
+        nonlocal n
+        n += 1
+        return f"${n}"
+
+    return _PLACEHOLDER.sub(repl, sql), n
+
+
+def _statement(name, sql):
+    body, n = _numbered(sql)
+    return Statement(name, sql, body, n)
+
+
+STATEMENTS = {s.name: s for s in [
+
+    _statement("login", queries.LOGIN),
+    _statement("dashboard_stock", queries.DASHBOARD_STOCK),
+    _statement("depot_dashboard_stock", queries.DEPOT_DASHBOARD_STOCK),
+    _statement("sale_stock", queries.SALE_STOCK),
+    _statement("sales_history", queries.SALES_HISTORY),
+
+    # Signed: receipts add, corrections subtract. An upsert, so a missing
+    # (depot, flavor) row is created rather than the change silently lost.
+    _statement("inventory_add", """
+    INSERT INTO inventory(depot_id,flavor_id,stock)
+    VALUES(%s,%s,%s)
+    ON CONFLICT (depot_id,flavor_id) DO UPDATE
+    SET stock = inventory.stock + EXCLUDED.stock
+    """)
+]}
+
+_lock = threading.Lock()
+_prepared = weakref.WeakKeyDictionary()
+
+
+def _is_prepared(conn, name):
+    with _lock:
+        return name in _prepared.get(conn, ())
+
+
+def _mark(conn, name, prepared=True):
+    with _lock:
+        names = _prepared.setdefault(conn, set())
+        if prepared:
+            names.add(name)
+        else:
+            names.discard(name)
+
+
+def prepare(cur, name):
+
+    s = STATEMENTS[name]
+
+    # No parameters are passed, so psycopg2 sends the text as-is
+    cur.execute(f"PREPARE {s.name} AS {s.body}")
+
+    _mark(cur.connection, name)
+
+
+def execute_sql(name, params=()):
+
+    s = STATEMENTS[name]
+
+    if len(params) != s.nparams:
+        raise TypeError(f"{name} takes {s.nparams} parameters, got {len(params)}")
+
+    if not params:
+        return f"EXECUTE {name}"
+
+    return f"EXECUTE {name}(" + ", ".join(["%s"] * len(params)) + ")"
+
+
+def execute(cur, name, params=()):
+
+    conn = cur.connection
+
+    if not _is_prepared(conn, name):
+        prepare(cur, name)
+
+    q = execute_sql(name, params)
+
+    try:
+        cur.execute(q, params)
+
+    except errors.InvalidSqlStatementName:
+
+        _mark(conn, name, False)
+
+        # Inside a transaction the error has already aborted it; let the
+        # caller's rollback handle that and prepare again next time.
+        if not conn.autocommit:
+            raise
+
+        prepare(cur, name)
+        cur.execute(q, params)
+
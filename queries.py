@@ -0,0 +1,144 @@
+# queries.py
+#
+# Read queries issued by the pages, kept in one place so the benchmark
+# suite (bench/run.py) times exactly what the app runs.
+
+LOGIN = """
+SELECT id,role FROM users
+WHERE username=%s AND password=%s
+"""
+
+# Stock per flavor, summed over all depots or for one depot (a primary
+# key range on (depot_id, flavor_id)); spliced into the stock views below.
+ALL_DEPOTS = "SELECT flavor_id, SUM(stock)::int AS stock FROM inventory GROUP BY flavor_id"
+ONE_DEPOT = "SELECT flavor_id, stock FROM inventory WHERE depot_id=%s"
+
+# Days of cover uses live stock against the last forecast's velocity;
+# flavors the forecast job hasn't seen yet have NULL forecast columns.
+DASHBOARD = """
+SELECT
+    f.name,
+    COALESCE(i.stock,0) AS stock,
+    ROUND(fc.velocity::numeric, 1)::float AS per_day,
+    ROUND((COALESCE(i.stock,0) / NULLIF(fc.velocity,0))::numeric, 1)::float AS days_of_cover,
+    fc.reorder_point,
+    fc.computed_at AS forecast_at
+FROM flavors f
+LEFT JOIN ({stock}) i ON f.id=i.flavor_id
+LEFT JOIN flavor_forecasts fc ON fc.flavor_id=f.id
+WHERE f.active=TRUE
+ORDER BY f.name
+"""
+
+DASHBOARD_STOCK = DASHBOARD.format(stock=ALL_DEPOTS)
+
+# One depot: velocity and reorder point are scaled by the depot's share of
+# each flavor's sales over the last 90 days (the forecast's default
+# window), so its stock is flagged against its own demand; a flavor it
+# hasn't sold in that time gets 0. Takes the depot id twice.
+DEPOT_DASHBOARD_STOCK = f"""
+SELECT
+    f.name,
+    COALESCE(i.stock,0) AS stock,
+    ROUND((fc.velocity * COALESCE(sh.share,0))::numeric, 1)::float AS per_day,
+    ROUND((COALESCE(i.stock,0) / NULLIF(fc.velocity * COALESCE(sh.share,0),0))::numeric, 1)::float AS days_of_cover,
+    ROUND(fc.reorder_point * COALESCE(sh.share,0))::int AS reorder_point,
+    fc.computed_at AS forecast_at
+FROM flavors f
+LEFT JOIN ({ONE_DEPOT}) i ON f.id=i.flavor_id
+LEFT JOIN flavor_forecasts fc ON fc.flavor_id=f.id
+LEFT JOIN (
+    SELECT
+        flavor_id,
+        SUM(quantity) FILTER (WHERE depot_id=%s)::float
+            / NULLIF(SUM(quantity), 0) AS share
+    FROM sales_daily_flavor
+    WHERE day >= current_date - 90
+    GROUP BY flavor_id
+) sh ON sh.flavor_id=f.id
+WHERE f.active=TRUE
+ORDER BY f.name
+"""
+
+FLAVOR_LIST = f"""
+SELECT f.id,f.name,i.stock
+FROM flavors f
+LEFT JOIN ({ALL_DEPOTS}) i ON f.id=i.flavor_id
+WHERE f.active=TRUE
+ORDER BY f.name
+"""
+
+ACTIVE_FLAVORS = "SELECT * FROM flavors WHERE active=TRUE"
+
+# One row per flavor and depot; the pages pivot depots into columns
+CURRENT_STOCK = """
+SELECT f.name, d.name AS depot, i.stock
+FROM flavors f
+JOIN inventory i ON f.id=i.flavor_id
+JOIN depots d ON d.id=i.depot_id
+WHERE f.active=TRUE AND d.active=TRUE
+ORDER BY f.name, d.id
+"""
+
+SALE_STOCK = """
+SELECT f.id,f.name,i.stock
+FROM flavors f
+JOIN inventory i ON f.id=i.flavor_id
+WHERE f.active=TRUE AND i.depot_id=%s
+"""
+
+DEPOT_LIST = "SELECT id,name FROM depots WHERE active=TRUE ORDER BY id"
+
+TRANSFER_HISTORY = """
+SELECT
+    t.id,
+    t.created_at,
+    fd.name AS from_depot,
+    td.name AS to_depot,
+    f.name AS flavor,
+    ti.quantity,
+    t.note,
+    t.created_by
+FROM transfers t
+JOIN depots fd ON fd.id = t.from_depot_id
+JOIN depots td ON td.id = t.to_depot_id
+JOIN transfer_items ti ON ti.transfer_id = t.id
+JOIN flavors f ON f.id = ti.flavor_id
+ORDER BY t.id DESC
+LIMIT 50
+"""
+
+# Ordered by the partition key, so the scan starts in the newest month's
+# partition and never opens older ones once it has 50 rows.
+SALES_HISTORY = """
+SELECT
+    s.sale_date,
+    c.name AS customer,
+    f.name AS flavor,
+    si.quantity,
+    s.total_boxes,
+    s.created_by
+FROM sales s
+JOIN customers c ON s.customer_id = c.id
+JOIN sale_items si ON s.id = si.sale_id AND s.sale_date = si.sale_date
+JOIN flavors f ON si.flavor_id = f.id
+ORDER BY s.sale_date DESC, s.id DESC
+LIMIT 50
+"""
+
+# Boxes still out with each customer, one primary-key lookup per row
+CUSTOMER_LIST = """
+SELECT c.*, COALESCE(b.outstanding,0) AS boxes_outstanding
+FROM customers c
+LEFT JOIN customer_box_balances b ON b.customer_id = c.id
+WHERE c.active=TRUE
+ORDER BY c.id DESC
+"""
+
+CUSTOMER_BOXES = """
+SELECT boxes_out, boxes_returned, boxes_damaged, outstanding
+FROM customer_box_balances
+WHERE customer_id=%s
+"""
+
+USER_LIST = "SELECT id,username,role FROM users ORDER BY id"
@@ -0,0 +1,322 @@
+# rollups.py
+#
+# Daily sales rollups at flavor, customer and area grain (flavor and area
+# also per depot, so sales at different depots don't queue on the same
+# rollup rows), and each customer's running box balance (boxes out on
+# sales vs boxes back on returns). services.py keeps them current as
+# sales and returns are posted; rebuild() recomputes a date range from
+# the raw tables and rebuild_balances() recounts the balances from the
+# customer rollup.
+#
+# Usage:
+#   python rollups.py rebuild [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+#   python rollups.py balances
+
+import argparse
+import sys
+import time
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+import db
+import partitions
+
+TABLES = ("sales_daily_flavor", "sales_daily_customer", "sales_daily_area")
+
+BALANCES = "customer_box_balances"
+
+
+# ---------------- INCREMENTAL ----------------
+
+def add_sale(cur, day, depot_id, customer_id, total_boxes, rows):
+
+    execute_values(cur, """
+    INSERT INTO sales_daily_flavor(day,depot_id,flavor_id,quantity,sales)
+    VALUES %s
+    ON CONFLICT (day,depot_id,flavor_id) DO UPDATE
+    SET quantity = sales_daily_flavor.quantity + EXCLUDED.quantity,
+        sales = sales_daily_flavor.sales + EXCLUDED.sales
+    """, [(day, int(depot_id), fid, q, 1) for fid, q in rows], page_size=len(rows))
+
+    cur.execute("""
+    WITH c AS (
+        INSERT INTO sales_daily_customer(day,customer_id,sales,quantity,boxes)
+        VALUES(%(day)s, %(cid)s, 1, %(qty)s, %(boxes)s)
+        ON CONFLICT (day,customer_id) DO UPDATE
+        SET sales = sales_daily_customer.sales + 1,
+            quantity = sales_daily_customer.quantity + EXCLUDED.quantity,
+            boxes = sales_daily_customer.boxes + EXCLUDED.boxes
+    )
+    INSERT INTO sales_daily_area(day,depot_id,area,sales,quantity,boxes)
+    SELECT %(day)s, %(depot)s, COALESCE(area,''), 1, %(qty)s, %(boxes)s
+    FROM customers WHERE id = %(cid)s
+    ON CONFLICT (day,depot_id,area) DO UPDATE
+    SET sales = sales_daily_area.sales + 1,
+        quantity = sales_daily_area.quantity + EXCLUDED.quantity,
+        boxes = sales_daily_area.boxes + EXCLUDED.boxes
+    """, {
+        "day": day,
+        "depot": int(depot_id),
+        "cid": int(customer_id),
+        "qty": sum(q for _, q in rows),
+        "boxes": int(total_boxes)
+    })
+
+    add_boxes(cur, customer_id, out=total_boxes)
+
+
+# Returns from before 0008 whose name matched no customer have no
+# customer_id; rebuild() leaves them out of the customer and area rollups.
+def add_return(cur, day, depot_id, customer_id, returned_boxes, damaged_boxes, damaged_bottles):
+
+    cur.execute("""
+    WITH c AS (
+        INSERT INTO sales_daily_customer(day,customer_id,returned_boxes,damaged_boxes,damaged_bottles)
+        VALUES(%(day)s, %(cid)s, %(rb)s, %(db)s, %(dbot)s)
+        ON CONFLICT (day,customer_id) DO UPDATE
+        SET returned_boxes = sales_daily_customer.returned_boxes + EXCLUDED.returned_boxes,
+            damaged_boxes = sales_daily_customer.damaged_boxes + EXCLUDED.damaged_boxes,
+            damaged_bottles = sales_daily_customer.damaged_bottles + EXCLUDED.damaged_bottles
+    )
+    INSERT INTO sales_daily_area(day,depot_id,area,returned_boxes,damaged_boxes,damaged_bottles)
+    SELECT %(day)s, %(depot)s, COALESCE(area,''), %(rb)s, %(db)s, %(dbot)s
+    FROM customers WHERE id = %(cid)s
+    ON CONFLICT (day,depot_id,area) DO UPDATE
+    SET returned_boxes = sales_daily_area.returned_boxes + EXCLUDED.returned_boxes,
+        damaged_boxes = sales_daily_area.damaged_boxes + EXCLUDED.damaged_boxes,
+        damaged_bottles = sales_daily_area.damaged_bottles + EXCLUDED.damaged_bottles
+    """, {
+        "day": day,
+        "depot": int(depot_id),
+        "cid": int(customer_id),
+        "rb": int(returned_boxes or 0),
+        "db": int(damaged_boxes or 0),
+        "dbot": int(damaged_bottles or 0)
+    })
+
+    add_boxes(cur, customer_id, returned=returned_boxes, damaged=damaged_boxes)
+
+
+# One upsert on the customer's row; the balance is a stored column.
+def add_boxes(cur, customer_id, out=0, returned=0, damaged=0):
+
+    cur.execute("""
+    INSERT INTO customer_box_balances(customer_id,boxes_out,boxes_returned,boxes_damaged)
+    VALUES(%s,%s,%s,%s)
+    ON CONFLICT (customer_id) DO UPDATE
+    SET boxes_out = customer_box_balances.boxes_out + EXCLUDED.boxes_out,
+        boxes_returned = customer_box_balances.boxes_returned + EXCLUDED.boxes_returned,
+        boxes_damaged = customer_box_balances.boxes_damaged + EXCLUDED.boxes_damaged,
+        updated_at = now()
+    """, (
+        int(customer_id),
+        int(out or 0),
+        int(returned or 0),
+        int(damaged or 0)
+    ))
+
+
+# ---------------- REBUILD ----------------
+
+def rebuild(cur, start=None, end=None):
+
+    # Archived months have no raw sales left to recount; their rollups are
+    # kept as they were.
+    first = partitions.oldest(cur, "sales")
+
+    if first and (start is None or start < first):
+        start = first
+
+    p = {"start": start, "end": end}
+
+    # Sales and returns posted meanwhile wait rather than racing the
+    # delete/insert below.
+    cur.execute(
+        "LOCK TABLE sales_daily_flavor, sales_daily_customer, sales_daily_area IN EXCLUSIVE MODE"
+    )
+
+    for t in TABLES:
+        cur.execute(f"""
+        DELETE FROM {t}
+        WHERE (%(start)s::date IS NULL OR day >= %(start)s)
+          AND (%(end)s::date IS NULL OR day <= %(end)s)
+        """, p)
+
+    cur.execute("""
+    INSERT INTO sales_daily_flavor(day,depot_id,flavor_id,quantity,sales)
+    SELECT s.sale_date, s.depot_id, si.flavor_id, SUM(si.quantity), COUNT(DISTINCT s.id)
+    FROM sales s
+    JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+    WHERE s.sale_date IS NOT NULL
+      AND (%(start)s::date IS NULL OR s.sale_date >= %(start)s)
+      AND (%(end)s::date IS NULL OR s.sale_date <= %(end)s)
+    GROUP BY 1, 2, 3
+    """, p)
+
+    # Per day, depot and customer; the customer and area rollups are both
+    # regroupings of it.
+    cur.execute("""
+    CREATE TEMP TABLE rollup_customer_depot AS
+    SELECT day, depot_id, customer_id,
+           SUM(sales) AS sales, SUM(quantity) AS quantity, SUM(boxes) AS boxes,
+           SUM(returned_boxes) AS returned_boxes,
+           SUM(damaged_boxes) AS damaged_boxes,
+           SUM(damaged_bottles) AS damaged_bottles
+    FROM (
+        SELECT s.sale_date AS day, s.depot_id, s.customer_id,
+               1 AS sales,
+               COALESCE(SUM(si.quantity),0) AS quantity,
+               COALESCE(s.total_boxes,0) AS boxes,
+               0 AS returned_boxes, 0 AS damaged_boxes, 0 AS damaged_bottles
+        FROM sales s
+        LEFT JOIN sale_items si ON si.sale_id = s.id AND si.sale_date = s.sale_date
+        WHERE s.sale_date IS NOT NULL
+          AND s.customer_id IS NOT NULL
+          AND (%(start)s::date IS NULL OR s.sale_date >= %(start)s)
+          AND (%(end)s::date IS NULL OR s.sale_date <= %(end)s)
+        GROUP BY s.id, s.sale_date, s.depot_id, s.customer_id, s.total_boxes
+
+        UNION ALL
+
+        SELECT r.return_date, r.depot_id, r.customer_id, 0, 0, 0,
+               COALESCE(r.returned_boxes,0),
+               COALESCE(r.damaged_boxes,0),
+               COALESCE(r.damaged_bottles,0)
+        FROM returns r
+        WHERE r.return_date IS NOT NULL
+          AND r.customer_id IS NOT NULL
+          AND (%(start)s::date IS NULL OR r.return_date >= %(start)s)
+          AND (%(end)s::date IS NULL OR r.return_date <= %(end)s)
+    ) x
+    GROUP BY day, depot_id, customer_id
+    """, p)
+
+    cur.execute("""
+    INSERT INTO sales_daily_customer(
+        day,customer_id,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT day, customer_id,
+           SUM(sales), SUM(quantity), SUM(boxes),
+           SUM(returned_boxes), SUM(damaged_boxes), SUM(damaged_bottles)
+    FROM rollup_customer_depot
+    GROUP BY 1, 2
+    """)
+
+    cur.execute("""
+    INSERT INTO sales_daily_area(
+        day,depot_id,area,sales,quantity,boxes,
+        returned_boxes,damaged_boxes,damaged_bottles
+    )
+    SELECT d.day, d.depot_id, COALESCE(c.area,''),
+           SUM(d.sales), SUM(d.quantity), SUM(d.boxes),
+           SUM(d.returned_boxes), SUM(d.damaged_boxes), SUM(d.damaged_bottles)
+    FROM rollup_customer_depot d
+    JOIN customers c ON c.id = d.customer_id
+    GROUP BY 1, 2, 3
+    """)
+
+    cur.execute("DROP TABLE rollup_customer_depot")
+
+
+# Recounts every balance from the customer rollup rather than the raw
+# tables: it holds every posted sale and return, including months whose
+# raw rows have been archived. Run after rebuild() when both are needed.
+def rebuild_balances(cur):
+
+    cur.execute("LOCK TABLE customer_box_balances IN EXCLUSIVE MODE")
+
+    cur.execute("DELETE FROM customer_box_balances")
+
+    cur.execute("""
+    INSERT INTO customer_box_balances(customer_id,boxes_out,boxes_returned,boxes_damaged)
+    SELECT customer_id, SUM(boxes), SUM(returned_boxes), SUM(damaged_boxes)
+    FROM sales_daily_customer
+    GROUP BY customer_id
+    """)
+
+
+# ---------------- REPORTS ----------------
+
+# Every report reads only from the rollups; %(bucket)s is a date_trunc unit.
+REPORTS = {
+
+    "Flavor": """
+    SELECT
+        date_trunc(%(bucket)s, r.day)::date AS period,
+        f.name AS flavor,
+        SUM(r.quantity) AS quantity,
+        SUM(r.sales) AS sales
+    FROM sales_daily_flavor r
+    JOIN flavors f ON f.id = r.flavor_id
+    WHERE r.day BETWEEN %(start)s AND %(end)s
+    GROUP BY 1, 2
+    ORDER BY 1 DESC, 3 DESC
+    """,
+
+    "Customer": """
+    SELECT
+        date_trunc(%(bucket)s, r.day)::date AS period,
+        c.name AS customer,
+        SUM(r.sales) AS sales,
+        SUM(r.quantity) AS quantity,
+        SUM(r.boxes) AS boxes,
+        SUM(r.returned_boxes) AS returned_boxes,
+        SUM(r.damaged_boxes) AS damaged_boxes,
+        SUM(r.damaged_bottles) AS damaged_bottles
+    FROM sales_daily_customer r
+    JOIN customers c ON c.id = r.customer_id
+    WHERE r.day BETWEEN %(start)s AND %(end)s
+    GROUP BY 1, 2
+    ORDER BY 1 DESC, 4 DESC
+    """,
+
+    "Area": """
+    SELECT
+        date_trunc(%(bucket)s, r.day)::date AS period,
+        NULLIF(r.area,'') AS area,
+        SUM(r.sales) AS sales,
+        SUM(r.quantity) AS quantity,
+        SUM(r.boxes) AS boxes,
+        SUM(r.returned_boxes) AS returned_boxes,
+        SUM(r.damaged_boxes) AS damaged_boxes,
+        SUM(r.damaged_bottles) AS damaged_bottles
+    FROM sales_daily_area r
+    WHERE r.day BETWEEN %(start)s AND %(end)s
+    GROUP BY 1, 2
+    ORDER BY 1 DESC, 4 DESC
+    """
+}
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Sales rollups")
+    parser.add_argument("command", choices=["rebuild", "balances"])
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+
+    try:
+        t = time.perf_counter()
+
+        with conn:
+            with conn.cursor() as cur:
+
+                if args.command == "rebuild":
+                    rebuild(cur, args.start, args.end)
+
+                rebuild_balances(cur)
+
+        print(f"Rebuilt {args.command} in {time.perf_counter() - t:.1f}s")
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,388 @@
+# services.py
+#
+# Write paths shared by the pages. Every function takes a cursor and
+# leaves commit/rollback to the caller, so it can run inside
+# pool.transaction() together with other statements.
+
+from datetime import date
+
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+
+import ledger
+import partitions
+import prepared
+import rollups
+
+# Tables each write path touches, for cache invalidation.
+SALE_TABLES = ("inventory", "sales", "sale_items", rollups.BALANCES) + rollups.TABLES + ledger.TABLES
+RETURN_TABLES = ("inventory", "returns", "return_items", rollups.BALANCES) + rollups.TABLES + ledger.TABLES
+STOCK_TABLES = ("inventory",) + ledger.TABLES
+TRANSFER_TABLES = ("inventory", "transfers", "transfer_items") + ledger.TABLES
+DEPOT_TABLES = ("depots", "inventory")
+
+# The depot migration 0009 moved all existing stock and history into
+# depot 1, "Main"
+MAIN_DEPOT = 1
+
+
+class InsufficientStock(Exception):
+
+    def __init__(self, shortages):
+
+        # [(flavor name, requested, available), ...]
+        self.shortages = shortages
+
+        super().__init__("Not enough stock for " + ", ".join(
+            f"{name} (requested {req}, available {avail})"
+            for name, req, avail in shortages
+        ))
+
+
+def _merge_items(items):
+
+    qty = {}
+
+    for fid, q in items:
+        if int(q) > 0:
+            qty[int(fid)] = qty.get(int(fid), 0) + int(q)
+
+    return sorted(qty.items())
+
+
+# ---------------- LOCKING ----------------
+
+# Row-locks one depot's inventory of these flavors and returns
+# {flavor_id: stock}. Every multi-flavor write takes its locks through
+# here, in (depot_id, flavor_id) order, so two transactions can never hold
+# each other's rows and deadlock; anything that still conflicts is
+# retried by Pool.run().
+def lock_stock(cur, depot_id, flavor_ids):
+
+    cur.execute("""
+    SELECT flavor_id, stock FROM inventory
+    WHERE depot_id = %s AND flavor_id = ANY(%s)
+    ORDER BY flavor_id
+    FOR UPDATE
+    """, (int(depot_id), sorted(set(int(f) for f in flavor_ids))))
+
+    return dict(cur.fetchall())
+
+
+# rows: [(depot_id, flavor_id, signed quantity), ...], already locked.
+# A (depot, flavor) row can be missing when a depot and a flavor were
+# added concurrently; it is created here, so inventory never misses a
+# change the ledger records.
+def _add_stock(cur, rows):
+
+    if not rows:
+        return
+
+    execute_values(cur, """
+    INSERT INTO inventory(depot_id,flavor_id,stock)
+    VALUES %s
+    ON CONFLICT (depot_id,flavor_id) DO UPDATE
+    SET stock = inventory.stock + EXCLUDED.stock
+    """, [(int(d), int(f), int(q)) for d, f, q in rows], page_size=len(rows))
+
+
+# Raises InsufficientStock for the (flavor_id, qty) rows stock can't cover
+def _check_stock(cur, stock, rows):
+
+    short = [(fid, q) for fid, q in rows if stock.get(fid, 0) < q]
+
+    if not short:
+        return
+
+    cur.execute("""
+    SELECT id, name FROM flavors WHERE id = ANY(%s)
+    """, ([fid for fid, _ in short],))
+
+    names = dict(cur.fetchall())
+
+    raise InsufficientStock([
+        (names.get(fid, f"#{fid}"), q, stock.get(fid, 0))
+        for fid, q in short
+    ])
+
+
+# ---------------- SALES ----------------
+
+def post_sale(cur, depot_id, customer_id, total_boxes, items, username, sale_date=None):
+
+    rows = _merge_items(items)
+
+    if not rows:
+        raise ValueError("Select at least one item")
+
+    # Before any row locks: in a new month this may have to create the
+    # month's partition
+    partitions.ensure_current(cur)
+
+    _check_stock(cur, lock_stock(cur, depot_id, [fid for fid, _ in rows]), rows)
+
+    _add_stock(cur, [(depot_id, fid, -q) for fid, q in rows])
+
+    day = sale_date or date.today()
+
+    # sales is partitioned by month; a date with no partition (archived,
+    # or too far ahead) is rejected by Postgres as a check violation.
+    try:
+        cur.execute("""
+        INSERT INTO sales(depot_id,customer_id,total_boxes,sale_date,created_by)
+        VALUES(%s,%s,%s,%s,%s)
+        RETURNING id
+        """, (
+            int(depot_id),
+            int(customer_id),
+            int(total_boxes),
+            day,
+            username
+        ))
+
+    except errors.CheckViolation:
+        raise ValueError(f"Sales can't be recorded for {day}: that month is archived or not open yet")
+
+    sid = cur.fetchone()[0]
+
+    execute_values(cur, """
+    INSERT INTO sale_items(sale_id,sale_date,flavor_id,quantity)
+    VALUES %s
+    """, [(sid, day, fid, q) for fid, q in rows], page_size=len(rows))
+
+    ledger.record(
+        cur,
+        [(depot_id, fid, "sale", -q, sid) for fid, q in rows],
+        username
+    )
+
+    rollups.add_sale(cur, day, depot_id, customer_id, total_boxes, rows)
+
+    return sid
+
+
+# ---------------- STOCK ----------------
+
+def receive_stock(cur, depot_id, flavor_id, quantity, username):
+
+    if int(quantity) <= 0:
+        raise ValueError("Quantity must be positive")
+
+    prepared.execute(cur, "inventory_add", (int(depot_id), int(flavor_id), int(quantity)))
+
+    ledger.record(
+        cur,
+        [(int(depot_id), int(flavor_id), "receipt", int(quantity), None)],
+        username
+    )
+
+
+# Zeroes the flavor at every depot
+def reset_stock(cur, flavor_id, username):
+
+    # The ledger entries need the stock being wiped, so read it under the
+    # row locks in the same statement.
+    cur.execute("""
+    WITH old AS (
+        SELECT depot_id, flavor_id, stock FROM inventory
+        WHERE flavor_id=%(fid)s
+        ORDER BY depot_id
+        FOR UPDATE
+    ),
+    upd AS (
+        UPDATE inventory i SET stock=0
+        FROM old
+        WHERE i.depot_id = old.depot_id AND i.flavor_id = old.flavor_id
+    )
+    INSERT INTO inventory_movements(depot_id,flavor_id,kind,quantity,created_by)
+    SELECT depot_id, flavor_id, 'reset', -stock, %(user)s
+    FROM old
+    WHERE stock <> 0
+    """, {"fid": int(flavor_id), "user": username})
+
+
+# ---------------- DEPOTS ----------------
+
+# Creates a depot with a zero-stock row for every flavor
+def add_depot(cur, name):
+
+    name = name.strip()
+
+    if not name:
+        raise ValueError("Depot name can't be blank")
+
+    try:
+        cur.execute("""
+        INSERT INTO depots(name) VALUES(%s) RETURNING id
+        """, (name,))
+
+    except errors.UniqueViolation:
+        raise ValueError("A depot with that name already exists")
+
+    did = cur.fetchone()[0]
+
+    cur.execute("""
+    INSERT INTO inventory(depot_id,flavor_id,stock)
+    SELECT %s, id, 0 FROM flavors
+    """, (did,))
+
+    return did
+
+
+# Moves items [(flavor_id, quantity), ...] between depots as one set of
+# row updates. Both depots' rows are locked through lock_stock in depot
+# order, so a transfer keeps the global (depot_id, flavor_id) lock order.
+def transfer_stock(cur, from_depot_id, to_depot_id, items, username, note=""):
+
+    from_depot_id, to_depot_id = int(from_depot_id), int(to_depot_id)
+
+    if from_depot_id == to_depot_id:
+        raise ValueError("Pick two different depots")
+
+    rows = _merge_items(items)
+
+    if not rows:
+        raise ValueError("Select at least one item")
+
+    fids = [fid for fid, _ in rows]
+
+    for did in sorted((from_depot_id, to_depot_id)):
+
+        stock = lock_stock(cur, did, fids)
+
+        if did == from_depot_id:
+            _check_stock(cur, stock, rows)
+
+    _add_stock(
+        cur,
+        [(from_depot_id, fid, -q) for fid, q in rows] +
+        [(to_depot_id, fid, q) for fid, q in rows]
+    )
+
+    cur.execute("""
+    INSERT INTO transfers(from_depot_id,to_depot_id,created_by,note)
+    VALUES(%s,%s,%s,%s)
+    RETURNING id
+    """, (from_depot_id, to_depot_id, username, note))
+
+    tid = cur.fetchone()[0]
+
+    execute_values(cur, """
+    INSERT INTO transfer_items(transfer_id,flavor_id,quantity)
+    VALUES %s
+    """, [(tid, fid, q) for fid, q in rows], page_size=len(rows))
+
+    ledger.record(
+        cur,
+        [(from_depot_id, fid, "transfer", -q, tid) for fid, q in rows] +
+        [(to_depot_id, fid, "transfer", q, tid) for fid, q in rows],
+        username
+    )
+
+    return tid
+
+
+# ---------------- RETURNS ----------------
+
+# [(flavor_id, returned, damaged), ...] -> merged per flavor, sorted
+def _merge_return_items(items):
+
+    qty = {}
+
+    for fid, ret, dmg in items:
+
+        if min(int(ret), int(dmg)) < 0:
+            raise ValueError("Returned and damaged counts can't be negative")
+
+        if int(ret) or int(dmg):
+            r, d = qty.get(int(fid), (0, 0))
+            qty[int(fid)] = (r + int(ret), d + int(dmg))
+
+    return [(fid, r, d) for fid, (r, d) in sorted(qty.items())]
+
+
+# Returned bottles go back into inventory; damaged ones are booked in and
+# written off straight away, so stock only grows by the good ones while
+# the ledger still shows both. damaged_bottles defaults to the damaged
+# total of the lines.
+def post_return(
+    cur,
+    depot_id,
+    customer_id,
+    returned_boxes,
+    damaged_boxes,
+    items,
+    note,
+    username,
+    return_date=None,
+    damaged_bottles=None
+):
+
+    rows = _merge_return_items(items)
+
+    if damaged_bottles is None:
+        damaged_bottles = sum(d for _, _, d in rows)
+
+    if min(int(returned_boxes), int(damaged_boxes), int(damaged_bottles)) < 0:
+        raise ValueError("Returned and damaged counts can't be negative")
+
+    # Same lock order as sales, before anything else is written
+    lock_stock(cur, depot_id, [fid for fid, _, _ in rows])
+
+    day = return_date or date.today()
+
+    cur.execute("""
+    INSERT INTO returns(
+        depot_id,
+        customer_id,
+        customer_name,
+        return_date,
+        returned_boxes,
+        damaged_boxes,
+        damaged_bottles,
+        note,
+        created_by
+    )
+    SELECT %s, id, name, %s, %s, %s, %s, %s, %s
+    FROM customers WHERE id=%s
+    RETURNING id
+    """, (
+        int(depot_id),
+        day,
+        int(returned_boxes),
+        int(damaged_boxes),
+        int(damaged_bottles),
+        note,
+        username,
+        int(customer_id)
+    ))
+
+    row = cur.fetchone()
+
+    if row is None:
+        raise ValueError(f"Unknown customer {customer_id}")
+
+    rid = row[0]
+
+    if rows:
+
+        execute_values(cur, """
+        INSERT INTO return_items(return_id,flavor_id,returned,damaged)
+        VALUES %s
+        """, [(rid, fid, r, d) for fid, r, d in rows], page_size=len(rows))
+
+        _add_stock(cur, [(depot_id, fid, r) for fid, r, _ in rows if r])
+
+        ledger.record(
+            cur,
+            [(depot_id, fid, "return", r + d, rid) for fid, r, d in rows] +
+            [(depot_id, fid, "writeoff", -d, rid) for fid, _, d in rows if d],
+            username
+        )
+
+    rollups.add_return(
+        cur, day, depot_id, customer_id,
+        returned_boxes, damaged_boxes, damaged_bottles
+    )
+
+    return rid
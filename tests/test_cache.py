@@ -0,0 +1,173 @@
+# tests/test_cache.py
+#
+# QueryCache on its own, no database: table tags and invalidation, TTL
+# expiry, LRU eviction and copy-on-read.
+#
+# Usage:
+#   python -m pytest tests
+
+import cache
+
+
+class Loader:
+
+    def __init__(self, value="rows"):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_tables_in():
+
+    q = """
+    SELECT f.name, i.stock FROM Flavors f
+    LEFT JOIN inventory i ON f.id=i.flavor_id
+    JOIN depots d ON d.id=i.depot_id
+    """
+
+    assert cache.tables_in(q) == {"flavors", "inventory", "depots"}
+
+
+def test_hit_skips_loader():
+
+    qc = cache.QueryCache()
+    load = Loader()
+
+    assert qc.get_or_load("SELECT * FROM sales", (1,), load) == "rows"
+    assert qc.get_or_load("SELECT * FROM sales", [1], load) == "rows"
+
+    # Different params are a different entry
+    qc.get_or_load("SELECT * FROM sales", (2,), load)
+
+    assert load.calls == 2
+    assert qc.stats()["hits"] == 1
+
+
+def test_invalidate_drops_tagged_entries_only():
+
+    qc = cache.QueryCache()
+    sales, flavors, joined = Loader(), Loader(), Loader()
+
+    qc.get_or_load("SELECT * FROM sales", None, sales)
+    qc.get_or_load("SELECT * FROM flavors", None, flavors)
+    qc.get_or_load("SELECT * FROM sales s JOIN flavors f ON TRUE", None, joined)
+
+    qc.invalidate("FLAVORS")
+
+    qc.get_or_load("SELECT * FROM sales", None, sales)
+    qc.get_or_load("SELECT * FROM flavors", None, flavors)
+    qc.get_or_load("SELECT * FROM sales s JOIN flavors f ON TRUE", None, joined)
+
+    assert (sales.calls, flavors.calls, joined.calls) == (1, 2, 2)
+    assert qc.stats()["invalidations"] == 2
+
+
+def test_explicit_tags():
+
+    qc = cache.QueryCache()
+    load = Loader()
+
+    qc.get_or_load("page:sales", (25, None, None), load, tags=["sales"])
+    qc.invalidate("sale_items")
+    qc.get_or_load("page:sales", (25, None, None), load, tags=["sales"])
+
+    assert load.calls == 1
+
+    qc.invalidate("sales")
+    qc.get_or_load("page:sales", (25, None, None), load, tags=["sales"])
+
+    assert load.calls == 2
+
+
+def test_load_overlapping_invalidation_is_not_stored():
+
+    qc = cache.QueryCache()
+
+    # A write lands while the read is in flight: its result may predate
+    # the write, so it is returned but not cached.
+    def racing():
+        qc.invalidate("sales")
+        return "stale"
+
+    assert qc.get_or_load("SELECT * FROM sales", None, racing) == "stale"
+
+    load = Loader("fresh")
+
+    assert qc.get_or_load("SELECT * FROM sales", None, load) == "fresh"
+    assert load.calls == 1
+
+
+def test_ttl_expiry(monkeypatch):
+
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+
+    qc = cache.QueryCache(ttl=60)
+    load = Loader()
+
+    qc.get_or_load("SELECT * FROM sales", None, load)
+
+    clock.now += 59
+    qc.get_or_load("SELECT * FROM sales", None, load)
+
+    assert load.calls == 1
+
+    clock.now += 1
+    qc.get_or_load("SELECT * FROM sales", None, load)
+
+    assert load.calls == 2
+    assert qc.stats()["entries"] == 1
+
+
+def test_lru_eviction():
+
+    qc = cache.QueryCache(maxsize=2)
+    a, b, c = Loader(), Loader(), Loader()
+
+    qc.get_or_load("SELECT * FROM a", None, a)
+    qc.get_or_load("SELECT * FROM b", None, b)
+
+    # Touching a makes b the least recently used
+    qc.get_or_load("SELECT * FROM a", None, a)
+    qc.get_or_load("SELECT * FROM c", None, c)
+
+    qc.get_or_load("SELECT * FROM a", None, a)
+    qc.get_or_load("SELECT * FROM c", None, c)
+
+    assert (a.calls, c.calls) == (1, 1)
+
+    qc.get_or_load("SELECT * FROM b", None, b)
+
+    assert b.calls == 2
+    assert qc.stats()["evictions"] == 2
+    assert qc.stats()["entries"] == 2
+
+
+def test_copy_on_read():
+
+    qc = cache.QueryCache()
+    load = Loader({"stock": 5})
+
+    first = qc.get_or_load("SELECT * FROM inventory", None, load, copy=True)
+    first["stock"] = 0
+
+    second = qc.get_or_load("SELECT * FROM inventory", None, load, copy=True)
+
+    assert second == {"stock": 5}
+    assert second is not first
+    assert load.value == {"stock": 5}
+
+    # Without copy=True callers share the cached value
+    assert qc.get_or_load("SELECT * FROM inventory", None, load) is load.value
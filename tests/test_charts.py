@@ -0,0 +1,63 @@
+# tests/test_charts.py
+#
+# LTTB downsampling of the Dashboard series, no database.
+#
+# Usage:
+#   python -m pytest tests
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+import charts
+
+
+@pytest.mark.parametrize("size, n", [(1000, 400), (1000, 3), (401, 400), (7, 5)])
+def test_lttb_keeps_endpoints_and_n_points(size, n):
+
+    x = np.arange(size)
+    y = np.sin(x / 7.0) * 100 + x
+
+    keep = charts.lttb(x, y, n)
+
+    assert len(keep) == n
+    assert keep[0] == 0
+    assert keep[-1] == size - 1
+
+    # Distinct points, still in x order
+    assert (np.diff(keep) > 0).all()
+
+
+@pytest.mark.parametrize("size, n", [(10, 10), (10, 400), (0, 400), (10, 2)])
+def test_lttb_short_input_unchanged(size, n):
+
+    keep = charts.lttb(np.arange(size), np.zeros(size), n)
+
+    assert keep.tolist() == list(range(size))
+
+
+def test_lttb_keeps_spike():
+
+    y = np.zeros(1000)
+    y[613] = 50
+
+    assert 613 in charts.lttb(np.arange(1000), y, 20)
+
+
+def test_downsample_per_series():
+
+    days = pd.date_range("2024-01-01", periods=500).date
+
+    df = pd.concat([
+        pd.DataFrame({"period": days, "flavor": "Cola", "quantity": np.arange(500)}),
+        pd.DataFrame({"period": days[:50], "flavor": "Lime", "quantity": np.arange(50)})
+    ], ignore_index=True)
+
+    out = charts.downsample(df, "period", "quantity", by="flavor", budget=100)
+
+    assert out.groupby("flavor").size().to_dict() == {"Cola": 100, "Lime": 50}
+
+    # Endpoints of each series survive
+    cola = out[out["flavor"] == "Cola"]
+    assert (cola["period"].iloc[0], cola["period"].iloc[-1]) == (days[0], days[-1])
@@ -0,0 +1,89 @@
+# tests/test_forecast.py
+#
+# forecast.forecast() on small hand-built days x flavors matrices, no
+# database: velocity, days of cover and the reorder point's safety term.
+#
+# Usage:
+#   python -m pytest tests
+
+import math
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("psycopg2")
+
+import forecast
+
+COLA, LIME, PEACH = 1, 2, 3
+
+
+# {flavor_id: daily quantities} -> days x flavors matrix, as daily_matrix()
+def matrix(columns):
+    days = pd.date_range("2024-01-01", periods=len(next(iter(columns.values())))).date
+    return pd.DataFrame(columns, index=days, dtype=float)
+
+
+def test_velocity_is_smoothed_daily_demand():
+
+    # adjust=False: 0, then 0.5 * 4 + 0.5 * 0
+    out = forecast.forecast(matrix({COLA: [0, 4]}), pd.Series({COLA: 10}), alpha=0.5)
+
+    assert out.loc[COLA, "velocity"] == pytest.approx(2.0)
+    assert out.loc[COLA, "days_of_cover"] == pytest.approx(5.0)
+
+
+def test_zero_velocity_has_no_days_of_cover():
+
+    # Peach never sold in the window, Lime is not stocked anywhere
+    out = forecast.forecast(
+        matrix({COLA: [5] * 10, LIME: [3] * 10, PEACH: [0] * 10}),
+        pd.Series({COLA: 50, PEACH: 20, 99: 7}),
+        lead_time=4
+    )
+
+    assert out.index.tolist() == [COLA, LIME, PEACH]
+
+    peach = out.loc[PEACH]
+    assert peach["velocity"] == 0
+    assert pd.isna(peach["days_of_cover"])
+    assert peach["reorder_point"] == 0
+    assert peach["stock"] == 20
+
+    lime = out.loc[LIME]
+    assert lime["stock"] == 0
+    assert lime["days_of_cover"] == 0
+    assert lime["reorder_point"] == 12
+
+    assert out.loc[COLA, "days_of_cover"] == pytest.approx(10.0)
+
+
+def test_constant_demand_has_no_safety_stock():
+
+    out = forecast.forecast(matrix({COLA: [6] * 30}), pd.Series({COLA: 0}), lead_time=7, z=3)
+
+    assert out.loc[COLA, "sigma"] == pytest.approx(0)
+    assert out.loc[COLA, "reorder_point"] == 42
+
+
+@pytest.mark.parametrize("z, lead_time", [(0, 4), (1.65, 4), (2, 9), (1.65, 7)])
+def test_safety_term(z, lead_time):
+
+    demand = [0, 12, 3, 9, 0, 15, 6, 2, 11, 4] * 3
+
+    out = forecast.forecast(matrix({COLA: demand}), pd.Series({COLA: 0}), z=z, lead_time=lead_time)
+
+    velocity = out.loc[COLA, "velocity"]
+    sigma = out.loc[COLA, "sigma"]
+
+    assert sigma > 0
+    assert out.loc[COLA, "reorder_point"] == round(
+        velocity * lead_time + z * sigma * math.sqrt(lead_time)
+    )
+
+    # Safety stock grows with z and with the square root of the lead time
+    base = forecast.forecast(matrix({COLA: demand}), pd.Series({COLA: 0}), z=0, lead_time=lead_time)
+
+    assert out.loc[COLA, "reorder_point"] - base.loc[COLA, "reorder_point"] == pytest.approx(
+        z * sigma * math.sqrt(lead_time), abs=1
+    )
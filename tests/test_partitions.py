@@ -0,0 +1,153 @@
+# tests/test_partitions.py
+#
+# Monthly partitions against a real database: archiving a month and
+# reading it back, and rollups.rebuild() leaving archived months alone.
+# Runs in a scratch schema (test_partitions) with all migrations applied;
+# skipped when the DB_* settings don't reach a server.
+#
+# Usage:
+#   python -m pytest tests
+
+from datetime import date, timedelta
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+import archive
+import db
+import migrate
+import partitions
+import rollups
+import services
+
+SCHEMA = "test_partitions"
+
+# Far enough back that nothing else in the test touches it
+OLD_MONTH = partitions.add_months(partitions.month_start(date.today()), -30)
+OLD_DAY = OLD_MONTH + timedelta(days=9)
+
+
+@pytest.fixture
+def conn(monkeypatch):
+
+    # Every connection opened from here on starts in the scratch schema
+    monkeypatch.setenv("PGOPTIONS", f"-c search_path={SCHEMA},public")
+
+    try:
+        conn = db.get_conn()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"No database: {e}")
+
+    conn.autocommit = True
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+
+    migrate.migrate(conn)
+
+    conn.autocommit = False
+
+    with conn:
+        with conn.cursor() as cur:
+
+            partitions.ensure(cur, start=OLD_MONTH)
+
+            cur.execute("INSERT INTO flavors(name) VALUES('Cola') RETURNING id")
+            fid = cur.fetchone()[0]
+
+            cur.execute("INSERT INTO customers(name,area) VALUES('Shop','North') RETURNING id")
+            cid = cur.fetchone()[0]
+
+            cur.execute("""
+            INSERT INTO inventory(depot_id,flavor_id,stock) VALUES(%s,%s,100)
+            """, (services.MAIN_DEPOT, fid))
+
+    yield conn, fid, cid
+
+    conn.rollback()
+    conn.autocommit = True
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+    conn.close()
+
+
+def sell(conn, fid, cid, qty, day):
+
+    with conn:
+        with conn.cursor() as cur:
+            return services.post_sale(
+                cur, services.MAIN_DEPOT, cid, 1, [(fid, qty)], "test", sale_date=day
+            )
+
+
+def test_archive_month_round_trip(conn, tmp_path):
+
+    conn, fid, cid = conn
+
+    sid = sell(conn, fid, cid, 3, OLD_DAY)
+
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+            INSERT INTO activity_logs(username,action,log_date) VALUES('test','Old sale',%s)
+            """, (OLD_DAY,))
+
+    written = archive.archive_month(conn, OLD_MONTH, str(tmp_path))
+
+    assert written == {"sale_items": 1, "sales": 1, "activity_logs": 1}
+
+    with conn.cursor() as cur:
+        for table in partitions.TABLES:
+            assert OLD_MONTH not in partitions.partitions(cur, table)
+
+        cur.execute("SELECT COUNT(*) FROM sales WHERE id=%s", (sid,))
+        assert cur.fetchone()[0] == 0
+
+    conn.rollback()
+
+    month_end = partitions.add_months(OLD_MONTH, 1) - timedelta(days=1)
+
+    sales = archive.read_archive("sales", OLD_MONTH, month_end, str(tmp_path))
+    items = archive.read_archive("sale_items", OLD_MONTH, month_end, str(tmp_path))
+    logs = archive.read_archive("activity_logs", OLD_MONTH, month_end, str(tmp_path))
+
+    assert sales["id"].tolist() == [sid]
+    assert items[["sale_id", "flavor_id", "quantity"]].values.tolist() == [[sid, fid, 3]]
+    assert logs["action"].tolist() == ["Old sale"]
+
+    # A range past the archived month reads nothing
+    assert archive.read_archive("sales", month_end + timedelta(days=1), None, str(tmp_path)).empty
+
+
+def test_rebuild_keeps_archived_months(conn, tmp_path):
+
+    conn, fid, cid = conn
+
+    sell(conn, fid, cid, 3, OLD_DAY)
+    sell(conn, fid, cid, 5, date.today())
+
+    archive.archive_month(conn, OLD_MONTH, str(tmp_path))
+
+    with conn:
+        with conn.cursor() as cur:
+
+            assert partitions.oldest(cur, "sales") > OLD_MONTH
+
+            # Knock the current rollup out so the rebuild has to recount it
+            cur.execute("UPDATE sales_daily_flavor SET quantity = 0 WHERE day = %s", (date.today(),))
+
+            rollups.rebuild(cur)
+
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT day, SUM(quantity) FROM sales_daily_flavor GROUP BY day ORDER BY day
+        """)
+        assert cur.fetchall() == [(OLD_DAY, 3), (date.today(), 5)]
+
+    conn.rollback()